@@ -0,0 +1,206 @@
+"""Benchmark the processing pipeline on synthetic repositories, tracking time and peak memory of each stage.
+
+Generate dumps once, run the benchmarks with any version of the package and compare the results::
+
+    python benchmarks/bench_pipeline.py generate --data_path bench-data --scales '[1000, 10000, 100000]'
+    python benchmarks/bench_pipeline.py run --data_path bench-data --results_path bench-base.json
+    python benchmarks/bench_pipeline.py run --data_path bench-data --results_path bench-new.json
+    python benchmarks/bench_pipeline.py compare bench-base.json bench-new.json --tolerance 0.25
+
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import gc
+import glob
+import json
+import logging
+import os
+import platform
+import re
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+#: template of the benchmarked repository name, it is the number of comments
+BENCH_REPO_NAME = "synthetic/comments-%i"
+#: frequency for timeline aggregation
+BENCH_FREQ = "W"
+#: relative changes in time or memory below these absolute values are just noise
+NOISE_LIMITS = {"wall_s": 0.05, "peak_mb": 5.0}
+
+
+def _measure(func: Callable, setup: Optional[Callable] = None, repeat: int = 3) -> dict:
+    """Measure the best wall and CPU time over repeats, the peak memory is traced in an extra run."""
+    wall, cpu = float("inf"), float("inf")
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        gc.collect()
+        t_wall, t_cpu = time.perf_counter(), time.process_time()
+        func(*args)
+        wall = min(wall, time.perf_counter() - t_wall)
+        cpu = min(cpu, time.process_time() - t_cpu)
+    # tracing memory slows down the run, so it is not timed
+    args = setup() if setup else ()
+    gc.collect()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"wall_s": round(wall, 4), "cpu_s": round(cpu, 4), "peak_mb": round(peak / 1024**2, 2)}
+
+
+def generate(
+    data_path: str = "bench-data",
+    scales: Optional[list[int]] = None,
+    comments_per_ticket: float = 10.0,
+    nb_users: Optional[int] = None,
+    pr_ratio: float = 0.5,
+    date_from: str = "2020-01-01",
+    date_to: str = "2023-12-31",
+    seed: int = 0,
+) -> list[str]:
+    """Generate synthetic dumps with given numbers of comments.
+
+    Args:
+        data_path: Folder for the generated dumps.
+        scales: Approximate numbers of comments, one dump for each, from 1k to 1M.
+        comments_per_ticket: Mean number of comments per issue/PR.
+        nb_users: Number of distinct users, if not set it grows with the square root of scale.
+        pr_ratio: Share of PRs among issues/PRs.
+        date_from: Beginning of the time spread.
+        date_to: End of the time spread.
+        seed: Random seed for reproducible dumps.
+    """
+    from repo_stats.synthetic import save_synthetic_dump
+
+    os.makedirs(data_path, exist_ok=True)
+    paths = []
+    for scale in scales or [1_000, 10_000, 100_000]:
+        logging.info(f"Generating repository with ~{scale} comments...")
+        paths.append(
+            save_synthetic_dump(
+                data_path,
+                repo_name=BENCH_REPO_NAME % scale,
+                nb_tickets=max(int(scale / comments_per_ticket), 1),
+                comments_per_ticket=comments_per_ticket,
+                nb_users=nb_users or max(int(scale**0.5), 10),
+                pr_ratio=pr_ratio,
+                date_from=date_from,
+                date_to=date_to,
+                seed=seed,
+            )
+        )
+    return paths
+
+
+def _bench_repository(data_path: str, repo_name: str, repeat: int) -> dict:
+    """Benchmark all stages on a single repository."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from repo_stats.data_io import load_data, save_data
+    from repo_stats.github import GitHub
+    from repo_stats.stats import compute_user_comment_timeline, compute_users_summary
+    from repo_stats.visual import draw_comments_timeline
+
+    def _fresh_host() -> tuple:
+        host = GitHub(repo_name=repo_name, output_path=data_path, min_contribution=1)
+        host.fetch_data(offline=True)
+        return (host,)
+
+    host = _fresh_host()[0]
+    host.preprocess_data()
+    simple, comments = host.data[host.DATA_KEY_SIMPLE], host.data[host.DATA_KEY_COMMENTS]
+    df_comments = compute_user_comment_timeline(comments, freq=BENCH_FREQ)
+    df_comments = df_comments[df_comments.columns[df_comments.sum(axis=0) >= host.min_contribution_count]]
+
+    def _draw() -> None:
+        fig, _ = draw_comments_timeline(df_comments)
+        plt.close(fig)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stages = {
+            "load_data": (lambda: load_data(data_path, repo_name=repo_name, host=host.HOST_NAME), None),
+            "preprocess_data": (lambda h: h.preprocess_data(), _fresh_host),
+            "compute_users_summary": (lambda: compute_users_summary(simple), None),
+            "compute_user_comment_timeline": (lambda: compute_user_comment_timeline(comments, freq=BENCH_FREQ), None),
+            "draw_comments_timeline": (_draw, None),
+            "save_data": (lambda: save_data(host.data, tmp_dir, repo_name=repo_name, host=host.HOST_NAME), None),
+        }
+        results = {}
+        for stage, (func, setup) in stages.items():
+            logging.info(f"Benchmarking {repo_name} - {stage}...")
+            results[stage] = _measure(func, setup=setup, repeat=repeat)
+    results["records"] = {"tickets": len(simple), "comments": len(comments), "users": len(df_comments.columns)}
+    return results
+
+
+def run(data_path: str = "bench-data", results_path: str = "bench-results.json", repeat: int = 3) -> dict:
+    """Run benchmarks for all generated dumps and save the results.
+
+    Args:
+        data_path: Folder with the generated dumps.
+        results_path: Output JSON with results for each repository and stage.
+        repeat: Number of timed repeats, the best one is kept.
+    """
+    import repo_stats
+
+    dumps = glob.glob(os.path.join(data_path, "dump-github_synthetic-comments-*.json"))
+    scales = sorted(int(re.search(r"-(\d+)\.json$", p).group(1)) for p in dumps)
+    assert scales, f"No synthetic dumps found in {data_path}, generate them first."
+    report = {
+        "meta": {
+            "version": repo_stats.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {str(scale): _bench_repository(data_path, BENCH_REPO_NAME % scale, repeat) for scale in scales},
+    }
+    with open(results_path, "w", encoding="utf8") as fp:
+        json.dump(report, fp, indent=2)
+    logging.info(f"Results saved to: {results_path}")
+    return report
+
+
+def compare(baseline_path: str, results_path: str, tolerance: float = 0.25) -> list[str]:
+    """Compare results with the baseline and fail if any stage is slower or takes more memory.
+
+    Args:
+        baseline_path: Benchmark results of the reference version.
+        results_path: Benchmark results of the evaluated version.
+        tolerance: Allowed relative increase of time and peak memory.
+    """
+    from tabulate import tabulate
+
+    with open(baseline_path, encoding="utf8") as fp:
+        baseline = json.load(fp)["results"]
+    with open(results_path, encoding="utf8") as fp:
+        results = json.load(fp)["results"]
+
+    rows, regressions = [], []
+    for scale in sorted(set(baseline) & set(results), key=int):
+        for stage in results[scale]:
+            if stage == "records" or stage not in baseline[scale]:
+                continue
+            row = {"comments": scale, "stage": stage}
+            for metric, noise in NOISE_LIMITS.items():
+                base, new = baseline[scale][stage][metric], results[scale][stage][metric]
+                row[metric] = f"{base} -> {new}"
+                if new - base > max(base * tolerance, noise):
+                    regressions.append(f"{stage} @ {scale} comments: {metric} {base} -> {new}")
+            rows.append(row)
+    print(tabulate(rows, headers="keys", tablefmt="pipe"))
+    if regressions:
+        exit("Performance regressions:\n" + "\n".join(regressions))
+    return regressions
+
+
+if __name__ == "__main__":
+    from jsonargparse import auto_cli
+
+    logging.basicConfig(level=logging.INFO)
+    auto_cli({"generate": generate, "run": run, "compare": compare})
@@ -4,12 +4,17 @@ Copyright (C) 2020-2021 Jiri Borovec <...>
 
 import logging
 
-from repo_stats.cli import analyze, scrape
+from repo_stats.cli import aggregate, analyze, distinct, ingest, merge, scrape, serve
 
 # Command structure for jsonargparse
 commands = {
     "scrape": scrape,
+    "merge": merge,
+    "ingest": ingest,
     "analyze": analyze,
+    "distinct": distinct,
+    "aggregate": aggregate,
+    "serve": serve,
 }
 
 
@@ -0,0 +1,153 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import logging
+import os
+import re
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from tqdm import tqdm
+
+from repo_stats.data_io import JSON_CACHE_NAME
+from repo_stats.github import GitHub
+from repo_stats.stats import DATETIME_FREQ, cube_base_freq
+
+
+def _repo_from_dump(dump_path: str) -> str:
+    """Repository name as used in the dump file name, owner and name are joined by dash.
+
+    >>> _repo_from_dump("results/dump-github_Borda-pyRepoStats.json")
+    'Borda-pyRepoStats'
+    """
+    pattern = re.escape(JSON_CACHE_NAME).replace("%s", "(.+)", 1).replace("%s", "(.+)", 1)
+    matched = re.match(pattern, os.path.basename(dump_path))
+    assert matched, f"not a dump file: {dump_path}"
+    return matched.group(2)
+
+
+def reduce_repository(
+    dump_path: str,
+    combinations: Sequence[tuple[str, str]] = (),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_bots: Optional[Sequence[str]] = None,
+) -> dict:
+    """Load and preprocess a single dumped repository and reduce it to per-user aggregates indexed by logins.
+
+    The aggregates are additive across repositories as each issue/PR belongs just to one of them.
+
+    Args:
+        dump_path: path to the dumped repository
+        combinations: pairs of aggregation frequency and item kind for user comments
+        date_from: beginning of the time period
+        date_to: end of the time period
+        user_bots: name patterns for bot users, if not set the host default is used
+
+    Returns:
+        repository name, users summary and long tables of user comments for each combination
+    """
+    host = GitHub(
+        repo_name=_repo_from_dump(dump_path),
+        output_path=os.path.dirname(dump_path) or ".",
+        min_contribution=1,
+        user_bots=user_bots,
+    )
+    host.fetch_data(offline=True)
+    reduced = {"repo": host.data.get("repo-name", host.repo_name), "users": pd.DataFrame(), "comments": {}}
+    if not host.data.get(host.DATA_KEY_RAW_TICKETS):
+        logging.warning(f"No tickets in dump: {dump_path}")
+        return reduced
+    host.set_time_period(date_from=date_from, date_to=date_to)
+    host.preprocess_data()
+    reduced["users"] = host.users_summary()
+    for freq, parent_type in combinations:
+        reduced["comments"][(freq, parent_type)] = host.user_comments(freq=freq, parent_type=parent_type, sparse=True)
+    return reduced
+
+
+def merge_users_summaries(tables: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Sum users summaries from many repositories, users missing in some of them have zero counts there.
+
+    >>> df1 = pd.DataFrame({"opened PRs": [2, 1], "merged PRs": [0, 1]}, index=pd.Index(["me", "you"], name="user"))
+    >>> df2 = pd.DataFrame({"opened PRs": [3], "merged PRs": [2]}, index=pd.Index(["you"], name="user"))
+    >>> merge_users_summaries([df1, df2])  # doctest: +NORMALIZE_WHITESPACE
+          opened PRs  merged PRs
+    user
+    you            4           3
+    me             2           0
+    """
+    tables = [df for df in tables if not df.empty]
+    if not tables:
+        return pd.DataFrame()
+    df_users = pd.concat(tables).fillna(0).groupby(level=0, sort=False).sum().astype(int)
+    df_users.index.name = tables[0].index.name
+    return df_users.sort_values(list(df_users.columns), ascending=False)
+
+
+def merge_user_comments(tables: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Sum long tables of user comments from many repositories.
+
+    >>> df1 = pd.DataFrame([dict(created_at='2020-10', author='me', count=2)])
+    >>> df2 = pd.DataFrame([dict(created_at='2020-10', author='me', count=1),
+    ...                     dict(created_at='2020-11', author='you', count=1)])
+    >>> merge_user_comments([df1, df2])  # doctest: +NORMALIZE_WHITESPACE
+      created_at author  count
+    0    2020-10     me      3
+    1    2020-11    you      1
+    """
+    tables = [df for df in tables if not df.empty]
+    if not tables:
+        return pd.DataFrame(columns=["created_at", "author", "count"])
+    return pd.concat(tables).groupby(["created_at", "author"], as_index=False)["count"].sum()
+
+
+def aggregate_repositories(
+    dump_paths: Sequence[str],
+    combinations: Sequence[tuple[str, str]] = (),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_bots: Optional[Sequence[str]] = None,
+    nb_workers: int = 1,
+) -> dict:
+    """Reduce each repository in a worker process and merge the aggregates as they come.
+
+    Each worker holds just one repository at a time and only the compact aggregates are sent back,
+    so the memory is bounded by the largest repositories processed at once, not by the sum of all.
+
+    Args:
+        dump_paths: paths to dumped repositories
+        combinations: pairs of aggregation frequency and item kind for user comments
+        date_from: beginning of the time period
+        date_to: end of the time period
+        user_bots: name patterns for bot users, if not set the host default is used
+        nb_workers: number of worker processes
+
+    Returns:
+        merged users summary, merged long tables of user comments for each combination and repository names
+    """
+    for freq, _ in combinations:
+        if freq not in DATETIME_FREQ and to_offset(freq).n > 1 and cube_base_freq(freq) == "D":
+            logging.warning(f"Periods of frequency {freq} are anchored to the first date of each repository.")
+    merged = {"repos": [], "users": pd.DataFrame(), "comments": {comb: pd.DataFrame() for comb in combinations}}
+
+    def _merge(reduced: dict) -> None:
+        merged["repos"].append(reduced["repo"])
+        merged["users"] = merge_users_summaries([merged["users"], reduced["users"]])
+        for comb, df in reduced["comments"].items():
+            merged["comments"][comb] = merge_user_comments([merged["comments"][comb], df])
+
+    kwargs = {"combinations": combinations, "date_from": date_from, "date_to": date_to, "user_bots": user_bots}
+    if nb_workers > 1 and len(dump_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(nb_workers, len(dump_paths))) as pool:
+            futures = [pool.submit(reduce_repository, path, **kwargs) for path in dump_paths]
+            for future in tqdm(futures, desc="Reducing repositories"):
+                _merge(future.result())
+    else:
+        for path in tqdm(dump_paths, desc="Reducing repositories"):
+            _merge(reduce_repository(path, **kwargs))
+    return merged
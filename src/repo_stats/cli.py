@@ -2,14 +2,19 @@
 Copyright (C) 2020-2021 Jiri Borovec <...>
 """
 
+import codecs
+import glob
+import json
 import logging
 import os
-from typing import Optional
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Optional
 
-import matplotlib.pyplot as plt
+if TYPE_CHECKING:
+    from repo_stats.host import Host
 
-from repo_stats.github import GitHub
-from repo_stats.stats import DATETIME_FREQ
+# heavy dependencies as pandas, matplotlib or PyGithub are imported only in commands which use them,
+# so the CLI startup and parsing arguments stay fast
 
 PATH_ROOT = os.path.dirname(os.path.dirname(__file__))
 #: take global setting from OS env
@@ -20,6 +25,14 @@ def scrape(
     github_repo: str,
     auth_token: Optional[str] = None,
     output_path: str = PATH_ROOT,
+    user_bots: Optional[list[str]] = None,
+    profile: bool = False,
+    profile_stage: Optional[str] = None,
+    profile_memory: bool = True,
+    shard: Optional[str] = None,
+    api_url: Optional[str] = None,
+    max_requests: Optional[int] = None,
+    deadline: Optional[float] = None,
 ):
     """Scrape repository data from GitHub.
 
@@ -27,20 +40,141 @@ def scrape(
         github_repo: GitHub repository in format <owner>/<name>.
         auth_token: Personal Auth token needed for higher API request limit.
         output_path: Path to output directory.
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+        profile: Measure time, memory and records of each stage and save them as JSON report next to the dump.
+        profile_stage: Save also cProfile statistics of this stage, e.g. update_details or save_data.
+        profile_memory: Trace peak memory while profiling, it slows down mainly rendering, so disable it for timing.
+        shard: Fetch only tickets of shard in format <index>/<count> (index from 0) into partial dump,
+            so workers with own tokens can scrape disjoint tickets, see the `merge` command.
+        api_url: Base URL of the REST API, e.g. for GitHub Enterprise, the public API is used if not set.
+        max_requests: Budget of requests for fetching issue/PR details, open and recently updated ones go first
+            and the rest is left for the next run.
+        deadline: Stop fetching issue/PR details after this many minutes, the rest is left for the next run.
 
     """
+    import time
+
+    from repo_stats.github import GitHub
+    from repo_stats.profiling import profiling, span
+
     host = GitHub(
         repo_name=github_repo,
         output_path=output_path,
         auth_token=auth_token,
         min_contribution=1,  # Default value, not relevant for scraping
+        user_bots=user_bots,
+        shard=_parse_shard(shard) if shard else None,
+        api_url=api_url,
     )
 
-    host.fetch_data(offline=False)
+    time_end = time.monotonic() + deadline * 60 if deadline else None
+    try:
+        with profiling(profile, profile_stage=profile_stage, trace_memory=profile_memory) as profiler, span("scrape"):
+            host.fetch_data(offline=False, max_requests=max_requests, deadline=time_end)
+    except RuntimeError as ex:
+        exit(str(ex))
+    if profiler:
+        profiler.save(output_path, repo_name=github_repo, host=host.HOST_NAME, command="scrape")
     if host.outdated > 0:
         exit("The update failed to complete, please try again.")
 
-    logging.info("Data scraped successfully.")
+    if host.backlog > 0:
+        logging.info(f"Data scraped within the budget, {host.backlog} issues/PRs are left for the next run.")
+    else:
+        logging.info("Data scraped successfully.")
+
+
+def _parse_shard(shard: str) -> tuple[int, int]:
+    """Parse shard given as index and count of all shards.
+
+    >>> _parse_shard("2/4")
+    (2, 4)
+    """
+    index, _, count = shard.partition("/")
+    assert index.isdigit(), f"shard shall be in format <index>/<count>, but got: {shard}"
+    assert count.isdigit(), f"shard shall be in format <index>/<count>, but got: {shard}"
+    return int(index), int(count)
+
+
+def merge(
+    github_repo: str,
+    output_path: str = PATH_ROOT,
+    partial_paths: Optional[list[str]] = None,
+    user_bots: Optional[list[str]] = None,
+):
+    """Merge partial dumps scraped by shards into the standard cache, the later updated version of a ticket wins.
+
+    Args:
+        github_repo: GitHub repository in format <owner>/<name>.
+        output_path: Path to output directory with the cache.
+        partial_paths: Paths or glob patterns to partial dumps, if not set all shards of the repository
+            in `output_path` are merged.
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+
+    """
+    from repo_stats.data_io import JSON_SHARD_NAME
+    from repo_stats.github import GitHub
+
+    host = GitHub(repo_name=github_repo, output_path=output_path, min_contribution=1, user_bots=user_bots)
+    if not partial_paths:
+        pattern = JSON_SHARD_NAME.format(index="*", count="*") % (host.HOST_NAME, host.name)
+        partial_paths = [os.path.join(output_path, pattern)]
+    paths = sorted({p for pattern in partial_paths for p in glob.glob(os.path.expanduser(pattern))})
+    if not paths:
+        exit(f"No partial dumps found for: {partial_paths}")
+
+    partials = []
+    for path in paths:
+        logging.info(f"Loading partial dump: {path}")
+        with codecs.open(path, "r", encoding="utf8") as fp:
+            partials.append(json.load(fp))
+        assert partials[-1].get("repo-name") == github_repo, f"{path} is not dump of {github_repo}"
+    shards = {tuple(p["shard"]) for p in partials if p.get("shard")}
+    counts = {count for _, count in shards}
+    if len(counts) != 1 or len(shards) != counts.pop():
+        logging.warning(f"Merging incomplete or mixed set of shards: {sorted(shards)}")
+
+    host.fetch_data(offline=True)
+    changed = host.merge_partial_dumps(partials)
+    logging.info(f"Merged {len(changed)} added or updated tickets from {len(paths)} partial dumps.")
+    if host.outdated > 0:
+        exit(f"{host.outdated} tickets were not fetched completely, please scrape their shards again.")
+
+
+def ingest(
+    github_repo: str,
+    payload_paths: list[str],
+    output_path: str = PATH_ROOT,
+    user_bots: Optional[list[str]] = None,
+):
+    """Apply webhook payloads to the cache in order of their time, so the data stay fresh without any API request.
+
+    Args:
+        github_repo: GitHub repository in format <owner>/<name>.
+        payload_paths: Paths or glob patterns to JSON files with webhook events - issues, issue_comment,
+            pull_request and pull_request_review_comment. Each file holds the bare payload or an object with
+            the payload and the `event` name or the delivery `headers`; events of other repositories are skipped.
+        output_path: Path to output directory with the cache.
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+
+    """
+    from repo_stats.github import GitHub
+
+    host = GitHub(repo_name=github_repo, output_path=output_path, min_contribution=1, user_bots=user_bots)
+    paths = sorted({p for pattern in payload_paths for p in glob.glob(os.path.expanduser(pattern))})
+    if not paths:
+        exit(f"No webhook payloads found for: {payload_paths}")
+
+    events = []
+    for path in paths:
+        with codecs.open(path, "r", encoding="utf8") as fp:
+            events.append(json.load(fp))
+
+    host.fetch_data(offline=True)
+    changed = host.ingest_events(events)
+    logging.info(f"Applied {len(events)} webhook events, {len(changed)} issues/PRs were updated.")
+    if host.outdated > 0:
+        logging.info(f"{host.outdated} issues/PRs are not complete, they will be fetched with the next scrape.")
 
 
 def analyze(
@@ -51,8 +185,24 @@ def analyze(
     offline: bool = True,
     users_summary: Optional[list[str]] = None,
     user_comments: Optional[list[str]] = None,
+    rolling_windows: Optional[list[int]] = None,
+    user: Optional[list[str]] = None,
+    contributor_sketches: Optional[str] = None,
+    sketch_error: float = 0.02,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    time_windows: Optional[list[str]] = None,
+    window_freq: Optional[str] = None,
+    user_bots: Optional[list[str]] = None,
+    sparse_format: Optional[str] = None,
+    figure_format: str = "pdf",
+    nb_workers: int = 1,
+    title_timestamp: str = "fetched",
+    rewrite_outputs: bool = False,
+    profile: bool = False,
+    profile_stage: Optional[str] = None,
+    profile_memory: bool = True,
+    manifest: Optional[str] = None,
 ):
     """Analyze repository data.
 
@@ -63,45 +213,451 @@ def analyze(
         min_contribution: Specify minimal user contribution for visualisations.
         offline: Skip updating data from web (default: True, uses cached data).
         users_summary: Show the summary stats for each user, the first one is used for sorting.
-        user_comments: Select combination of granularity of timeline - [D]ay, [W]eek, [M]onth and [Y]ear,
-            and item type - issue or PR. Valid values: D, W, M, Y, issue, pr, all.
+        user_comments: Select combination of granularity of timeline - [D]ay, [W]eek, [M]onth and [Y]ear
+            or any pandas offset alias (e.g. QS, 2W, 4h), and item type - issue or PR.
+            Valid values: D, W, M, Y, <offset alias>, issue, pr, all.
+        rolling_windows: Show user comments, opened and merged PRs in the last N days for each given N,
+            the windows end with `date_to` or today and are updated incrementally on each sync.
+        user: Show contributions of given users only, they are looked up in the persisted user indexes,
+            so if no other report is requested the comments timeline of the whole repository is not built.
+        contributor_sketches: Save sketches of distinct commenters and authors per period with given frequency
+            next to the dump, to be merged across repositories with the `distinct` command.
+        sketch_error: Relative error of the sketched distinct counts.
         date_from: Define beginning time period.
         date_to: Define ending time period.
+        time_windows: Produce all reports for each time window in format <from>..<to>, either end can be omitted,
+            the data are loaded and preprocessed just once.
+        window_freq: Produce all reports for each consecutive time window with this frequency (e.g. MS, QS, 2W)
+            between `date_from` and `date_to` (or now).
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+        sparse_format: Export user comments as sparse long table with only non-zero user/period counts
+            in given format - csv or parquet, instead of the dense CSV table.
+        figure_format: Format of exported figures - pdf, png or svg.
+        nb_workers: Render figures in parallel with this number of processes, they are only saved, not shown.
+        title_timestamp: Time stamp in figure titles - fetched (time of the last sync), latest (the latest period)
+            or none, so figures of quiet repositories stay unchanged across syncs.
+        rewrite_outputs: Export all tables and figures even if they would be the same as the existing ones.
+        profile: Measure time, memory and records of each stage and save them as JSON report next to the dump.
+        profile_stage: Save also cProfile statistics of this stage, e.g. preprocess_data or render_figures.
+        profile_memory: Trace peak memory while profiling, it slows down mainly rendering, so disable it for timing.
+        manifest: YAML/JSON file with list of jobs, each of them sets some of the report options above
+            (see `MANIFEST_JOB_OPTIONS`) and an optional name added to its exported files, the other options
+            are taken from the command line. The data are loaded once and each distinct bot patterns
+            and time period is preprocessed just once for all jobs.
 
     """
-    host = GitHub(
-        repo_name=github_repo,
-        output_path=output_path,
-        auth_token=auth_token,
-        min_contribution=min_contribution,
-    )
+    from repo_stats.github import GitHub
+    from repo_stats.profiling import profiling, span
+
+    options = {
+        "name": None,
+        "min_contribution": min_contribution,
+        "users_summary": users_summary,
+        "user_comments": user_comments,
+        "rolling_windows": rolling_windows,
+        "user": user,
+        "date_from": date_from,
+        "date_to": date_to,
+        "time_windows": time_windows,
+        "window_freq": window_freq,
+        "user_bots": user_bots,
+        "sparse_format": sparse_format,
+        "figure_format": figure_format,
+    }
+    jobs = _load_manifest(manifest, options) if manifest else [options]
+    # fail before loading the data
+    for job in jobs:
+        assert job["figure_format"] in GitHub.FIGURE_FORMATS, f"unsupported figure format: {job['figure_format']}"
+        assert not job["sparse_format"] or job["sparse_format"] in GitHub.SPARSE_FORMATS, (
+            f"unsupported sparse format: {job['sparse_format']}"
+        )
+    variants = _group_jobs(jobs, GitHub.USER_BOTS)
+
+    with profiling(profile, profile_stage=profile_stage, trace_memory=profile_memory) as profiler, span("analyze"):
+        hosts = []
+        for bots, periods in variants.items():
+            host = GitHub(
+                repo_name=github_repo,
+                output_path=output_path,
+                auth_token=auth_token,
+                min_contribution=min_contribution,
+                user_bots=list(bots),
+                title_timestamp=title_timestamp,
+                reuse_outputs=not rewrite_outputs,
+            )
+            if hosts:
+                host.share_data(hosts[0])
+            else:
+                # Load data (offline by default, can fetch fresh data if offline=False)
+                try:
+                    host.fetch_data(offline=offline)
+                except RuntimeError as ex:
+                    exit(str(ex))
+                if not offline and host.outdated > 0:
+                    exit("The update failed to complete, please try it again or run offline.")
+            hosts.append(host)
+
+            host.select_time_period(*next(iter(periods)))
+            timeline = any(
+                not job["user"] or any([job["users_summary"], job["user_comments"], job["rolling_windows"]])
+                for units in periods.values()
+                for job, _ in units
+            )
+            host.preprocess_data(timeline=timeline or bool(contributor_sketches and len(hosts) == 1))
 
-    # Load data (offline by default, can fetch fresh data if offline=False)
-    host.fetch_data(offline=offline)
-    if not offline and host.outdated > 0:
-        exit("The update failed to complete, please try it again or run offline.")
+            logging.info("Process requested stats...")
+            if contributor_sketches and len(hosts) == 1:
+                host.select_time_period(date_from=date_from, date_to=date_to)
+                host.save_contributor_sketches(freq=contributor_sketches, error=sketch_error)
 
-    host.set_time_period(date_from=date_from, date_to=date_to)
-    host.preprocess_data()
+            for (dt_from, dt_to), units in periods.items():
+                for job, tag in units:
+                    tag = "_".join(t for t in (job["name"], tag) if t)
+                    if tag:
+                        logging.info(f"Process report: {tag}")
+                    host.select_time_period(date_from=dt_from, date_to=dt_to, tag=tag)
+                    host.min_contribution_count = job["min_contribution"]
+                    _process_reports(
+                        host,
+                        users_summary=job["users_summary"],
+                        user_comments=job["user_comments"],
+                        rolling_windows=job["rolling_windows"],
+                        user=job["user"],
+                        sparse_format=job["sparse_format"],
+                        figure_format=job["figure_format"],
+                        nb_workers=nb_workers,
+                    )
+    if profiler:
+        profiler.save(output_path, repo_name=github_repo, host=GitHub.HOST_NAME, command="analyze")
 
-    logging.info("Process requested stats...")
+    # at the end show all figures
+    if SHOW_FIGURES:
+        import matplotlib.pyplot as plt
+
+        plt.show()
+
+
+def _parse_time_windows(
+    time_windows: Optional[list[str]] = None,
+    window_freq: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> list[tuple]:
+    """Collect explicit time windows and series of consecutive windows with given frequency.
+
+    >>> _parse_time_windows(["2020-01..2020-06", "2021-01.."])
+    [('2020-01', '2020-06', '20200101-20200601'), ('2021-01', None, '20210101-end')]
+    >>> [w[2] for w in _parse_time_windows(window_freq="MS", date_from="2020-01-15", date_to="2020-03-10")]
+    ['20200115-20200131', '20200201-20200229', '20200301-20200310']
+    """
+    import pandas as pd
+
+    from repo_stats.data_io import convert_date
+
+    def _tag(dt_from, dt_to) -> str:
+        dt_from, dt_to = convert_date(dt_from), convert_date(dt_to)
+        return "-".join(
+            [dt_from.strftime("%Y%m%d") if dt_from else "start", dt_to.strftime("%Y%m%d") if dt_to else "end"]
+        )
+
+    windows = []
+    for win in time_windows or []:
+        dt_from, _, dt_to = win.partition("..")
+        windows.append((dt_from or None, dt_to or None, _tag(dt_from or None, dt_to or None)))
+    if window_freq:
+        assert date_from, "series of time windows needs `date_from`"
+        first, last = convert_date(date_from), convert_date(date_to) or pd.Timestamp.now(tz="UTC")
+        edges = [first] + [e for e in pd.date_range(first, last, freq=window_freq) if first < e <= last]
+        ends = [e - pd.Timedelta(nanoseconds=1) for e in edges[1:]] + [last]
+        windows += [(str(dt_from), str(dt_to), _tag(dt_from, dt_to)) for dt_from, dt_to in zip(edges, ends)]
+    return windows
+
+
+#: options of `analyze` which can be set for each job in the manifest
+MANIFEST_JOB_OPTIONS = (
+    "name",
+    "min_contribution",
+    "users_summary",
+    "user_comments",
+    "rolling_windows",
+    "user",
+    "date_from",
+    "date_to",
+    "time_windows",
+    "window_freq",
+    "user_bots",
+    "sparse_format",
+    "figure_format",
+)
+
+
+def _load_manifest(path: str, defaults: dict) -> list[dict]:
+    """Load jobs from YAML or JSON manifest, either a list of jobs or a mapping with `jobs` list.
+
+    Options missing in a job are taken from the defaults.
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as fp:
+    ...     _ = fp.write("jobs:\\n- {name: weekly, user_comments: [W]}\\n- {name: top, min_contribution: 9}\\n")
+    >>> jobs = _load_manifest(fp.name, dict(name=None, min_contribution=3, user_comments=None))
+    >>> [(job["name"], job["min_contribution"], job["user_comments"]) for job in jobs]
+    [('weekly', 3, ['W']), ('top', 9, None)]
+    >>> os.remove(fp.name)
+    """
+    import yaml
+
+    with open(path, encoding="utf8") as fp:
+        manifest = yaml.safe_load(fp)
+    jobs = manifest.get("jobs") if isinstance(manifest, dict) else manifest
+    assert jobs, f"No jobs found in manifest: {path}"
+    for job in jobs:
+        unknown = sorted(set(job).difference(MANIFEST_JOB_OPTIONS))
+        assert not unknown, f"Unsupported options {unknown} in job {job}, allowed are: {MANIFEST_JOB_OPTIONS}"
+    jobs = [dict(defaults, **job) for job in jobs]
+    names = [job["name"] for job in jobs]
+    assert len(set(names)) == len(names), f"Jobs need distinct names, so their outputs do not overwrite: {names}"
+    return jobs
+
+
+def _group_jobs(jobs: list[dict], default_bots: Sequence[str] = ()) -> dict[tuple, dict[tuple, list]]:
+    """Split jobs to time windows and group them by preprocessing variants - bot patterns and time period.
+
+    >>> jobs = [dict(name="a", user_bots=None, date_from="2020-01", date_to=None, time_windows=None, window_freq=None),
+    ...         dict(name="b", user_bots=None, date_from=None, date_to=None, time_windows=["2020-01..", ".."],
+    ...              window_freq=None)]
+    >>> grouped = _group_jobs(jobs)
+    >>> [(period, [(job["name"], tag) for job, tag in units]) for period, units in grouped[()].items()]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [((Timestamp('2020-01-01 00:00:00+0000', tz='UTC'), None), [('a', None), ('b', '20200101-end')]),
+     ((None, None), [('b', 'start-end')])]
+    """
+    from repo_stats.data_io import convert_date
+
+    variants = {}
+    for job in jobs:
+        bots = tuple(default_bots if job["user_bots"] is None else job["user_bots"])
+        windows = _parse_time_windows(
+            job["time_windows"], window_freq=job["window_freq"], date_from=job["date_from"], date_to=job["date_to"]
+        )
+        for dt_from, dt_to, tag in windows or [(job["date_from"], job["date_to"], None)]:
+            period = (convert_date(dt_from), convert_date(dt_to))
+            variants.setdefault(bots, {}).setdefault(period, []).append((job, tag))
+    return variants
+
+
+def _user_comment_combinations(user_comments: list[str]) -> list[tuple[str, str]]:
+    """Combine all requested frequencies with all item types, no type means all of them.
+
+    >>> _user_comment_combinations(["W", "M", "pr"])
+    [('W', 'pr'), ('M', 'pr')]
+    >>> _user_comment_combinations(["D", "all"])
+    [('D', '')]
+    """
+    from repo_stats.stats import DATETIME_FREQ, is_valid_freq
+
+    freqs = [f for f in user_comments if is_valid_freq(f)]
+    types = [t for t in user_comments if not is_valid_freq(t)]
+    if not freqs:
+        logging.warning(
+            f"You have requested {user_comments} but none of them is time aggregation:"
+            f" {DATETIME_FREQ.keys()} or pandas offset alias"
+        )
+    # if none set, use all
+    types = ["" if tp.lower() == "all" else tp for tp in types or ["all"]]
+    return [(freq, tp) for freq in freqs for tp in types]
+
+
+def _process_reports(
+    host: "Host",
+    users_summary: Optional[list[str]] = None,
+    user_comments: Optional[list[str]] = None,
+    rolling_windows: Optional[list[int]] = None,
+    user: Optional[list[str]] = None,
+    sparse_format: Optional[str] = None,
+    figure_format: str = "pdf",
+    nb_workers: int = 1,
+) -> None:
+    """Produce all requested reports for the selected time period."""
     if users_summary:
         host.print_users_summary(columns=users_summary)
 
+    if user:
+        host.print_user_report(user)
+
+    if rolling_windows:
+        host.print_rolling_summary(windows=rolling_windows)
+
     if user_comments:
-        freqs = [f for f in user_comments if f in DATETIME_FREQ]
-        types = [t for t in user_comments if t not in DATETIME_FREQ]
-        if not freqs:
-            logging.warning(
-                f"You have requested {user_comments} but none of them is time aggregation: {DATETIME_FREQ.keys()}"
+        combinations = _user_comment_combinations(user_comments)
+        if nb_workers > 1:
+            # headless rendering in parallel, the figures cannot be shown
+            host.save_user_comments(
+                combinations, sparse_format=sparse_format, fig_format=figure_format, nb_workers=nb_workers
             )
-        # if none set, use all
-        types = types or ["all"]
-        for freq in freqs:
-            for tp in types:
-                tp = "" if tp.lower() == "all" else tp
-                host.show_user_comments(freq=freq, parent_type=tp, show_fig=SHOW_FIGURES)
+        else:
+            for freq, tp in combinations:
+                host.show_user_comments(
+                    freq=freq,
+                    parent_type=tp,
+                    show_fig=SHOW_FIGURES,
+                    sparse_format=sparse_format,
+                    fig_format=figure_format,
+                )
 
-    # at the end show all figures
-    if SHOW_FIGURES:
-        plt.show()
+
+def distinct(
+    sketch_paths: list[str],
+    output_path: str = PATH_ROOT,
+):
+    """Merge distinct contributor sketches from many repositories and estimate counts per period and in total.
+
+    Args:
+        sketch_paths: Paths or glob patterns to sketch files saved by `analyze --contributor_sketches`.
+        output_path: Path to output directory.
+
+    """
+    from tabulate import tabulate
+
+    from repo_stats.github import GitHub
+    from repo_stats.sketch import merge_contributor_sketches, sketches_from_dict
+
+    paths = sorted({p for pattern in sketch_paths for p in glob.glob(os.path.expanduser(pattern))})
+    if not paths:
+        exit(f"No sketch files found for: {sketch_paths}")
+    freqs = {}
+
+    def _load(path: str) -> dict:
+        logging.info(f"Loading sketches from: {path}")
+        with codecs.open(path, "r", encoding="utf8") as fp:
+            data = json.load(fp)
+        # periods of different frequencies would be merged just by their labels
+        freqs[path] = data.get("freq")
+        assert len(set(freqs.values())) == 1, f"Sketches of different period frequencies: {freqs}"
+        return sketches_from_dict(data["sketches"])
+
+    df_counts = merge_contributor_sketches(_load(p) for p in paths)
+    csv_path = os.path.join(output_path, GitHub.CSV_DISTINCT_CONTRIBUTORS)
+    df_counts.to_csv(csv_path)
+    print(tabulate(df_counts, tablefmt="pipe", headers="keys"))
+    return csv_path
+
+
+def aggregate(
+    dump_paths: list[str],
+    output_path: str = PATH_ROOT,
+    name: str = "combined",
+    min_contribution: int = 3,
+    users_summary: Optional[list[str]] = None,
+    user_comments: Optional[list[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_bots: Optional[list[str]] = None,
+    figure_format: str = "pdf",
+    nb_workers: int = 1,
+):
+    """Analyze many dumped repositories together, e.g. all repositories of an organization.
+
+    Each repository is loaded and reduced to per-user counts in a worker process, only these are merged,
+    so the memory is bounded by the largest repositories processed at once.
+
+    Args:
+        dump_paths: Paths or glob patterns to dumps saved by `scrape`, e.g. results/dump-github_*.json.
+        output_path: Path to output directory.
+        name: Name of the combined reports used in exported file names.
+        min_contribution: Specify minimal user contribution for visualisations.
+        users_summary: Show the summary stats for each user, the first one is used for sorting.
+        user_comments: Select combination of granularity of timeline and item type, see `analyze`.
+        date_from: Define beginning time period.
+        date_to: Define ending time period.
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+        figure_format: Format of exported figures - pdf, png or svg.
+        nb_workers: Load and reduce repositories in parallel with this number of processes.
+
+    """
+    from tabulate import tabulate
+
+    from repo_stats.aggregate import aggregate_repositories
+    from repo_stats.github import GitHub
+    from repo_stats.stats import densify_user_comments
+    from repo_stats.visual import save_comments_timeline
+
+    paths = sorted({p for pattern in dump_paths for p in glob.glob(os.path.expanduser(pattern))})
+    if not paths:
+        exit(f"No dumps found for: {dump_paths}")
+    assert figure_format in GitHub.FIGURE_FORMATS, f"unsupported figure format: {figure_format}"
+
+    combinations = _user_comment_combinations(user_comments) if user_comments else []
+    merged = aggregate_repositories(
+        paths,
+        combinations=combinations,
+        date_from=date_from,
+        date_to=date_to,
+        user_bots=user_bots,
+        nb_workers=nb_workers,
+    )
+    logging.info(f"Aggregated {len(merged['repos'])} repositories: {merged['repos']}")
+
+    df_users = merged["users"]
+    if users_summary and not df_users.empty:
+        columns = [c for c in users_summary if c in df_users.columns] or list(df_users.columns)
+        df_users = df_users[columns].sort_values(columns[0], ascending=False)
+        df_users.to_csv(os.path.join(output_path, GitHub.CSV_USERS_SUMMARY % (GitHub.HOST_NAME, name)))
+        print(tabulate(df_users[df_users[columns[0]] >= min_contribution], tablefmt="pipe", headers="keys"))
+
+    for (freq, tp), df_long in merged["comments"].items():
+        if df_long.empty:
+            logging.warning(f'No user comments for freq: "{freq}" & type: "{tp}"')
+            continue
+        name_args = (GitHub.HOST_NAME, name, freq, tp or "all")
+        df_comments = densify_user_comments(df_long)
+        df_comments.to_csv(os.path.join(output_path, GitHub.CSV_USER_COMMENTS % name_args))
+        save_comments_timeline(
+            densify_user_comments(df_long, min_contribution=min_contribution),
+            os.path.join(output_path, GitHub.FIG_USER_COMMENTS % (*name_args, figure_format)),
+            title=f"User comments aggregation - {len(merged['repos'])} repositories - Freq: {freq}, Type:{tp or 'all'}",
+        )
+
+
+def serve(
+    output_path: str = PATH_ROOT,
+    github_repos: Optional[list[str]] = None,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    max_repos: int = 8,
+    sync_interval: float = 0,
+    auth_token: Optional[str] = None,
+    min_contribution: int = 3,
+    user_bots: Optional[list[str]] = None,
+):
+    """Keep loaded and preprocessed repositories in memory and serve their stats on a local API.
+
+    Queries are `GET /<owner>/<name>/users_summary?columns=...` and
+    `GET /<owner>/<name>/user_comments?freq=...&type=...`, both accept `date_from` and `date_to`.
+
+    Args:
+        output_path: Path to the dumped repositories.
+        github_repos: Repositories in format <owner>/<name> loaded at the start, others are loaded on request.
+        host: Local address to listen on.
+        port: Local port to listen on.
+        socket_path: Listen on this Unix socket instead of TCP port.
+        max_repos: Maximal number of repositories kept in memory, the least recently used ones are evicted.
+        sync_interval: Sync loaded repositories from GitHub with this period in minutes, zero disables syncing.
+        auth_token: Personal Auth token needed for higher API request limit.
+        min_contribution: Specify minimal user contribution.
+        user_bots: Name patterns to recognise bot users, overrides the host defaults.
+
+    """
+    from repo_stats.serve import RepoPool, run_server
+
+    pool = RepoPool(
+        output_path=output_path,
+        max_repos=max_repos,
+        auth_token=auth_token,
+        min_contribution=min_contribution,
+        user_bots=user_bots,
+    )
+    for repo in github_repos or []:
+        with pool.use(repo):
+            logging.info(f"Loaded repository: {repo}")
+    run_server(pool, host=host, port=port, socket_path=socket_path, sync_interval=sync_interval * 60)
@@ -3,34 +3,56 @@ Copyright (C) 2020-2021 Jiri Borovec <...>
 """
 
 import codecs
+import hashlib
 import json
 import logging
 import os
+import re
 from datetime import datetime
-from distutils.version import LooseVersion
 from typing import Any, Union
 from warnings import warn
 
+import numpy as np
 import pandas as pd
 from pandas.errors import ParserError
 
 from repo_stats import __version__
 
 JSON_CACHE_NAME = "dump-%s_%s.json"
+#: file name for distinct contributor sketches saved next to the dump
+JSON_SKETCH_NAME = "sketch-%s_%s.json"
+#: file name for the keys of exported tables and figures saved next to them
+JSON_OUTPUTS_NAME = "outputs-%s_%s.json"
+#: file name for the partial dump with tickets of a single shard
+JSON_SHARD_NAME = "shard-%s_%s_{index}-of-{count}.json"
+#: file name for the profiling report of a CLI command
+JSON_PROFILE_NAME = "profile-%s_%s_{command}.json"
 
 
-def _make_json_name(repo_name: str, host: str = "") -> str:
+def _make_json_name(repo_name: str, host: str = "", template: str = JSON_CACHE_NAME) -> str:
     """Create standard file name."""
-    return JSON_CACHE_NAME % (host, repo_name.replace("/", "-"))
+    return template % (host, repo_name.replace("/", "-"))
 
 
-def load_data(path_dir: str, repo_name: str, host: str = "") -> dict:
+def _version_tuple(version: str) -> tuple[int, ...]:
+    """Parse numeric version parts, ignoring any suffix like `rc1` or `.dev`.
+
+    >>> _version_tuple("0.1.4")
+    (0, 1, 4)
+    >>> _version_tuple("0.2.0rc1") > _version_tuple("0.1.4") > _version_tuple("0.1")
+    True
+    """
+    return tuple(int(m.group()) for m in (re.match(r"\d+", part) for part in version.split(".")) if m)
+
+
+def load_data(path_dir: str, repo_name: str, host: str = "", template: str = JSON_CACHE_NAME) -> dict:
     """Load dumped data.
 
     Args:
         path_dir: folder for saving data
         repo_name: repository name, it shall be uniques for given provider
         host: host or Git server provider
+        template: file name template
 
     Returns:
         loaded processing data
@@ -49,7 +71,7 @@ def load_data(path_dir: str, repo_name: str, host: str = "") -> dict:
         >>> os.remove(pj)
     """
     assert os.path.isdir(path_dir), f"Wrong folder: {path_dir}"
-    cache_path = os.path.join(path_dir, _make_json_name(repo_name, host))
+    cache_path = os.path.join(path_dir, _make_json_name(repo_name, host, template))
     logging.info(f"Loading data from: {cache_path}")
 
     if os.path.isfile(cache_path):
@@ -57,7 +79,7 @@ def load_data(path_dir: str, repo_name: str, host: str = "") -> dict:
             data = json.load(fp)
         data["version"] = data.get("version", "0.0")
 
-        if LooseVersion(data["version"]) < LooseVersion("0.1.4"):
+        if _version_tuple(data["version"]) < (0, 1, 4):
             warn(
                 f"Your last dump was made with {data['version']} which has missing review comments.\n"
                 " We highly recommend to invalidate this cache and fetch all data from the ground..."
@@ -67,7 +89,7 @@ def load_data(path_dir: str, repo_name: str, host: str = "") -> dict:
     return data
 
 
-def save_data(data: dict, path_dir: str, repo_name: str, host: str = "") -> str:
+def save_data(data: dict, path_dir: str, repo_name: str, host: str = "", template: str = JSON_CACHE_NAME) -> str:
     """Dump processing data.
 
     Args:
@@ -75,12 +97,13 @@ def save_data(data: dict, path_dir: str, repo_name: str, host: str = "") -> str:
         path_dir: folder for saving data
         repo_name: repository name, it shall be uniques for given provider
         host: host or Git server provider
+        template: file name template
 
     Returns:
         path to the saved file
     """
     assert os.path.isdir(path_dir)
-    cache_path = os.path.join(path_dir, _make_json_name(repo_name, host))
+    cache_path = os.path.join(path_dir, _make_json_name(repo_name, host, template))
     logging.info(f"Saving data to: {cache_path}")
 
     data.update(
@@ -99,6 +122,28 @@ def save_data(data: dict, path_dir: str, repo_name: str, host: str = "") -> str:
     return cache_path
 
 
+def hash_table(df: pd.DataFrame, **params: Any) -> str:
+    """Content key of a table together with parameters which the derived output depends on.
+
+    >>> df = pd.DataFrame({"me": [1, 2], "you": [3, 4]}, index=["2020-10", "2020-11"])
+    >>> hash_table(df, freq="M") == hash_table(df.copy(), freq="M")
+    True
+    >>> hash_table(df, freq="M") == hash_table(df, freq="W")
+    False
+    >>> hash_table(df, freq="M") == hash_table(df.rename(columns={"you": "they"}), freq="M")
+    False
+    """
+    sha = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    meta = {
+        "columns": [str(c) for c in df.columns],
+        "index": [str(n) for n in df.index.names],
+        "version": __version__,
+        "params": params,
+    }
+    sha.update(json.dumps(meta, sort_keys=True, default=str).encode("utf8"))
+    return sha.hexdigest()
+
+
 def convert_date(date: Any):
     """Convert date-time if possible
 
@@ -149,3 +194,83 @@ def is_in_time_period(
         if datetime_to:
             is_in &= dt <= datetime_to
     return is_in
+
+
+def convert_dates(dates: Union[pd.Series, list]) -> pd.Series:
+    """Convert a column of date-times at once, missing dates become `NaT`.
+
+    >>> convert_dates(["2020-08-01T12:00:00Z", None, "2020-08-03"]).tolist()
+    [Timestamp('2020-08-01 12:00:00+0000', tz='UTC'), NaT, Timestamp('2020-08-03 00:00:00+0000', tz='UTC')]
+    """
+    dates = pd.Series(dates, dtype=object)
+    try:
+        return pd.to_datetime(dates, utc=True, format="ISO8601")
+    except (ParserError, ValueError):
+        # fallback to parsing each date independently
+        return pd.to_datetime(dates, utc=True, format="mixed", errors="coerce")
+
+
+def mask_in_time_period(
+    dates: Union[pd.Series, list],
+    datetime_from: Union[datetime, str] = None,
+    datetime_to: Union[datetime, str] = None,
+) -> pd.Series:
+    """Check if dates are in range, vectorized version of :func:`is_in_time_period`.
+
+    >>> mask_in_time_period(['2020', None, '2021-02'], datetime_from='2020-06').tolist()
+    [False, False, True]
+    >>> mask_in_time_period(['2020', None]).tolist()
+    [True, True]
+    """
+    dates = convert_dates(dates)
+    datetime_from, datetime_to = convert_date(datetime_from), convert_date(datetime_to)
+    mask = pd.Series(True, index=dates.index)
+    # missing dates are `NaT` which always fails the comparison
+    if datetime_from:
+        mask &= dates >= datetime_from
+    if datetime_to:
+        mask &= dates <= datetime_to
+    return mask
+
+
+class TimeIndex:
+    """Items sorted by their date-time, so selecting any time period is just a binary search.
+
+    >>> items = [dict(i=0, at='2020-03-01'), dict(i=1, at='2020-01-01'), dict(i=2, at=None), dict(i=3, at='2020-02-01')]
+    >>> index = TimeIndex(items, key='at')
+    >>> [it['i'] for it in index.select(datetime_from='2020-01-15', datetime_to='2020-03-01')]
+    [3, 0]
+    >>> [it['i'] for it in index.select()]
+    [1, 3, 0, 2]
+    """
+
+    def __init__(self, items: list[dict], key: str = "count_at"):
+        """
+        Args:
+            items: collection of items with date-time
+            key: name of the date-time field
+        """
+        dates = convert_dates([it[key] for it in items])
+        dated = dates.notna().to_numpy()
+        times = dates[dated].dt.tz_convert(None).to_numpy().astype("datetime64[ns]")
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.items = [items[i] for i in np.flatnonzero(dated)[order]]
+        #: items without date, they are used only if no time period is set
+        self.undated = [it for it, valid in zip(items, dated) if not valid]
+
+    @staticmethod
+    def _as_datetime64(dt: Union[datetime, str]) -> np.datetime64:
+        return convert_date(dt).tz_convert(None).to_datetime64().astype("datetime64[ns]")
+
+    def select(
+        self,
+        datetime_from: Union[datetime, str] = None,
+        datetime_to: Union[datetime, str] = None,
+    ) -> list[dict]:
+        """Select items in time period, both ends are included."""
+        if not datetime_from and not datetime_to:
+            return self.items + self.undated
+        first = np.searchsorted(self.times, self._as_datetime64(datetime_from), "left") if datetime_from else 0
+        last = np.searchsorted(self.times, self._as_datetime64(datetime_to), "right") if datetime_to else None
+        return self.items[first:last]
@@ -3,14 +3,17 @@ Copyright (C) 2020-2021 Jiri Borovec <...>
 """
 
 import logging
+import math
+import time
 import warnings
+from collections.abc import Iterator, Sequence
+from itertools import chain
 from typing import Optional
 
 import pandas as pd
-from github import Github as GithubAPI
-from github import GithubException
 from tqdm import tqdm
 
+from repo_stats.data_io import convert_date
 from repo_stats.host import Host
 
 
@@ -28,8 +31,8 @@ class GitHub(Host):
     URL_API = "https://api.github.com/repos"
     #: OS env. variable for getting Token
     OS_ENV_AUTH_TOKEN = "GH_API_TOKEN"
-    #: if you have reached the number of free/allowed requests
-    API_LIMIT_REACHED = False
+    #: wait time in seconds after reaching the request limit if the API does not tell its reset time
+    API_LIMIT_WAIT = 3600
     #: hint/explanation what happened
     API_LIMIT_MESSAGE = """
 Request failed, probably you have reached free/personal request's limit...
@@ -44,6 +47,10 @@ To use higher limit generate personal auth token, see https://developer.github.c
     )
     #: Wait time for URL reply in seconds
     REQUEST_TIMEOUT = 15
+    #: number of items listed in a single request
+    API_PAGE_SIZE = 30
+    #: webhook events which update issues/PRs and their comments
+    WEBHOOK_EVENTS = ("issues", "issue_comment", "pull_request", "pull_request_review_comment")
 
     def __init__(
         self,
@@ -51,22 +58,76 @@ To use higher limit generate personal auth token, see https://developer.github.c
         output_path: str,
         auth_token: Optional[str] = None,
         min_contribution: int = 3,
+        user_bots: Optional[Sequence[str]] = None,
+        title_timestamp: str = "fetched",
+        reuse_outputs: bool = True,
+        shard: Optional[tuple[int, int]] = None,
+        api_url: Optional[str] = None,
     ):
+        """
+        Args:
+            api_url: base URL of the REST API, e.g. for GitHub Enterprise or testing, the public API if not set
+
+        For other arguments see :class:`repo_stats.host.Host`.
+        """
         super().__init__(
             repo_name=repo_name,
             output_path=output_path,
             auth_token=auth_token,
             min_contribution=min_contribution,
+            user_bots=user_bots,
+            title_timestamp=title_timestamp,
+            reuse_outputs=reuse_outputs,
+            shard=shard,
         )
-        # Initialize PyGithub client with the auth token from instance (which may have been populated from env)
-        if self.auth_token:
-            self.github_client = GithubAPI(self.auth_token, timeout=self.REQUEST_TIMEOUT)
-        else:
-            self.github_client = GithubAPI(timeout=self.REQUEST_TIMEOUT)
+        self.api_url = api_url
+        self._github_client = None
         self.repo = None
+        # epoch time when the reached request limit is reset
+        self._api_limit_reset = None
+
+    @property
+    def api_limit_reached(self) -> bool:
+        """If the request limit is reached, it expires with the reset time, so long-running processes fetch again.
+
+        >>> host = GitHub("Borda/pyRepoStats", output_path=".")
+        >>> host._set_api_limit_reached()
+        >>> host.api_limit_reached
+        True
+        >>> host._api_limit_reset = time.time() - 1
+        >>> host.api_limit_reached
+        False
+        """
+        if self._api_limit_reset is not None and time.time() >= self._api_limit_reset:
+            logging.info("The request limit has been reset.")
+            self._api_limit_reset = None
+        return self._api_limit_reset is not None
+
+    def _set_api_limit_reached(self, ex: Optional[Exception] = None) -> None:
+        """Mark the request limit as reached until the reset time from the failed response headers."""
+        reset = (getattr(ex, "headers", None) or {}).get("x-ratelimit-reset")
+        self._api_limit_reset = float(reset) if reset else time.time() + self.API_LIMIT_WAIT
+
+    @property
+    def github_client(self):
+        """PyGithub client created with the first request, so offline processing does not import PyGithub."""
+        if self._github_client is None:
+            from github import Github as GithubAPI
+
+            kwargs = {"timeout": self.REQUEST_TIMEOUT}
+            if self.api_url:
+                kwargs["base_url"] = self.api_url
+            # Initialize PyGithub client with the auth token from instance (which may have been populated from env)
+            if self.auth_token:
+                self._github_client = GithubAPI(self.auth_token, **kwargs)
+            else:
+                self._github_client = GithubAPI(**kwargs)
+        return self._github_client
 
     def _fetch_info(self) -> list[dict]:
         """Download general package info."""
+        from github import GithubException
+
         try:
             # Lazily initialize repo if needed
             if self.repo is None:
@@ -88,7 +149,14 @@ To use higher limit generate personal auth token, see https://developer.github.c
             return []
 
     def _fetch_overview(self) -> list[dict]:
-        """Fetch all issues from a given repo using listing per pages."""
+        """Fetch all issues from a given repo using listing per pages.
+
+        With reached request limit it raises `RuntimeError`, so nothing is requested until the limit is reset.
+        """
+        from github import GithubException
+
+        if self.api_limit_reached:
+            raise RuntimeError(self.API_LIMIT_MESSAGE)
         items = []
         try:
             # Lazily initialize repo if needed
@@ -128,15 +196,17 @@ To use higher limit generate personal auth token, see https://developer.github.c
 
         except GithubException as e:
             if e.status == 403:
-                logging.error(self.API_LIMIT_MESSAGE)
-                exit(self.API_LIMIT_MESSAGE)
+                self._set_api_limit_reached(e)
+                raise RuntimeError(self.API_LIMIT_MESSAGE) from e
             raise
 
         return items
 
     def _request_comments(self, issue_number: int) -> Optional[list]:
         """Request all comments from the issue life-time."""
-        if GitHub.API_LIMIT_REACHED:
+        from github import GithubException
+
+        if self.api_limit_reached:
             return None
         try:
             # Lazily initialize repo if needed
@@ -157,12 +227,14 @@ To use higher limit generate personal auth token, see https://developer.github.c
             return comments
         except GithubException as e:
             if e.status == 403:
-                GitHub.API_LIMIT_REACHED = True
+                self._set_api_limit_reached(e)
             return None
 
     def _request_detail_pr(self, pr_number: int) -> Optional[dict]:
         """Request PR status, in particular we want to distinguish between closed and merged ones."""
-        if GitHub.API_LIMIT_REACHED:
+        from github import GithubException
+
+        if self.api_limit_reached:
             return None
         try:
             # Lazily initialize repo if needed
@@ -178,7 +250,7 @@ To use higher limit generate personal auth token, see https://developer.github.c
             }
         except GithubException as e:
             if e.status == 403:
-                GitHub.API_LIMIT_REACHED = True
+                self._set_api_limit_reached(e)
             return None
 
     def _update_detail(self, idx_item: tuple[int, dict]) -> tuple:
@@ -207,7 +279,9 @@ To use higher limit generate personal auth token, see https://developer.github.c
 
     def _request_review_comments(self, pr_number: int) -> Optional[list]:
         """Request all review comments from a pull request."""
-        if GitHub.API_LIMIT_REACHED:
+        from github import GithubException
+
+        if self.api_limit_reached:
             return None
         try:
             # Lazily initialize repo if needed
@@ -228,7 +302,7 @@ To use higher limit generate personal auth token, see https://developer.github.c
             return review_comments
         except GithubException as e:
             if e.status == 403:
-                GitHub.API_LIMIT_REACHED = True
+                self._set_api_limit_reached(e)
             return None
 
     @staticmethod
@@ -243,69 +317,258 @@ To use higher limit generate personal auth token, see https://developer.github.c
             )
         ]
 
-    def _update_details(self, issues: dict[str, dict], issues_new: dict[str, dict]) -> dict[str, dict]:
-        """Pull all exiting details to particular issues."""
+    def _estimate_requests(self, item: dict) -> int:
+        """Estimate number of requests for fetching the issue/PR details, comments are listed by pages.
+
+        >>> host = GitHub("Borda/pyRepoStats", output_path=".")
+        >>> host._estimate_requests({"html_url": "https://github.com/Borda/pyRepoStats/issues/1", "comments": 45})
+        3
+        >>> host._estimate_requests({"html_url": "https://github.com/Borda/pyRepoStats/pull/2", "comments": 0})
+        5
+        """
+        nb_comments = item.get("comments") or 0
+        if isinstance(nb_comments, list):
+            nb_comments = len(nb_comments)
+        nb_requests = 1 + max(math.ceil(nb_comments / self.API_PAGE_SIZE), 1)
+        if "pull" in item["html_url"].split("/"):
+            # PR detail, PR for review comments and at least one page of review comments
+            nb_requests += 3
+        return nb_requests
+
+    def _update_details(
+        self,
+        issues: dict[str, dict],
+        issues_new: dict[str, dict],
+        max_requests: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> dict[str, dict]:
+        """Pull details of new and updated issues, the most valuable first, until the budget is spent."""
         # filter missing issue or issues which was updated since last time
-        queue = self.__update_issues_queue(issues, issues_new)
+        queue = self._prioritize_queue(self.__update_issues_queue(issues, issues_new), issues_new)
+        self.backlog = 0
         if not queue:
             logging.info("All issues/PRs are up-to-date")
             return issues
 
-        _queue = [(i, issues_new[i]) for i in queue]
-
         # Process items sequentially with PyGithub (avoid multiprocessing complexity with instance methods)
-        for idx_item in tqdm(_queue, desc="Fetching/update details"):
-            idx, item = self._update_detail(idx_item)
+        fetched, nb_requests = [], 0
+        for idx in tqdm(queue, desc="Fetching/update details"):
+            if self.api_limit_reached or (deadline is not None and time.monotonic() > deadline):
+                # the rest is left untouched for the next run
+                break
+            estimate = self._estimate_requests(issues_new[idx])
+            # the first ticket is fetched anyway, so a ticket over the whole budget does not block all runs
+            if max_requests is not None and nb_requests + estimate > max_requests and fetched:
+                # a cheaper ticket may still fit in the budget
+                continue
+            nb_requests += estimate
+            idx, item = self._update_detail((idx, issues_new[idx]))
+            fetched.append(idx)
             if item is None:
-                if not GitHub.API_LIMIT_REACHED:
-                    # show this warning only once
-                    warnings.warn(self.API_LIMIT_MESSAGE)
-                GitHub.API_LIMIT_REACHED = True
                 # drop update date or another way to set that this issue was not fetch completely
                 item = issues.get(idx, issues_new.get(idx))
                 item["updated_at"] = None
+                issues[idx] = item
+                if self.api_limit_reached:
+                    warnings.warn(self.API_LIMIT_MESSAGE)
+                else:
+                    logging.warning(f"Fetching details of issue/PR {idx} failed, it is left for the next run.")
+                continue
             issues[idx] = item
-
-        self.outdated = len(self.__update_issues_queue(issues, issues_new))
+        # mark for incremental pre-processing
+        self.changed_tickets.update(fetched)
+
+        done = set(fetched)
+        backlog = [idx for idx in queue if idx not in done]
+        self.backlog = len(backlog)
+        self.outdated = len(self.__update_issues_queue(issues, issues_new)) - self.backlog
+        if backlog:
+            nb_open = sum(issues_new[idx]["state"] == "open" for idx in backlog)
+            logging.warning(
+                f"Fetched {len(fetched)} issues/PRs with ~{nb_requests} requests, {len(backlog)} ({nb_open} open)"
+                f" are left for the next run with ~{sum(self._estimate_requests(issues_new[i]) for i in backlog)}"
+                " requests."
+            )
         return issues
 
     @staticmethod
-    def __parse_user(field: dict) -> str:
-        return field["user"]["login"]
+    def _parse_event(event: dict) -> tuple[Optional[str], dict]:
+        """Get name and payload of the webhook event.
+
+        The event is either the bare payload, which is recognised by its content, or the payload wrapped
+        together with the event name or the delivery headers.
+
+        >>> GitHub._parse_event({"action": "created", "issue": {}, "comment": {}})[0]
+        'issue_comment'
+        >>> GitHub._parse_event({"headers": {"X-GitHub-Event": "pull_request"}, "payload": {"action": "closed"}})
+        ('pull_request', {'action': 'closed'})
+        """
+        if "payload" in event:
+            headers = {key.lower(): val for key, val in event.get("headers", {}).items()}
+            return event.get("event") or headers.get("x-github-event"), event["payload"]
+        if "comment" in event:
+            return ("pull_request_review_comment" if "pull_request" in event else "issue_comment"), event
+        if "pull_request" in event:
+            return "pull_request", event
+        if "issue" in event:
+            return "issues", event
+        return None, event
+
+    def _event_time(self, event: dict) -> Optional[str]:
+        """Get the update time of the comment or issue/PR carried by the webhook event.
+
+        >>> host = GitHub("Borda/pyRepoStats", output_path=".")
+        >>> host._event_time({"issue": {"updated_at": "2020-10-05"}, "comment": {"created_at": "2020-10-04"}})
+        '2020-10-04'
+        """
+        _, payload = self._parse_event(event)
+        entity = payload.get("comment") or payload.get("pull_request") or payload.get("issue") or {}
+        return entity.get("updated_at") or entity.get("created_at")
 
-    def __filer_commenter(self, comment: dict, in_period: bool) -> int:
+    @staticmethod
+    def _ticket_from_event(parent: dict) -> dict:
+        """Convert issue/PR from the webhook payload to the same fields as fetched in the overview and details."""
+        ticket = {
+            "number": parent["number"],
+            "html_url": parent["html_url"],
+            "url": parent.get("url"),
+            "state": "merged" if parent.get("merged") else parent["state"],
+            "title": parent.get("title"),
+            "user": {"login": (parent.get("user") or {}).get("login", "unknown")},
+            "created_at": parent.get("created_at"),
+            "updated_at": parent.get("updated_at"),
+            "closed_at": parent.get("closed_at"),
+        }
+        if "pull" in parent["html_url"].split("/"):
+            ticket["pull_request"] = {
+                "url": parent.get("pull_request", {}).get("url", parent.get("url")),
+                "html_url": parent["html_url"],
+            }
+        if "merged" in parent:
+            ticket["merged_at"] = parent.get("merged_at")
+        return ticket
+
+    @staticmethod
+    def _apply_comment(comments: list[dict], comment: dict, deleted: bool = False) -> None:
+        """Add, update or remove the comment, it is matched by its ID or by its author and creation time.
+
+        >>> comments = [{"user": {"login": "me"}, "body": "hi", "created_at": "2020-10-05T03:00:00+00:00"}]
+        >>> comment = {"id": 7, "user": {"login": "me"}, "body": "hello", "created_at": "2020-10-05T03:00:00Z",
+        ...            "updated_at": "2020-10-06T00:00:00Z"}
+        >>> GitHub._apply_comment(comments, comment)
+        >>> [c["body"] for c in comments]
+        ['hello']
+        >>> GitHub._apply_comment(comments, dict(comment, body="old", updated_at="2020-10-05T03:00:00Z"))
+        >>> [c["body"] for c in comments]
+        ['hello']
+        >>> GitHub._apply_comment(comments, comment, deleted=True)
+        >>> comments
+        []
+        """
+        new = {
+            "id": comment.get("id"),
+            "user": {"login": (comment.get("user") or {}).get("login", "unknown")},
+            "body": comment.get("body") or "",
+            "created_at": comment.get("created_at"),
+            "updated_at": comment.get("updated_at") or comment.get("created_at"),
+        }
+        key = (new["user"]["login"], convert_date(new["created_at"]))
+        match = next(
+            (
+                i
+                for i, cmt in enumerate(comments)
+                if (new["id"] is not None and cmt.get("id") == new["id"])
+                or (cmt["user"]["login"], convert_date(cmt["created_at"])) == key
+            ),
+            None,
+        )
+        if deleted:
+            if match is not None:
+                del comments[match]
+        elif match is None:
+            comments.append(new)
+        elif convert_date(new["updated_at"]) >= convert_date(comments[match].get("updated_at") or new["updated_at"]):
+            comments[match] = new
+
+    def _apply_event(self, tickets: dict[str, dict], event: dict) -> Optional[str]:
+        """Apply the webhook event to raw tickets in place and return the key of touched ticket, if any."""
+        name, payload = self._parse_event(event)
+        repo = (payload.get("repository") or {}).get("full_name")
+        if name not in self.WEBHOOK_EVENTS or (repo and repo.lower() != self.repo_name.lower()):
+            logging.debug(f"Skipping webhook event {name} of repository {repo}")
+            return None
+        action = payload.get("action")
+        parent = payload["pull_request"] if name.startswith("pull_request") else payload["issue"]
+        idx = str(parent["number"])
+        if name == "issues" and action in ("deleted", "transferred"):
+            return idx if tickets.pop(idx, None) is not None else None
+
+        fields = self._ticket_from_event(parent)
+        ticket = tickets.get(idx)
+        if ticket is None:
+            # only just opened issue/PR has no history which would be missing
+            complete = action == "opened" and name in ("issues", "pull_request")
+            ticket = tickets[idx] = dict(fields, comments=[], review_comments=[])
+            if not complete:
+                ticket["updated_at"] = None
+        elif not self._is_newer_ticket(ticket, fields):
+            if ticket["state"] == "merged" and "merged" not in parent:
+                # issue payloads of PRs do not know about merging
+                fields["state"] = "merged"
+            # incompletely fetched ticket keeps unset update time, so it is fetched again
+            fields["updated_at"] = fields["updated_at"] if ticket["updated_at"] else None
+            ticket.update(fields)
+        for key in ("comments", "review_comments"):
+            if not isinstance(ticket.get(key), list):
+                ticket[key] = []
+
+        if name in ("issue_comment", "pull_request_review_comment"):
+            key = "comments" if name == "issue_comment" else "review_comments"
+            self._apply_comment(ticket[key], payload["comment"], deleted=action == "deleted")
+        return idx
+
+    def __parse_user(self, field: dict) -> int:
+        """Get interned user ID."""
+        return self.users.intern(field["user"]["login"])
+
+    def __filer_commenter(self, comment: dict) -> int:
         """Filter valid commenter by name and content."""
-        if self._is_user_bot(self.__parse_user(comment)):
+        if self.users.is_bot(self.__parse_user(comment)):
             return 1
-        if in_period and not self._is_in_time_period(comment["updated_at"]):
-            return 2
         if self._is_spam_message(comment["body"]):
-            return 3
+            return 2
         return 0
 
-    def _convert_to_simple(self, issues: list[dict]) -> list[dict]:
-        """Aggregate issue/PR affiliations."""
-
-        def _get_commenters(issue) -> list:
-            return _unique_list(
-                [
-                    self.__parse_user(com)
-                    for com in issue["comments"] + issue["review_comments"]
-                    if self.__filer_commenter(com, in_period=True) == 0
-                ]
-            )
+    @staticmethod
+    def _iter_comments(issue: dict) -> Iterator[dict]:
+        """Iterate over issue and review comments together without copying or changing the raw lists.
+
+        >>> issue = {"comments": [{"body": "a"}], "review_comments": [{"body": "b"}]}
+        >>> [c["body"] for c in GitHub._iter_comments(issue)]
+        ['a', 'b']
+        >>> issue["comments"]
+        [{'body': 'a'}]
+        >>> list(GitHub._iter_comments({"comments": 3}))
+        []
+        """
+        # if fetch fails `comments` is int and `review_comments` is missing
+        return chain.from_iterable(
+            issue[key] for key in ("comments", "review_comments") if isinstance(issue.get(key), list)
+        )
 
+    def _convert_to_simple(self, issues: list[dict]) -> list[dict]:
+        """Aggregate issue/PR affiliations, commenters are attached later according to the time period."""
         # init collections of items from issues
         items = [
             {
                 "type": "PR" if "pull" in issue["html_url"] else "issue",
+                "number": int(issue["number"]),
                 "state": issue["state"],
                 "author": self.__parse_user(issue),
                 "created_at": issue["created_at"],
                 "closed_at": issue.get("closed_at"),
-                "commenters": _get_commenters(issue),
             }
-            for issue in tqdm(issues, desc="Parsing simplified tickets")
+            for issue in issues
             # if fetch fails `comments` is int and `review_comments` is missing
             if isinstance(issue["comments"], list) and isinstance(issue.get("review_comments"), list)
         ]
@@ -317,19 +580,15 @@ To use higher limit generate personal auth token, see https://developer.github.c
                     "count_at": it.get("updated_at", it["created_at"]) if it["type"] == "issue" else it["closed_at"]
                 }
             )
-            for it in tqdm(items, desc="Update simplified tickets")
+            for it in items
         ]
         return items
 
     def _convert_comments_timeline(self, issues: list[dict]) -> list[dict]:
-        """Aggregate comments for all issue/PR affiliations."""
+        """Aggregate comments for all issue/PR affiliations regardless the time period."""
 
         comments = []
-        for item in tqdm(issues, desc="Parsing comments from all repo"):
-            item_comments = item["comments"] if isinstance(item["comments"], list) else []
-            item_comments += item.get("review_comments", [])
-            if not isinstance(item_comments, list):
-                continue
+        for item in issues:
             comments += [
                 {
                     "parent_type": "PR" if "pull" in item["html_url"] else "issue",
@@ -338,15 +597,10 @@ To use higher limit generate personal auth token, see https://developer.github.c
                     "created_at": cmt["created_at"],
                     "count_at": cmt.get("updated_at", cmt["created_at"]),
                 }
-                for cmt in item_comments
-                if self.__filer_commenter(cmt, in_period=False) == 0
+                for cmt in self._iter_comments(item)
+                if self.__filer_commenter(cmt) == 0
             ]
-        # filter within given time frame
-        return [cmt for cmt in comments if self._is_in_time_period(cmt["count_at"])]
-
-
-def _unique_list(arr) -> list:
-    return list(set(arr))
+        return comments
 
 
 def _dt_update(arr, i):
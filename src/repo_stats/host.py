@@ -6,14 +6,46 @@ import logging
 import os
 import re
 from abc import abstractmethod
+from collections import defaultdict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
 from typing import Optional
 
-import matplotlib.pyplot as plt
-from tabulate import tabulate
+import pandas as pd
+from tqdm import tqdm
 
-from repo_stats.data_io import convert_date, is_in_time_period, load_data, save_data
-from repo_stats.stats import compute_user_comment_timeline, compute_users_summary
-from repo_stats.visual import draw_comments_timeline
+from repo_stats.data_io import (
+    JSON_CACHE_NAME,
+    JSON_OUTPUTS_NAME,
+    JSON_SHARD_NAME,
+    JSON_SKETCH_NAME,
+    TimeIndex,
+    convert_date,
+    convert_dates,
+    hash_table,
+    is_in_time_period,
+    load_data,
+    mask_in_time_period,
+    save_data,
+)
+from repo_stats.index import build_index, index_ticket, lookup_users
+from repo_stats.profiling import span
+from repo_stats.sketch import compute_contributor_sketches, sketches_to_dict
+from repo_stats.stats import (
+    add_user_counters,
+    compute_comment_cube,
+    compute_user_counters,
+    compute_users_summary,
+    cube_base_freq,
+    daily_contributions_from_counters,
+    densify_user_comments,
+    rolling_contributions_table,
+    rollup_comment_cube,
+    summarize_user_counters,
+    update_rolling_contributions,
+)
+from repo_stats.users import UserRegistry
 
 
 class Host:
@@ -27,10 +59,24 @@ class Host:
     NB_PARALLEL_REQUESTS = 7
     #: template name for exporting CSV with users overview
     CSV_USERS_SUMMARY = "%s_%s_users-summary.csv"
+    #: template name for exporting CSV with activity of selected users
+    CSV_USER_REPORT = "%s_%s_user-report.csv"
+    #: template name for exporting CSV with users contributions in rolling windows
+    CSV_ROLLING_SUMMARY = "%s_%s_rolling-summary.csv"
+    #: file name of distinct contributors merged from sketches of many repositories
+    CSV_DISTINCT_CONTRIBUTORS = "distinct-contributors.csv"
     #: template name for exporting CSV with comment's contributions
     CSV_USER_COMMENTS = "%s_%s_user-comments_freq_%s_type_%s.csv"
+    #: template name for exporting sparse/long table with comment's contributions, the last is file extension
+    LONG_USER_COMMENTS = "%s_%s_user-comments_freq_%s_type_%s_long.%s"
     #: template name for exporting Figure/PDF with comment's contributions
-    PDF_USER_COMMENTS = "%s_%s_user-comments_freq_%s_type_%s.pdf"
+    FIG_USER_COMMENTS = "%s_%s_user-comments_freq_%s_type_%s.%s"
+    #: supported formats of exported figures
+    FIGURE_FORMATS = ("pdf", "png", "svg")
+    #: supported formats of exported sparse long tables
+    SPARSE_FORMATS = ("csv", "parquet")
+    #: policies for the time stamp in figure titles - time of the last fetch, the latest period or none
+    TITLE_TIMESTAMPS = ("fetched", "latest", "none")
     #: kay to the raw fetch data from host
     DATA_KEY_RAW_INFO = "raw_info"
     #: key to the raw fetch data from host
@@ -39,6 +85,17 @@ class Host:
     DATA_KEY_SIMPLE = "simple_tickets"
     #: timeline of all comments in the repo
     DATA_KEY_COMMENTS = "comments_timeline"
+    #: registered user logins, position in the list is the user ID
+    DATA_KEY_USERS = "users"
+    #: per ticket converted simple ticket and comments with inverted indexes and counters of users,
+    #: independent on time period
+    DATA_KEY_PREPROCESSED = "preprocessed_tickets"
+    #: user contributions in rolling windows, updated with each sync
+    DATA_KEY_ROLLING = "rolling_contributions"
+    #: data derived from the preprocessed tickets for the time period, they are rebuilt instead of being dumped
+    DATA_KEYS_DERIVED = (DATA_KEY_SIMPLE, DATA_KEY_COMMENTS)
+    #: default lengths of rolling windows in days
+    ROLLING_WINDOWS = (30, 90)
     #: define bot users as name pattern
     USER_BOTS = []
     #: OS env. variable for getting Token
@@ -59,13 +116,22 @@ class Host:
         output_path: str,
         auth_token: Optional[str] = None,
         min_contribution: int = 3,
+        user_bots: Optional[Sequence[str]] = None,
+        title_timestamp: str = "fetched",
+        reuse_outputs: bool = True,
+        shard: Optional[tuple[int, int]] = None,
     ):
         """
         Args:
             repo_name: Repository name, need to new unique
-            output_path: Path to saving dumped cache, csw tables, pdf figures
+            output_path: Path to saving dumped cache, csw tables, figures
             auth_token: authentication token for API access
             min_contribution: minimal nb contributions for visualization
+            user_bots: name patterns for bot users, if not set the host default `USER_BOTS` is used
+            title_timestamp: time stamp in figure titles, see `TITLE_TIMESTAMPS`
+            reuse_outputs: skip exporting tables and figures which would be the same as the existing ones
+            shard: fetch only tickets of the shard given by its index and count of all shards into partial dump,
+                tickets are assigned to shards by their number modulo the count
         """
         self.repo_name = repo_name
         self.name = repo_name.replace("/", "-")
@@ -78,11 +144,39 @@ class Host:
             logging.debug(f"Using `{self.OS_ENV_AUTH_TOKEN}` from your OS environment variables...")
             self.auth_token = os_token
 
+        self.user_bots = tuple(self.USER_BOTS if user_bots is None else user_bots)
+        assert title_timestamp in self.TITLE_TIMESTAMPS, f"unsupported title time stamp: {title_timestamp}"
+        self.title_timestamp = title_timestamp
+        self.reuse_outputs = reuse_outputs
+        if shard:
+            assert 0 <= shard[0] < shard[1], f"invalid shard {shard[0]} of {shard[1]}"
+        self.shard = tuple(shard) if shard else None
+        self._dump_template = JSON_SHARD_NAME.format(index=shard[0], count=shard[1]) if shard else JSON_CACHE_NAME
+
         self.data = {}
+        #: tickets which failed to be fetched
         self.outdated = 0
+        #: tickets left for the next run after the fetching budget was spent
+        self.backlog = 0
+        #: tickets updated since the last pre-processing
+        self.changed_tickets = set()
+        #: days with contributions changed by pre-processing since the last update of rolling windows
+        self.changed_days = set()
+        #: parsed comments with dates floored to base frequency, shared by all timeline aggregations
+        self._comment_cubes = {}
+        #: converted tickets and all comments sorted by time, independent on time period
+        self._converted = []
+        self._comments_index = None
+        #: optional tag of the selected time period added to exported file names
+        self.period_tag = ""
+        #: content keys of exported outputs, loaded with the first export
+        self._output_keys = None
+        #: content keys of outputs exported since the last save of the keys
+        self._new_output_keys = {}
         self.timestamp = None
         self.datetime_from = None
         self.datetime_to = None
+        self._load_users()
 
     @staticmethod
     def _is_spam_message(msg: str, thr: float = 0.2) -> bool:
@@ -107,11 +201,11 @@ class Host:
 
     @abstractmethod
     def _convert_to_simple(self, collection: list[dict]) -> list[dict]:
-        """Aggregate issue/PR affiliations."""
+        """Aggregate issue/PR affiliations, commenters are attached later according to the time period."""
 
     @abstractmethod
     def _convert_comments_timeline(self, issues: list[dict]) -> list[dict]:
-        """Aggregate comments for all issue/PR affiliations."""
+        """Aggregate comments for all issue/PR affiliations regardless the time period."""
 
     @abstractmethod
     def _fetch_info(self) -> list[dict]:
@@ -121,42 +215,367 @@ class Host:
     def _fetch_overview(self) -> list[dict]:
         """Download all info from repository screening."""
 
-    def _is_user_bot(self, user: str) -> bool:
-        """Allow filter bots from users."""
-        return any(u in user for u in self.USER_BOTS)
+    @abstractmethod
+    def _event_time(self, event: dict) -> Optional[str]:
+        """Get time of the webhook event, the events are applied in order of their time."""
+
+    @abstractmethod
+    def _apply_event(self, tickets: dict[str, dict], event: dict) -> Optional[str]:
+        """Apply the webhook event to raw tickets in place and return the key of touched ticket, if any."""
 
     @abstractmethod
-    def _update_details(self, collection: dict[str, dict], collect_new: dict[str, dict]) -> dict[str, dict]:
-        """Download all info if from screening."""
+    def _update_details(
+        self,
+        collection: dict[str, dict],
+        collect_new: dict[str, dict],
+        max_requests: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> dict[str, dict]:
+        """Download all info if from screening, the tickets left by budget are counted in `backlog`."""
+
+    @staticmethod
+    def _prioritize_queue(queue: Sequence[str], tickets: dict[str, dict]) -> list[str]:
+        """Order tickets for fetching, open ones first and then the recently updated ones.
 
-    def fetch_data(self, offline: bool = False) -> None:
-        """Get all data - load and update if allowed."""
+        >>> tickets = {"1": dict(state="closed", updated_at="2020-01-05"),
+        ...            "2": dict(state="open", updated_at=None),
+        ...            "3": dict(state="closed", updated_at="2020-03-01"),
+        ...            "4": dict(state="open", updated_at="2020-02")}
+        >>> Host._prioritize_queue(["1", "2", "3", "4"], tickets)
+        ['4', '2', '3', '1']
+        """
+        updated = convert_dates([tickets[idx]["updated_at"] for idx in queue])
+        # missing dates are the oldest
+        updated = updated.fillna(pd.Timestamp.min.tz_localize("UTC"))
+        order = sorted(range(len(queue)), key=lambda i: (tickets[queue[i]]["state"] != "open", -updated[i].value))
+        return [queue[i] for i in order]
+
+    def fetch_data(
+        self,
+        offline: bool = False,
+        reload: bool = True,
+        max_requests: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Get all data - load and update if allowed.
+
+        Args:
+            offline: only load the cached data, without updating from host
+            reload: load the cached data even if some are already in memory, otherwise just update them
+            max_requests: budget of requests for fetching details, the rest is left for the next run
+            deadline: stop fetching details at this `time.monotonic` time, the rest is left for the next run
+        """
         logging.info("Fetch requested data...")
-        self.data = load_data(path_dir=self.output_path, repo_name=self.repo_name, host=self.HOST_NAME)
+        if reload or not self.data:
+            with span("load_data") as records:
+                self.data = load_data(
+                    path_dir=self.output_path,
+                    repo_name=self.repo_name,
+                    host=self.HOST_NAME,
+                    template=self._dump_template,
+                )
+                # dumps of older versions still contain the derived data, it is rebuilt by pre-processing
+                for key in self.DATA_KEYS_DERIVED:
+                    self.data.pop(key, None)
+                self._load_users()
+                records["tickets"] = len(self.data.get(self.DATA_KEY_RAW_TICKETS, {}))
 
         if not offline:
-            self.data[self.DATA_KEY_RAW_INFO] = self._fetch_info()
-            overview = self._fetch_overview()
-            overview = {str(i["number"]): i for i in overview}
+            with span("fetch_info"):
+                self.data[self.DATA_KEY_RAW_INFO] = self._fetch_info()
+            with span("fetch_overview") as records:
+                overview = self._fetch_overview()
+                overview = {str(i["number"]): i for i in overview if self._is_in_shard(i["number"])}
+                records["tickets"] = len(overview)
 
-            self.data[self.DATA_KEY_RAW_TICKETS] = self._update_details(
-                self.data.get(self.DATA_KEY_RAW_TICKETS, {}), overview
-            )
+            with span("update_details") as records:
+                self.data[self.DATA_KEY_RAW_TICKETS] = self._update_details(
+                    self.data.get(self.DATA_KEY_RAW_TICKETS, {}),
+                    overview,
+                    max_requests=max_requests,
+                    deadline=deadline,
+                )
+                records["tickets"] = len(self.data[self.DATA_KEY_RAW_TICKETS])
             if self.outdated > 0:
                 logging.warning(
                     "Updating from host was not completed, some of following steps may fail or being incorrect."
                 )
-            self.preprocess_data()
+            if self.shard:
+                # partial dumps keep just the raw data, they are preprocessed after merging
+                self.data["shard"] = list(self.shard)
+            else:
+                self.preprocess_data()
+                with span("rolling_contributions"):
+                    self.update_rolling_contributions()
 
-            save_data(self.data, path_dir=self.output_path, repo_name=self.repo_name, host=self.HOST_NAME)
+            with span("save_data") as records:
+                self._save_data()
+                records["tickets"] = len(self.data[self.DATA_KEY_RAW_TICKETS])
         # take the saved date
         self.timestamp = self.data.get("updated_at")
 
-    def preprocess_data(self) -> None:
-        """Some pre-processing of raw data."""
-        raw_tickets = self.data[self.DATA_KEY_RAW_TICKETS].values()
-        self.data[self.DATA_KEY_SIMPLE] = self._convert_to_simple(raw_tickets)
-        self.data[self.DATA_KEY_COMMENTS] = self._convert_comments_timeline(raw_tickets)
+    def _save_data(self) -> str:
+        """Dump all data except the derived ones, the per ticket conversion already holds the same content.
+
+        Returns:
+            path to the saved dump
+        """
+        data = {key: val for key, val in self.data.items() if key not in self.DATA_KEYS_DERIVED}
+        path = save_data(
+            data, path_dir=self.output_path, repo_name=self.repo_name, host=self.HOST_NAME, template=self._dump_template
+        )
+        # take over the saved meta data, e.g. the time of saving
+        self.data.update(data)
+        return path
+
+    def share_data(self, other: "Host") -> None:
+        """Reuse data already loaded by another host of the same repository, e.g. with other bot patterns.
+
+        The raw data are not copied, the preprocessed tickets are converted again by this host and kept apart
+        if the preprocessing settings differ, see :meth:`_preprocessing_signature`.
+        """
+        self.data = dict(other.data)
+        self._load_users()
+        self.timestamp = other.timestamp
+
+    def _is_in_shard(self, number: int) -> bool:
+        """Check that the ticket belongs to the fetched shard, all tickets belong to none shard."""
+        return not self.shard or int(number) % self.shard[1] == self.shard[0]
+
+    @staticmethod
+    def _is_newer_ticket(ticket: dict, other: Optional[dict]) -> bool:
+        """Compare tickets by update time, not completely fetched ticket without the time is never newer.
+
+        >>> Host._is_newer_ticket({"updated_at": "2020-01-02T00:00:00Z"}, {"updated_at": "2020-01-01T12:00:00+00:00"})
+        True
+        >>> Host._is_newer_ticket({"updated_at": None}, {"updated_at": "2020-01-01"})
+        False
+        >>> Host._is_newer_ticket({"updated_at": None}, None)
+        True
+        """
+        if other is None:
+            return True
+        updated, updated_other = convert_date(ticket["updated_at"]), convert_date(other["updated_at"])
+        return updated is not None and (updated_other is None or updated > updated_other)
+
+    def merge_partial_dumps(self, partials: Sequence[dict]) -> list[str]:
+        """Merge partial dumps fetched by shards into the loaded data and save it as the standard cache.
+
+        Conflicting tickets, e.g. from overlapping or repeated shards, are resolved by their update time.
+
+        Args:
+            partials: loaded partial dumps
+
+        Returns:
+            numbers of tickets which were added or updated
+        """
+        raw_tickets = self.data.setdefault(self.DATA_KEY_RAW_TICKETS, {})
+        changed = []
+        for partial in partials:
+            if partial.get(self.DATA_KEY_RAW_INFO):
+                self.data[self.DATA_KEY_RAW_INFO] = partial[self.DATA_KEY_RAW_INFO]
+            for idx, ticket in partial.get(self.DATA_KEY_RAW_TICKETS, {}).items():
+                if self._is_newer_ticket(ticket, raw_tickets.get(idx)):
+                    raw_tickets[idx] = ticket
+                    changed.append(idx)
+        # mark for incremental pre-processing
+        self.changed_tickets.update(changed)
+        self.outdated = sum(not ticket["updated_at"] for ticket in raw_tickets.values())
+        self.preprocess_data()
+        self.update_rolling_contributions()
+        self._save_data()
+        self.timestamp = self.data.get("updated_at")
+        return changed
+
+    def ingest_events(self, events: Sequence[dict]) -> list[str]:
+        """Apply webhook events to the loaded raw tickets in order of their time and save the cache.
+
+        Stale events are skipped by comparing update times, so applying the same events again changes nothing.
+        Tickets which were not known before and are created just from events miss the earlier history,
+        so their update time is unset and they are fetched completely with the next scrape.
+
+        Args:
+            events: loaded webhook events
+
+        Returns:
+            keys of tickets which were touched by the events
+        """
+        raw_tickets = self.data.setdefault(self.DATA_KEY_RAW_TICKETS, {})
+        times = convert_dates([self._event_time(event) for event in events])
+        # events without time go first, the same times keep the given order
+        order = sorted(range(len(events)), key=lambda i: (pd.notna(times[i]), times[i] if pd.notna(times[i]) else 0, i))
+        changed = []
+        with span("ingest_events") as records:
+            for i in order:
+                idx = self._apply_event(raw_tickets, events[i])
+                if idx is not None and idx not in changed:
+                    changed.append(idx)
+            records.update(events=len(events), tickets=len(changed))
+        # mark for incremental pre-processing
+        self.changed_tickets.update(changed)
+        self.outdated = sum(not ticket["updated_at"] for ticket in raw_tickets.values())
+        self.preprocess_data()
+        self.update_rolling_contributions()
+        self._save_data()
+        self.timestamp = self.data.get("updated_at")
+        return changed
+
+    def _load_users(self) -> None:
+        """Restore the user registry from loaded data so the user IDs stay stable across runs."""
+        self.users = UserRegistry(
+            bot_patterns=self.user_bots,
+            url_template=self.USER_URL_TEMPLATE,
+            logins=self.data.get(self.DATA_KEY_USERS, []),
+        )
+
+    def _preprocessing_signature(self) -> list:
+        """Settings which the cached conversion depends on, any change invalidates the cache."""
+        return [list(self.user_bots), list(self.SPAM_MESSAGES)]
+
+    def _update_preprocessed(self, raw_tickets: dict[str, dict]) -> dict[str, dict]:
+        """Convert only new or changed tickets and reuse cached conversion for the rest.
+
+        Args:
+            raw_tickets: all raw tickets indexed by their number
+
+        Returns:
+            converted tickets with the same indexing
+        """
+        cache = self.data.get(self.DATA_KEY_PREPROCESSED) or {}
+        if cache.get("signature") != self._preprocessing_signature():
+            cache = {"signature": self._preprocessing_signature(), "tickets": {}}
+        tickets = cache["tickets"]
+        # caches dumped before the indexes and counters were introduced get them without converting anything
+        if "index" not in cache:
+            cache["index"] = build_index(tickets)
+        if "counters" not in cache:
+            cache["counters"] = compute_user_counters(tickets.values())
+        index, counters = cache["index"], cache["counters"]
+        dropped = set(tickets).difference(raw_tickets)
+        queue = [
+            idx
+            for idx, ticket in raw_tickets.items()
+            if idx in self.changed_tickets or idx not in tickets or tickets[idx]["updated_at"] != ticket["updated_at"]
+        ]
+        # subtract previous contributions of dropped and changed tickets, the new ones are added after conversion
+        previous = compute_user_counters(tickets[idx] for idx in [*dropped, *queue] if idx in tickets)
+        add_user_counters(counters, previous, sign=-1)
+        # drop tickets which are not in raw data anymore
+        for idx in dropped:
+            index_ticket(index, idx, tickets.pop(idx), sign=-1)
+        logging.debug(f"Converting {len(queue)} changed tickets out of {len(raw_tickets)}")
+        with span("convert_tickets") as records:
+            for idx in tqdm(queue, desc="Converting changed tickets"):
+                ticket = raw_tickets[idx]
+                if idx in tickets:
+                    index_ticket(index, idx, tickets[idx], sign=-1)
+                tickets[idx] = {
+                    "updated_at": ticket["updated_at"],
+                    "simple": self._convert_to_simple([ticket]),
+                    "comments": self._convert_comments_timeline([ticket]),
+                }
+                index_ticket(index, idx, tickets[idx])
+            records["tickets"] = len(queue)
+        current = compute_user_counters(tickets[idx] for idx in queue)
+        add_user_counters(counters, current)
+        self.changed_days.update(previous["daily"], current["daily"])
+        self.changed_tickets.clear()
+        self.data[self.DATA_KEY_PREPROCESSED] = cache
+        return tickets
+
+    def apply_time_period(self) -> None:
+        """Select comments in time period and attach their authors as commenters to simple tickets.
+
+        It uses the time indexed dataset from :meth:`preprocess_data`, so no tickets need to be converted again
+        and selecting the comments is just binary search plus copying them. The simple tickets are not filtered
+        by time, each of them gets its commenters list rebuilt, so applying a period still costs O(tickets).
+        """
+        assert self._comments_index is not None, "forgotten call `preprocess_data`"
+        with span("apply_time_period") as records:
+            comments = self._comments_index.select(datetime_from=self.datetime_from, datetime_to=self.datetime_to)
+            commenters = defaultdict(set)
+            for cmt in comments:
+                commenters[cmt["parent_idx"]].add(cmt["author"])
+            self.data[self.DATA_KEY_SIMPLE] = [
+                dict(item, commenters=list(commenters.get(item["number"], [])))
+                for ticket in self._converted
+                for item in ticket["simple"]
+            ]
+            self.data[self.DATA_KEY_COMMENTS] = comments
+            self._comment_cubes = {}
+            records.update(tickets=len(self.data[self.DATA_KEY_SIMPLE]), comments=len(comments))
+
+    def preprocess_data(self, timeline: bool = True) -> None:
+        """Some pre-processing of raw data, the raw tickets are never changed.
+
+        Args:
+            timeline: also index all comments by time and apply the time period, it is needed by all reports
+                except :meth:`user_report` which uses just the converted tickets and the user indexes
+        """
+        with span("preprocess_data") as records:
+            raw_tickets = self.data[self.DATA_KEY_RAW_TICKETS]
+            converted = self._update_preprocessed(raw_tickets)
+            self.data[self.DATA_KEY_USERS] = self.users.logins
+            records["tickets"] = len(raw_tickets)
+            if not timeline:
+                return
+            self._converted = [converted[idx] for idx in raw_tickets]
+            comments = [cmt for ticket in self._converted for cmt in ticket["comments"]]
+            self._comments_index = TimeIndex(comments)
+            self.apply_time_period()
+            records["comments"] = len(comments)
+
+    def _get_comment_cube(self, freq: str):
+        """Get the parsed comments for given frequency, they are parsed just once after each pre-processing."""
+        base_freq = cube_base_freq(freq)
+        if base_freq not in self._comment_cubes:
+            with span("comment_cube") as records:
+                self._comment_cubes[base_freq] = compute_comment_cube(self.data[self.DATA_KEY_COMMENTS], base_freq)
+                records["comments"] = len(self.data[self.DATA_KEY_COMMENTS])
+        return self._comment_cubes[base_freq]
+
+    def update_rolling_contributions(
+        self, windows: Optional[Sequence[int]] = None, day: Optional[str] = None, persist: bool = True
+    ) -> dict:
+        """Slide the persisted rolling windows to given day, only the newly passed days are counted.
+
+        Older days in windows are counted again if pre-processing changed their contributions,
+        e.g. with tickets fetched late, ingested events, merged shards or edited comments.
+
+        Args:
+            windows: window lengths in days, if not set use the persisted ones or `ROLLING_WINDOWS`
+            day: the last day in windows, if not set use today
+            persist: keep the updated state for the next updates and dumps, otherwise slide just its copy
+
+        Returns:
+            updated rolling state
+        """
+        state = self.data.get(self.DATA_KEY_ROLLING)
+        if not persist:
+            state = deepcopy(state)
+        windows = windows or (state or {}).get("windows") or self.ROLLING_WINDOWS
+        day = day or pd.Timestamp.now(tz="UTC").strftime("%Y-%m-%d")
+        # use all converted tickets regardless the time period
+        cache = self.data.get(self.DATA_KEY_PREPROCESSED, {})
+        converted = cache.get("tickets", {}).values() if "counters" not in cache else []
+        daily = None
+        if "counters" in cache:
+            # days out of the largest window are neither slid nor recounted
+            day_from = (pd.Timestamp(day) - pd.Timedelta(days=max(map(int, windows)) - 1)).strftime("%Y-%m-%d")
+            daily = daily_contributions_from_counters(cache["counters"]["daily"], day_from=day_from, day_to=day)
+        state = update_rolling_contributions(
+            state,
+            comments=[cmt for ticket in converted for cmt in ticket["comments"]],
+            tickets=[item for ticket in converted for item in ticket["simple"]],
+            day=day,
+            windows=windows,
+            daily=daily,
+            changed_days=self.changed_days,
+        )
+        if persist:
+            self.data[self.DATA_KEY_ROLLING] = state
+            self.changed_days.clear()
+        return state
 
     def set_time_period(self, date_from: str = None, date_to: str = None) -> None:
         """Set optional time window for selections.
@@ -172,10 +591,81 @@ class Host:
         if date_to:
             self.datetime_to = date_to
 
+    def select_time_period(self, date_from: Optional[str] = None, date_to: Optional[str] = None, tag: str = "") -> None:
+        """Switch to another time period, unset ends are open, and apply it to the preprocessed data.
+
+        Selecting the same period again only changes the tag, so the selection and comment cubes are reused.
+
+        Args:
+            date_from: date/time for period start
+            date_to: date/time for period ends
+            tag: label of the period added to exported file names
+        """
+        period = (convert_date(date_from), convert_date(date_to))
+        changed = period != (self.datetime_from, self.datetime_to)
+        self.datetime_from, self.datetime_to = period
+        self.period_tag = tag
+        if changed and self._comments_index is not None:
+            self.apply_time_period()
+
+    @property
+    def _report_name(self) -> str:
+        """Name used in exported files, with the time period tag if any."""
+        return f"{self.name}_{self.period_tag}" if self.period_tag else self.name
+
     def _is_in_time_period(self, dt) -> bool:
         """Check if particular date is in in range"""
         return is_in_time_period(dt, datetime_from=self.datetime_from, datetime_to=self.datetime_to)
 
+    def _users_summary(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Compute users summary indexed by user IDs with selected columns, sorted by the first one."""
+        counters = self.data.get(self.DATA_KEY_PREPROCESSED, {}).get("counters")
+        with span("users_summary") as records:
+            if counters is not None and not self.datetime_from and not self.datetime_to:
+                # the whole history is just a read of the materialized counters, authors are kept in the same order
+                authors = pd.unique(pd.Series([item["author"] for item in self.data[self.DATA_KEY_SIMPLE]]))
+                df_users = summarize_user_counters(counters["totals"], users=authors)
+            else:
+                df_users = compute_users_summary(
+                    self.data[self.DATA_KEY_SIMPLE],
+                    datetime_from=self.datetime_from,
+                    datetime_to=self.datetime_to,
+                )
+            records.update(tickets=len(self.data[self.DATA_KEY_SIMPLE]), users=len(df_users))
+        columns = columns or list(df_users.columns)
+        # filter columns which are possible
+        avail_columns = df_users.columns
+        miss_columns = [c for c in columns if c not in avail_columns]
+        if miss_columns:
+            logging.warning(
+                f"You save requested following columns {miss_columns} which are missing in the table,"
+                f" these columns are available: {avail_columns}"
+            )
+        columns = [c for c in columns if c in avail_columns]
+
+        if not columns:
+            columns = list(df_users.columns)
+            logging.warning(f"You have not set any column was recognised, so we show all: {columns}")
+
+        # filter just some columns
+        return df_users[columns].sort_values(columns[0], ascending=False)
+
+    def users_summary(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Compute user contribution overview in the selected time period, without any export or printing.
+
+        Args:
+            columns: select columns, the first one is used for sorting, all columns if not set
+
+        Returns:
+            table indexed by user logins
+        """
+        assert self.DATA_KEY_SIMPLE in self.data, "forgotten call `preprocess_data`"
+        if not self.data.get(self.DATA_KEY_SIMPLE):
+            return pd.DataFrame()
+        df_users = self._users_summary(columns)
+        df_users.index = df_users.index.map(self.users.login)
+        return df_users
+
     def print_users_summary(self, columns: list[str]) -> str:
         """Show user contribution overview and print table to terminal with selected `columns`.
 
@@ -192,51 +682,287 @@ class Host:
             logging.warning("No data to process/show.")
             return None
 
-        df_users = compute_users_summary(
-            self.data[self.DATA_KEY_SIMPLE],
-            datetime_from=self.datetime_from,
-            datetime_to=self.datetime_to,
+        df_users = self._users_summary(columns)
+        csv_path = os.path.join(self.output_path, self.CSV_USERS_SUMMARY % (self.HOST_NAME, self._report_name))
+        self._export_and_print(df_users, csv_path)
+        self._save_output_keys()
+        return csv_path
+
+    def _user_report(self, user_ids: Sequence[int]) -> pd.DataFrame:
+        """Count contributions of selected users in the time period indexed by user IDs.
+
+        Only tickets found in the user indexes are visited, the columns are the same as in :meth:`users_summary`
+        plus the number of comments.
+        """
+        assert self.DATA_KEY_PREPROCESSED in self.data, "forgotten call `preprocess_data`"
+        cache = self.data[self.DATA_KEY_PREPROCESSED]
+        with span("user_report") as records:
+            involved = lookup_users(cache["index"], user_ids)
+            events = []
+            for idx, offsets in involved.items():
+                ticket = cache["tickets"][idx]
+                for item in ticket["simple"]:
+                    if item["author"] in user_ids:
+                        events.append((item["author"], f"opened {item['type']}s", item["created_at"], idx))
+                        if item["state"] == "merged":
+                            events.append((item["author"], f"merged {item['type']}s", item["closed_at"], idx))
+                    events += [
+                        (int(uid), f"commented {item['type']}s", ticket["comments"][i]["count_at"], idx)
+                        for uid, offs in offsets.items()
+                        if int(uid) != item["author"]
+                        for i in offs
+                    ]
+                events += [
+                    (int(uid), "comments", ticket["comments"][i]["count_at"], idx)
+                    for uid, offs in offsets.items()
+                    for i in offs
+                ]
+            records.update(tickets=len(involved), events=len(events))
+        df_events = pd.DataFrame(events, columns=["user", "column", "date", "ticket"])
+        df_events = df_events[
+            mask_in_time_period(df_events["date"], datetime_from=self.datetime_from, datetime_to=self.datetime_to)
+        ]
+        # each commenter is counted only once per issue/PR
+        is_commented = df_events["column"].str.startswith("commented")
+        df_events = pd.concat(
+            [df_events[~is_commented], df_events[is_commented].drop_duplicates(["user", "column", "ticket"])]
         )
+        columns = [f"{name} {tp}s" for tp in ("PR", "issue") for name in ("opened", "merged", "commented")]
+        df_users = (
+            df_events.groupby(["user", "column"])
+            .size()
+            .unstack("column", fill_value=0)
+            .reindex(index=pd.Index(user_ids, name="user"), columns=[*columns, "comments"], fill_value=0)
+        )
+        df_users.insert(len(columns), "all opened", df_users["opened PRs"] + df_users["opened issues"])
+        df_users.columns.name = None
+        return df_users.astype(int)
 
-        # filter columns which are possible
-        avail_columns = df_users.columns
-        miss_columns = [c for c in columns if c not in avail_columns]
-        if miss_columns:
-            logging.warning(
-                f"You save requested following columns {miss_columns} which are missing in the table,"
-                f" these columns are available: {avail_columns}"
-            )
-        columns = [c for c in columns if c in avail_columns]
+    def _known_user_ids(self, logins: Sequence[str]) -> list[int]:
+        """Resolve logins to user IDs, unknown users are reported and skipped."""
+        missing = [login for login in logins if login not in self.users]
+        if missing:
+            logging.warning(f"Following users have no contributions in this repository: {missing}")
+        return [self.users.uid(login) for login in logins if login in self.users]
 
-        if not columns:
-            columns = list(df_users.columns)
-            logging.warning(f"You have not set any column was recognised, so we show all: {columns}")
+    def user_report(self, logins: Sequence[str]) -> pd.DataFrame:
+        """Compute contributions of a single user or a small group in the time period, without any export or printing.
 
-        # filter just some columns
-        df_users = df_users[columns]
-        df_users.sort_values(columns[0], ascending=False, inplace=True)
-        csv_path = os.path.join(self.output_path, self.CSV_USERS_SUMMARY % (self.HOST_NAME, self.name))
-        df_users.to_csv(csv_path)
-        df_users.index = df_users.index.map(lambda u: self.USER_URL_TEMPLATE % {"user": u})
+        It needs just :meth:`preprocess_data` without the timeline, as all counts are looked up in the user indexes.
+
+        Args:
+            logins: user logins
+
+        Returns:
+            table indexed by user logins
+        """
+        df_users = self._user_report(self._known_user_ids(logins))
+        df_users.index = df_users.index.map(self.users.login)
+        return df_users
+
+    def print_user_report(self, logins: Sequence[str]) -> str:
+        """Show contributions of selected users and print table to terminal.
+
+        Args:
+            logins: user logins
+
+        Returns:
+            path to the exported table
+        """
+        from tabulate import tabulate
+
+        logging.debug("Show user report...")
+        df_users = self._user_report(self._known_user_ids(logins))
+        user_ids = df_users.index
+        df_users.index = user_ids.map(self.users.login)
+        csv_path = os.path.join(self.output_path, self.CSV_USER_REPORT % (self.HOST_NAME, self._report_name))
+        self._export_table(df_users, csv_path)
+        self._save_output_keys()
+        df_users.index = user_ids.map(self.users.url)
+        print(tabulate(df_users, tablefmt="pipe", headers="keys"))
+        return csv_path
+
+    def _rolling_summary(self, windows: Sequence[int], persist: bool = True) -> pd.DataFrame:
+        day = self.datetime_to.strftime("%Y-%m-%d") if self.datetime_to else None
+        with span("rolling_summary") as records:
+            state = self.update_rolling_contributions(windows=windows, day=day, persist=persist)
+            df_users = rolling_contributions_table(state)
+            records["users"] = len(df_users)
+        return df_users
+
+    def rolling_summary(self, windows: Sequence[int]) -> pd.DataFrame:
+        """Compute user contributions in rolling windows ending with the time period end or today.
+
+        The rolling state is slid just in a copy, so neither the persisted state nor anything else is changed.
+
+        Args:
+            windows: window lengths in days
+
+        Returns:
+            table indexed by user logins
+        """
+        assert self.DATA_KEY_PREPROCESSED in self.data, "forgotten call `preprocess_data`"
+        df_users = self._rolling_summary(windows, persist=False)
+        df_users.index = df_users.index.map(self.users.login)
+        return df_users
+
+    def print_rolling_summary(self, windows: Sequence[int]) -> str:
+        """Show user contributions in rolling windows ending with the time period end or today.
+
+        Args:
+            windows: window lengths in days
+
+        Returns:
+            path to the exported table
+        """
+        logging.debug("Show rolling summary...")
+        assert self.DATA_KEY_PREPROCESSED in self.data, "forgotten call `preprocess_data`"
+
+        df_users = self._rolling_summary(windows)
+        csv_path = os.path.join(self.output_path, self.CSV_ROLLING_SUMMARY % (self.HOST_NAME, self._report_name))
+        self._export_and_print(df_users, csv_path)
+        self._save_output_keys()
+        return csv_path
+
+    def _export_and_print(self, df_users: pd.DataFrame, csv_path: str) -> None:
+        """Export table indexed by user IDs with logins and print users above minimal contribution with links."""
+        from tabulate import tabulate
+
+        # resolve user IDs to names only for the outputs
+        user_ids = df_users.index
+        df_users.index = user_ids.map(self.users.login)
+        self._export_table(df_users, csv_path)
+        df_users.index = user_ids.map(self.users.url)
         print(
             tabulate(
-                df_users[df_users[columns[0]] >= self.min_contribution_count],
+                df_users[df_users[df_users.columns[0]] >= self.min_contribution_count],
                 tablefmt="pipe",
                 headers="keys",
             )
         )
+
+    def save_contributor_sketches(self, freq: str = "M", error: float = 0.02) -> str:
+        """Sketch distinct commenters and authors per period and save them next to the dump.
+
+        The sketches are mergeable across repositories and periods without loading the raw data,
+        see :func:`repo_stats.sketch.merge_contributor_sketches`.
+
+        Args:
+            freq: period frequency
+            error: relative error of distinct counts
+
+        Returns:
+            path to the saved sketches
+        """
+        logging.debug("Sketch distinct contributors...")
+        assert self.DATA_KEY_COMMENTS in self.data, "forgotten call `preprocess_data`"
+        with span("contributor_sketches") as records:
+            sketches = compute_contributor_sketches(
+                self.data[self.DATA_KEY_COMMENTS],
+                self.data[self.DATA_KEY_SIMPLE],
+                freq=freq,
+                error=error,
+                user_names=self.users.logins,
+            )
+            records["comments"] = len(self.data[self.DATA_KEY_COMMENTS])
+        data = {"freq": freq, "error": error, "sketches": sketches_to_dict(sketches)}
+        return save_data(
+            data, path_dir=self.output_path, repo_name=self.repo_name, host=self.HOST_NAME, template=JSON_SKETCH_NAME
+        )
+
+    def _get_output_keys(self) -> dict[str, str]:
+        """Content keys of already exported outputs indexed by the file name."""
+        if self._output_keys is None:
+            self._output_keys = load_data(
+                self.output_path, repo_name=self.repo_name, host=self.HOST_NAME, template=JSON_OUTPUTS_NAME
+            ).get("outputs", {})
+        return self._output_keys
+
+    def _is_output_unchanged(self, path: str, key: str) -> bool:
+        """Check that the output exists and was exported from the same content and parameters."""
+        if not self.reuse_outputs or not os.path.isfile(path):
+            return False
+        unchanged = self._get_output_keys().get(os.path.basename(path)) == key
+        if unchanged:
+            logging.debug(f"Skipping unchanged output: {path}")
+        return unchanged
+
+    def _register_outputs(self, outputs: dict[str, str]) -> None:
+        """Remember content keys of freshly exported outputs, they are saved by :meth:`_save_output_keys`."""
+        keys = {os.path.basename(path): key for path, key in outputs.items()}
+        self._get_output_keys().update(keys)
+        self._new_output_keys.update(keys)
+
+    def _save_output_keys(self) -> None:
+        """Save content keys of all outputs exported since the last save at once."""
+        if not self._new_output_keys:
+            return
+        # merge with the saved keys as other hosts of the same repository may export meanwhile
+        keys = load_data(
+            self.output_path, repo_name=self.repo_name, host=self.HOST_NAME, template=JSON_OUTPUTS_NAME
+        ).get("outputs", {})
+        keys.update(self._new_output_keys)
+        save_data(
+            {"outputs": keys},
+            path_dir=self.output_path,
+            repo_name=self.repo_name,
+            host=self.HOST_NAME,
+            template=JSON_OUTPUTS_NAME,
+        )
+        self._new_output_keys = {}
+
+    def _export_table(self, df: pd.DataFrame, csv_path: str) -> str:
+        """Export table to CSV unless the same content was already exported."""
+        with span("export_table") as records:
+            key = hash_table(df)
+            if not self._is_output_unchanged(csv_path, key):
+                df.to_csv(csv_path)
+                self._register_outputs({csv_path: key})
+                records.update(tables=1, rows=len(df))
         return csv_path
 
-    def show_user_comments(self, freq: str = "W", parent_type: str = "", show_fig: bool = True) -> tuple[str, str]:
+    def _export_long_table(self, df: pd.DataFrame, path_base: str, export_format: str = "csv") -> str:
+        """Export table in selected format, Parquet needs optional `pyarrow` or `fastparquet`."""
+        with span("export_table") as records:
+            key = hash_table(df, export_format=export_format)
+            # Parquet falls back to CSV without the optional dependency, so the CSV may be the exported one
+            for path in dict.fromkeys([path_base + export_format, path_base + "csv"]):
+                if self._is_output_unchanged(path, key):
+                    return path
+            path = path_base + "csv"
+            if export_format == "parquet":
+                try:
+                    df.to_parquet(path_base + "parquet", index=False)
+                except ImportError as ex:
+                    logging.warning(f"Exporting to Parquet failed with {ex!r}, so falling back to CSV.")
+                else:
+                    path = path_base + "parquet"
+            if path.endswith("csv"):
+                df.to_csv(path, index=False)
+            self._register_outputs({path: key})
+            records.update(tables=1, rows=len(df))
+        return path
+
+    def show_user_comments(
+        self,
+        freq: str = "W",
+        parent_type: str = "",
+        show_fig: bool = True,
+        sparse_format: Optional[str] = None,
+        fig_format: str = "pdf",
+    ) -> tuple[str, str]:
         """Show aggregated user contribution statistics in a table and a double chart
 
         Args:
             freq: aggregation frequency - Day, Week, Month, ...
             parent_type: item kind like issue/PR
             show_fig: show figure after all
+            sparse_format: export only non-zero counts as long table user/period/count in this format
+                - `csv` or `parquet`, instead of the dense CSV table
+            fig_format: format of the exported figure - `pdf`, `png` or `svg`
 
         Returns:
-            path to CSV table and PDF figure
+            path to CSV table and figure
         """
         logging.info(f'Show comments aggregation for freq: "{freq}" & type: "{parent_type}"')
         assert self.DATA_KEY_COMMENTS in self.data, "forgotten call `convert_comments_timeline`"
@@ -245,27 +971,164 @@ class Host:
             logging.warning("No data to process/show.")
             return None
 
-        df_comments = compute_user_comment_timeline(
-            self.data[self.DATA_KEY_COMMENTS],
-            parent_type=parent_type,
-            freq=freq,
-        )
-        csv_path = os.path.join(
-            self.output_path, self.CSV_USER_COMMENTS % (self.HOST_NAME, self.name, freq, parent_type or "all")
+        df_comments, csv_path, fig_path, title = self._export_user_comments(
+            freq, parent_type, sparse_format, fig_format
         )
-        df_comments.to_csv(csv_path)
+        fig_key = self._figure_key(df_comments, title, fig_format)
+        if not show_fig and self._is_output_unchanged(fig_path, fig_key):
+            self._save_output_keys()
+            return csv_path, fig_path
 
-        cum_sum = df_comments.sum(axis=0)
-        select_users = list(cum_sum[cum_sum >= self.min_contribution_count].index)
-        fig, extras = draw_comments_timeline(
-            df_comments[select_users],
-            title=f"User comments aggregation @{self.timestamp} - Freq: {freq}, Type:{parent_type or 'all'}",
-        )
-        fig_path = os.path.join(
-            self.output_path, self.PDF_USER_COMMENTS % (self.HOST_NAME, self.name, freq, parent_type or "all")
-        )
-        fig.savefig(fig_path, bbox_extra_artists=(extras["legend"], extras["colorbar"]), bbox_inches="tight")
+        import matplotlib.pyplot as plt
+
+        from repo_stats.visual import draw_comments_timeline
+
+        with span("render_figures") as records:
+            fig, extras = draw_comments_timeline(df_comments, title=title)
+            fig.savefig(fig_path, bbox_extra_artists=tuple(extras.values()), bbox_inches="tight")
+            self._register_outputs({fig_path: fig_key})
+            records.update(figures=1, users=len(df_comments.columns))
+        self._save_output_keys()
         if not show_fig:
             plt.close(fig)
 
         return csv_path, fig_path
+
+    def save_user_comments(
+        self,
+        combinations: Sequence[tuple[str, str]],
+        sparse_format: Optional[str] = None,
+        fig_format: str = "pdf",
+        nb_workers: int = 1,
+    ) -> list[tuple[str, str]]:
+        """Export aggregated user contributions for many freq/type combinations and render figures in parallel.
+
+        The tables are exported sequentially as they share the comment cube, the figures are rendered headless
+        with the same file names and content as from :meth:`show_user_comments`.
+
+        Args:
+            combinations: pairs of aggregation frequency and item kind
+            sparse_format: see :meth:`show_user_comments`
+            fig_format: see :meth:`show_user_comments`
+            nb_workers: number of processes rendering figures
+
+        Returns:
+            paths to CSV table and figure for each combination
+        """
+        from repo_stats.visual import save_comments_timeline
+
+        if not self.data.get(self.DATA_KEY_COMMENTS):
+            logging.warning("No data to process/show.")
+            return []
+
+        outputs, jobs, fig_keys = [], [], {}
+        for freq, parent_type in combinations:
+            logging.info(f'Export comments aggregation for freq: "{freq}" & type: "{parent_type}"')
+            df_comments, csv_path, fig_path, title = self._export_user_comments(
+                freq, parent_type, sparse_format, fig_format
+            )
+            outputs.append((csv_path, fig_path))
+            fig_key = self._figure_key(df_comments, title, fig_format)
+            if not self._is_output_unchanged(fig_path, fig_key):
+                jobs.append({"df_comments": df_comments, "fig_path": fig_path, "title": title})
+                fig_keys[fig_path] = fig_key
+
+        with span("render_figures") as records:
+            # the CPU time of worker processes is not measured, just the waiting for them
+            if nb_workers > 1 and len(jobs) > 1:
+                with ProcessPoolExecutor(max_workers=min(nb_workers, len(jobs))) as pool:
+                    futures = [pool.submit(save_comments_timeline, **job) for job in jobs]
+                    for future in tqdm(futures, desc="Rendering figures"):
+                        future.result()
+            else:
+                for job in jobs:
+                    save_comments_timeline(**job)
+            records.update(figures=len(jobs), users=sum(len(job["df_comments"].columns) for job in jobs))
+        self._register_outputs(fig_keys)
+        # keys of all tables and figures are saved at once
+        self._save_output_keys()
+        return outputs
+
+    def user_comments(self, freq: str = "W", parent_type: str = "", sparse: bool = False) -> pd.DataFrame:
+        """Aggregate user comments in the selected time period, without any export or rendering.
+
+        Args:
+            freq: aggregation frequency - Day, Week, Month, ... or pandas offset alias
+            parent_type: item kind like issue/PR
+            sparse: return only non-zero counts as long table user/period/count instead of the dense table
+
+        Returns:
+            dense table with periods in rows and user logins in columns or the long table
+        """
+        assert self.DATA_KEY_COMMENTS in self.data, "forgotten call `preprocess_data`"
+        if not self.data.get(self.DATA_KEY_COMMENTS):
+            return pd.DataFrame()
+        with span("user_comments") as records:
+            df_comments = rollup_comment_cube(
+                self._get_comment_cube(freq),
+                parent_type=parent_type,
+                freq=freq,
+                dense=not sparse,
+            )
+            records["cells"] = df_comments.size
+        if sparse:
+            df_comments["author"] = df_comments["author"].map(self.users.login)
+            return df_comments
+        return df_comments.rename(columns=self.users.login).sort_index(axis=1)
+
+    def _shown_user_comments(self, df_comments: pd.DataFrame, sparse: bool = False) -> pd.DataFrame:
+        """Select users with at least minimal contribution to be drawn, the long table is densified."""
+        if sparse:
+            # densify just the users which are shown
+            return densify_user_comments(df_comments, min_contribution=self.min_contribution_count)
+        cum_sum = df_comments.sum(axis=0)
+        return df_comments[list(cum_sum[cum_sum >= self.min_contribution_count].index)]
+
+    def _user_comments_title(self, df_comments: pd.DataFrame, freq: str, parent_type: str) -> str:
+        title = "User comments aggregation"
+        if self.title_timestamp == "fetched":
+            title += f" @{self.timestamp}"
+        elif self.title_timestamp == "latest" and not df_comments.empty:
+            title += f" @{df_comments.index.max()}"
+        return title + f" - Freq: {freq}, Type:{parent_type or 'all'}"
+
+    def draw_user_comments(self, freq: str = "W", parent_type: str = "", headless: bool = True) -> tuple:
+        """Draw aggregated user comments as figure object, it is neither saved nor shown.
+
+        Args:
+            freq: aggregation frequency - Day, Week, Month, ... or pandas offset alias
+            parent_type: item kind like issue/PR
+            headless: build the figure without global pyplot state, see :func:`repo_stats.visual.draw_comments_timeline`
+
+        Returns:
+            figure and extras
+        """
+        from repo_stats.visual import draw_comments_timeline
+
+        df_comments = self._shown_user_comments(self.user_comments(freq=freq, parent_type=parent_type))
+        title = self._user_comments_title(df_comments, freq=freq, parent_type=parent_type)
+        return draw_comments_timeline(df_comments, title=title, headless=headless)
+
+    def _export_user_comments(
+        self, freq: str, parent_type: str, sparse_format: Optional[str], fig_format: str
+    ) -> tuple[pd.DataFrame, str, str, str]:
+        """Aggregate and export user comments table, return users to be drawn with figure path and title."""
+        assert fig_format in self.FIGURE_FORMATS, f"unsupported figure format: {fig_format}"
+        assert not sparse_format or sparse_format in self.SPARSE_FORMATS, f"unsupported sparse format: {sparse_format}"
+        df_comments = self.user_comments(freq=freq, parent_type=parent_type, sparse=bool(sparse_format))
+        name_args = (self.HOST_NAME, self._report_name, freq, parent_type or "all")
+        if sparse_format:
+            path_base = self.LONG_USER_COMMENTS % (*name_args, "")
+            csv_path = self._export_long_table(df_comments, os.path.join(self.output_path, path_base), sparse_format)
+        else:
+            csv_path = os.path.join(self.output_path, self.CSV_USER_COMMENTS % name_args)
+            self._export_table(df_comments, csv_path)
+
+        df_comments = self._shown_user_comments(df_comments, sparse=bool(sparse_format))
+        fig_path = os.path.join(self.output_path, self.FIG_USER_COMMENTS % (*name_args, fig_format))
+        title = self._user_comments_title(df_comments, freq=freq, parent_type=parent_type)
+        return df_comments, csv_path, fig_path, title
+
+    def _figure_key(self, df_comments: pd.DataFrame, title: str, fig_format: str) -> str:
+        """Content key of the figure given by drawn table and all rendering parameters."""
+        return hash_table(df_comments, title=title, fig_format=fig_format, min_contribution=self.min_contribution_count)
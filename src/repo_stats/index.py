@@ -0,0 +1,88 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+from collections.abc import Iterable
+
+
+def new_index() -> dict:
+    """Empty inverted indexes, the keys are strings so the indexes can be dumped to JSON as they are.
+
+    - ``authors`` maps user ID to the list of authored tickets
+    - ``commenters`` maps user ID to commented tickets and offsets of the user's comments in each of them
+    """
+    return {"authors": {}, "commenters": {}}
+
+
+def index_ticket(index: dict, idx: str, ticket: dict, sign: int = 1) -> None:
+    """Add the converted ticket to the inverted indexes or remove it with negative sign.
+
+    Args:
+        index: inverted indexes to be updated in place, see :func:`new_index`
+        idx: ticket key as in the raw tickets
+        ticket: converted ticket with its simple items and comments
+        sign: positive to add the ticket, negative to remove it
+
+    >>> index = new_index()
+    >>> ticket = {"simple": [dict(number=5, author=0)], "comments": [dict(author=1), dict(author=0), dict(author=1)]}
+    >>> index_ticket(index, "5", ticket)
+    >>> index
+    {'authors': {'0': ['5']}, 'commenters': {'1': {'5': [0, 2]}, '0': {'5': [1]}}}
+    >>> index_ticket(index, "5", ticket, sign=-1)
+    >>> index
+    {'authors': {}, 'commenters': {}}
+    """
+    offsets = {}
+    for i, cmt in enumerate(ticket["comments"]):
+        offsets.setdefault(str(cmt["author"]), []).append(i)
+    authors = {str(item["author"]) for item in ticket["simple"]}
+    if sign > 0:
+        for uid in authors:
+            index["authors"].setdefault(uid, []).append(idx)
+        for uid, offs in offsets.items():
+            index["commenters"].setdefault(uid, {})[idx] = offs
+        return
+    for uid in authors:
+        tickets = index["authors"].get(uid, [])
+        if idx in tickets:
+            tickets.remove(idx)
+        if not tickets:
+            index["authors"].pop(uid, None)
+    for uid in offsets:
+        commented = index["commenters"].get(uid, {})
+        commented.pop(idx, None)
+        if not commented:
+            index["commenters"].pop(uid, None)
+
+
+def build_index(tickets: dict[str, dict]) -> dict:
+    """Index all converted tickets from scratch.
+
+    >>> build_index({"1": {"simple": [dict(number=1, author=2)], "comments": []}})
+    {'authors': {'2': ['1']}, 'commenters': {}}
+    """
+    index = new_index()
+    for idx, ticket in tickets.items():
+        index_ticket(index, idx, ticket)
+    return index
+
+
+def lookup_users(index: dict, user_ids: Iterable[int]) -> dict[str, dict[str, list[int]]]:
+    """Collect tickets where any of the users is involved, either as author or as commenter.
+
+    Returns:
+        for each ticket the users and offsets of their comments, authors without comments have empty offsets
+
+    >>> index = {'authors': {'0': ['5', '7']}, 'commenters': {'1': {'5': [0, 2]}, '0': {'5': [1]}}}
+    >>> lookup_users(index, [0])
+    {'5': {'0': [1]}, '7': {'0': []}}
+    >>> lookup_users(index, [1, 3])
+    {'5': {'1': [0, 2]}}
+    """
+    found = {}
+    for uid in map(str, user_ids):
+        for idx in index["authors"].get(uid, []):
+            found.setdefault(idx, {}).setdefault(uid, [])
+        for idx, offsets in index["commenters"].get(uid, {}).items():
+            found.setdefault(idx, {})[uid] = offsets
+    return found
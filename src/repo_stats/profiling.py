@@ -0,0 +1,175 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import cProfile
+import logging
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Optional
+
+from repo_stats.data_io import JSON_PROFILE_NAME, save_data
+
+#: the active profiler measuring spans, if not set the spans cost nearly nothing
+_PROFILER = None
+
+
+class Profiler:
+    """Measure wall time, CPU time, peak memory and record counts of named pipeline stages.
+
+    Spans can be nested, so each one is reported with the path of its parents. The CPU time is of this process only,
+    the peak memory is the maximal increase of memory allocated by Python while the span is open.
+
+    >>> profiler = Profiler(trace_memory=False)
+    >>> for _ in range(2):
+    ...     with profiler.span("load") as records:
+    ...         records["tickets"] = 10
+    ...         with profiler.span("parse"):
+    ...             pass
+    >>> [span["path"] for span in profiler.spans]
+    ['load/parse', 'load', 'load/parse', 'load']
+    >>> stages = profiler.summary()
+    >>> stages["load"]["calls"], stages["load"]["records"]
+    (2, {'tickets': 20})
+    """
+
+    def __init__(self, trace_memory: bool = True, profile_stage: Optional[str] = None):
+        """
+        Args:
+            trace_memory: measure the peak memory, it needs running `tracemalloc`, which slows down the run
+            profile_stage: collect cProfile statistics for all spans with this name
+        """
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.spans = []
+        self._stack = []
+        self._cprofile = cProfile.Profile() if profile_stage else None
+        self._cprofile_depth = 0
+
+    def _update_peaks(self) -> int:
+        """Assign the peak memory since the last reset to all open spans."""
+        current, peak = tracemalloc.get_traced_memory()
+        for opened in self._stack:
+            opened["peak"] = max(opened["peak"], peak)
+        return current
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[dict]:
+        """Measure the code block, record counts can be added to the yielded dictionary."""
+        records = {}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        mem_start = 0
+        if tracing:
+            mem_start = self._update_peaks()
+            tracemalloc.reset_peak()
+        opened = {"name": name, "peak": mem_start}
+        self._stack.append(opened)
+        path = "/".join(s["name"] for s in self._stack)
+        profiled = self._cprofile is not None and name == self.profile_stage
+        if profiled:
+            self._cprofile_depth += 1
+            if self._cprofile_depth == 1:
+                self._cprofile.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield records
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if profiled:
+                self._cprofile_depth -= 1
+                if self._cprofile_depth == 0:
+                    self._cprofile.disable()
+            if tracing:
+                self._update_peaks()
+            self._stack.pop()
+            self.spans.append(
+                {
+                    "name": name,
+                    "path": path,
+                    "wall_s": round(wall, 6),
+                    "cpu_s": round(cpu, 6),
+                    "peak_mb": round((opened["peak"] - mem_start) / 1024**2, 3) if tracing else None,
+                    "records": records,
+                }
+            )
+
+    def summary(self) -> dict[str, dict]:
+        """Aggregate spans with the same path, times and records are summed and the peak memory is maximal."""
+        stages = {}
+        for span in self.spans:
+            stage = stages.setdefault(
+                span["path"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mb": span["peak_mb"], "records": {}}
+            )
+            stage["calls"] += 1
+            stage["wall_s"] = round(stage["wall_s"] + span["wall_s"], 6)
+            stage["cpu_s"] = round(stage["cpu_s"] + span["cpu_s"], 6)
+            if span["peak_mb"] is not None:
+                stage["peak_mb"] = max(stage["peak_mb"], span["peak_mb"])
+            for key, count in span["records"].items():
+                stage["records"][key] = stage["records"].get(key, 0) + count
+        return stages
+
+    def save(self, path_dir: str, repo_name: str, host: str = "", command: str = "analyze") -> str:
+        """Save the JSON report and optional cProfile statistics next to it.
+
+        Args:
+            path_dir: output folder
+            repo_name: repository name used in the file name
+            host: host name used in the file name
+            command: profiled CLI command used in the file name
+
+        Returns:
+            path to the JSON report
+        """
+        report = {"command": command, "stages": self.summary(), "spans": self.spans}
+        template = JSON_PROFILE_NAME.format(command=command)
+        path = save_data(report, path_dir=path_dir, repo_name=repo_name, host=host, template=template)
+        if self._cprofile is not None:
+            path_stats = f"{path[: -len('.json')]}_{self.profile_stage}.prof"
+            self._cprofile.dump_stats(path_stats)
+            logging.info(f"Profile of the stage '{self.profile_stage}' saved to: {path_stats}")
+        return path
+
+
+def span(name: str) -> AbstractContextManager:
+    """Measure the pipeline stage with the active profiler, nothing is measured if profiling is disabled.
+
+    >>> with span("load") as records:
+    ...     records["tickets"] = 10
+    """
+    if _PROFILER is None:
+        return nullcontext({})
+    return _PROFILER.span(name)
+
+
+@contextmanager
+def profiling(
+    enabled: bool = True, profile_stage: Optional[str] = None, trace_memory: bool = True
+) -> Iterator[Optional[Profiler]]:
+    """Activate profiler for all spans in the code block.
+
+    >>> with profiling(trace_memory=False) as profiler, span("load"):
+    ...     pass
+    >>> list(profiler.summary())
+    ['load']
+    >>> with profiling(enabled=False) as profiler:
+    ...     print(profiler)
+    None
+    """
+    global _PROFILER
+    if not enabled:
+        yield None
+        return
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    profiler = Profiler(trace_memory=trace_memory, profile_stage=profile_stage)
+    _PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        _PROFILER = None
+        if started:
+            tracemalloc.stop()
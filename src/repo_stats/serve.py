@@ -0,0 +1,241 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import json
+import logging
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from repo_stats.data_io import convert_date
+from repo_stats.github import GitHub
+from repo_stats.host import Host
+from repo_stats.stats import is_valid_freq
+
+
+class RepoPool:
+    """Loaded and preprocessed repositories kept in memory, the least recently used ones are evicted.
+
+    Each repository has its own lock, so a long sync or a request blocks only the one repository.
+
+    >>> pool = RepoPool(output_path=".", max_repos=2)
+    >>> pool.repos
+    []
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        max_repos: int = 8,
+        auth_token: Optional[str] = None,
+        min_contribution: int = 3,
+        user_bots: Optional[Sequence[str]] = None,
+        host_cls: type = GitHub,
+    ):
+        """
+        Args:
+            output_path: path to the dumped repositories
+            max_repos: maximal number of repositories kept in memory
+            auth_token: authentication token for API access used while syncing
+            min_contribution: minimal nb contributions for tables
+            user_bots: name patterns for bot users, if not set the host default is used
+            host_cls: host implementation
+        """
+        assert max_repos > 0, "at least one repository has to be kept in memory"
+        self.max_repos = max_repos
+        self.host_cls = host_cls
+        self.host_kwargs = {
+            "output_path": output_path,
+            "auth_token": auth_token,
+            "min_contribution": min_contribution,
+            "user_bots": user_bots,
+        }
+        self._hosts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def repos(self) -> list[str]:
+        """Loaded repositories from the least to the most recently used."""
+        with self._lock:
+            return list(self._hosts)
+
+    def _load(self, repo_name: str) -> Host:
+        """Load the cached repository and preprocess it."""
+        host = self.host_cls(repo_name=repo_name, **self.host_kwargs)
+        host.fetch_data(offline=True)
+        if not host.data.get(host.DATA_KEY_RAW_TICKETS):
+            raise FileNotFoundError(f"No data for repository '{repo_name}', scrape it first.")
+        host.preprocess_data()
+        return host
+
+    def _get(self, repo_name: str) -> tuple[Host, threading.RLock]:
+        with self._lock:
+            if repo_name in self._hosts:
+                self._hosts.move_to_end(repo_name)
+                return self._hosts[repo_name]
+        # loading out of the pool lock, so other repositories are served meanwhile
+        loaded = (self._load(repo_name), threading.RLock())
+        with self._lock:
+            # the same repository may be loaded by another request meanwhile
+            entry = self._hosts.setdefault(repo_name, loaded)
+            self._hosts.move_to_end(repo_name)
+            while len(self._hosts) > self.max_repos:
+                evicted, _ = self._hosts.popitem(last=False)
+                logging.info(f"Evicting the least recently used repository: {evicted}")
+        return entry
+
+    @contextmanager
+    def use(self, repo_name: str) -> Iterator[Host]:
+        """Get the repository, load it if needed, and lock it for exclusive use."""
+        host, lock = self._get(repo_name)
+        with lock:
+            yield host
+
+    def sync(self) -> None:
+        """Update all loaded repositories from host, only the changed tickets are fetched and preprocessed."""
+        with self._lock:
+            entries = list(self._hosts.items())
+        for repo_name, (host, lock) in entries:
+            logging.info(f"Syncing repository: {repo_name}")
+            with lock:
+                try:
+                    host.fetch_data(offline=False, reload=False)
+                except Exception as ex:
+                    logging.error(f"Syncing '{repo_name}' failed with {ex!r}")
+
+
+def _select_period(host: Host, date_from: Optional[str] = None, date_to: Optional[str] = None) -> None:
+    """Select the time period only if it differs from the current one."""
+    if (convert_date(date_from), convert_date(date_to)) != (host.datetime_from, host.datetime_to):
+        host.select_time_period(date_from=date_from, date_to=date_to)
+
+
+def _frame_to_dict(df: pd.DataFrame) -> dict:
+    return json.loads(df.to_json(orient="split"))
+
+
+def query_users_summary(
+    host: Host, columns: str = "", date_from: Optional[str] = None, date_to: Optional[str] = None
+) -> dict:
+    """Users summary in the time period, optionally only the comma separated `columns`."""
+    _select_period(host, date_from=date_from, date_to=date_to)
+    return _frame_to_dict(host.users_summary(columns=[c for c in columns.split(",") if c]))
+
+
+def query_user_comments(
+    host: Host, freq: str = "W", type: str = "", date_from: Optional[str] = None, date_to: Optional[str] = None
+) -> dict:
+    """Aggregated user comments in the time period with given frequency and item type."""
+    assert is_valid_freq(freq), f"invalid frequency: {freq}"
+    _select_period(host, date_from=date_from, date_to=date_to)
+    parent_type = "" if type.lower() == "all" else type
+    return _frame_to_dict(host.user_comments(freq=freq, parent_type=parent_type))
+
+
+#: served queries by their path
+QUERIES = {
+    "users_summary": query_users_summary,
+    "user_comments": query_user_comments,
+}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Serve `GET /<owner>/<repo>/<query>?<params>` and `GET /health` with JSON replies."""
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        try:
+            if parts == ["health"]:
+                reply = {"repos": self.server.pool.repos}
+            elif len(parts) == 3 and parts[2] in QUERIES:
+                with self.server.pool.use("/".join(parts[:2])) as host:
+                    reply = QUERIES[parts[2]](host, **params)
+            else:
+                reply = {"error": f"Unknown path: {url.path}"}
+                self._reply(HTTPStatus.NOT_FOUND, reply)
+                return
+        except FileNotFoundError as ex:
+            self._reply(HTTPStatus.NOT_FOUND, {"error": str(ex)})
+        except (AssertionError, TypeError, ValueError) as ex:
+            self._reply(HTTPStatus.BAD_REQUEST, {"error": str(ex)})
+        else:
+            self._reply(HTTPStatus.OK, reply)
+
+    def _reply(self, status: HTTPStatus, reply: dict) -> None:
+        body = json.dumps(reply).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # the client address is empty for Unix sockets
+        logging.debug(format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+    pool: RepoPool, host: str = "127.0.0.1", port: int = 8765, socket_path: Optional[str] = None
+) -> Union[ThreadingHTTPServer, _UnixHTTPServer]:
+    """Create server answering queries on the local TCP port or on the Unix socket if its path is given."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.pool = pool
+    return server
+
+
+def _sync_periodically(pool: RepoPool, interval: float, stop: threading.Event) -> None:
+    while not stop.wait(interval):
+        pool.sync()
+
+
+def run_server(
+    pool: RepoPool,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+    sync_interval: float = 0,
+) -> None:
+    """Serve queries until interrupted and sync the loaded repositories periodically.
+
+    Args:
+        pool: repositories to be served
+        host: local address to listen on
+        port: local port to listen on
+        socket_path: listen on this Unix socket instead of TCP port
+        sync_interval: sync all loaded repositories with this period in seconds, zero disables syncing
+    """
+    server = make_server(pool, host=host, port=port, socket_path=socket_path)
+    stop = threading.Event()
+    if sync_interval > 0:
+        threading.Thread(target=_sync_periodically, args=(pool, sync_interval, stop), daemon=True).start()
+    logging.info(f"Serving on {socket_path or f'http://{host}:{server.server_address[1]}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the server...")
+    finally:
+        stop.set()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
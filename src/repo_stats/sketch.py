@@ -0,0 +1,226 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import base64
+import hashlib
+import math
+import zlib
+from collections.abc import Iterable
+from typing import Optional
+
+import pandas as pd
+
+from repo_stats.data_io import convert_dates
+from repo_stats.stats import bucket_dates
+
+
+class HyperLogLog:
+    """Approximate distinct counter with bounded memory, which can be merged across repositories and periods.
+
+    The relative standard error is about ``1.04 / sqrt(2 ** precision)``, so the precision is derived from
+    requested error, e.g. 2% error needs 4096 one-byte registers regardless the number of counted values.
+
+    >>> hll = HyperLogLog(error=0.02)
+    >>> hll.precision
+    12
+    >>> hll.update(f"user{i}" for i in range(1000))
+    >>> abs(hll.count() - 1000) < 50
+    True
+    >>> other = HyperLogLog(error=0.02)
+    >>> other.update(f"user{i}" for i in range(500, 1500))
+    >>> abs(hll.merge(other).count() - 1500) < 75
+    True
+    >>> HyperLogLog.from_dict(hll.to_dict()).count() == hll.count()
+    True
+    """
+
+    #: limits for the number of register bits
+    PRECISION_RANGE = (4, 16)
+
+    def __init__(self, error: float = 0.02, precision: Optional[int] = None):
+        """
+        Args:
+            error: requested relative standard error of the estimate
+            precision: number of bits addressing the registers, derived from `error` if not set
+        """
+        if precision is None:
+            precision = math.ceil(2 * math.log2(1.04 / error))
+        self.precision = min(max(precision, self.PRECISION_RANGE[0]), self.PRECISION_RANGE[1])
+        self.registers = bytearray(2**self.precision)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        """Stable 64bit hash, the same in each process and on each machine."""
+        return int.from_bytes(hashlib.blake2b(str(value).encode("utf8"), digest_size=8).digest(), "big")
+
+    def add(self, value: str) -> None:
+        """Count a single value."""
+        hashed = self._hash(value)
+        idx = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        # position of the leftmost 1-bit in the remaining bits
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def update(self, values: Iterable[str]) -> None:
+        """Count all values."""
+        for val in values:
+            self.add(val)
+
+    def fold(self, precision: int) -> "HyperLogLog":
+        """Reduce the sketch to lower precision, it is the same as counting all values with that precision.
+
+        The dropped bits of the register index become the leading bits of the rest of the hash.
+
+        >>> hll = HyperLogLog(precision=12)
+        >>> hll.update(f"user{i}" for i in range(1000))
+        >>> coarse = HyperLogLog(precision=8)
+        >>> coarse.update(f"user{i}" for i in range(1000))
+        >>> hll.fold(8).registers == coarse.registers
+        True
+        """
+        assert precision <= self.precision, f"cannot fold precision {self.precision} to higher {precision}"
+        shift = self.precision - precision
+        folded = HyperLogLog(precision=precision)
+        for idx, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            dropped = idx & ((1 << shift) - 1)
+            rank = shift - dropped.bit_length() + 1 if dropped else rank + shift
+            if rank > folded.registers[idx >> shift]:
+                folded.registers[idx >> shift] = rank
+        return folded
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Merge the other sketch into this one, the sketch with higher precision is folded to the lower one.
+
+        >>> hll = HyperLogLog(precision=12)
+        >>> hll.update(f"user{i}" for i in range(1000))
+        >>> other = HyperLogLog(precision=10)
+        >>> other.update(f"user{i}" for i in range(500, 1500))
+        >>> merged = hll.merge(other)
+        >>> merged.precision, abs(merged.count() - 1500) < 150
+        (10, True)
+        """
+        if other.precision > self.precision:
+            other = other.fold(self.precision)
+        elif other.precision < self.precision:
+            self.precision, self.registers = other.precision, self.fold(other.precision).registers
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """Estimate number of distinct values."""
+        nb_regs = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / nb_regs)
+        estimate = alpha * nb_regs**2 / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        # small range correction with linear counting
+        if estimate <= 2.5 * nb_regs and zeros:
+            estimate = nb_regs * math.log(nb_regs / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        """Serialize to JSON compatible dictionary, empty registers are well compressed."""
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(zlib.compress(bytes(self.registers))).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        """Restore the serialized sketch."""
+        hll = cls(precision=data["precision"])
+        hll.registers = bytearray(zlib.decompress(base64.b64decode(data["registers"])))
+        return hll
+
+
+#: sketched kinds of contributors
+SKETCH_KINDS = ("commenters", "authors")
+
+
+def compute_contributor_sketches(
+    comments: list[dict],
+    tickets: list[dict],
+    freq: str = "M",
+    error: float = 0.02,
+    user_names: Optional[list[str]] = None,
+) -> dict[str, dict[str, HyperLogLog]]:
+    """Sketch distinct commenters and issue/PR authors per period.
+
+    Args:
+        comments: comments with creation date and author
+        tickets: simplified issues/PRs with creation date and author
+        freq: period frequency, see :func:`repo_stats.stats.compute_user_comment_timeline`
+        error: relative error of distinct counts
+        user_names: translation of user IDs to names, as IDs are not comparable across repositories
+
+    Returns:
+        sketches indexed by contributor kind and period
+
+    >>> comments = [dict(created_at='2020-10-05', author='me'), dict(created_at='2020-10-07', author='you')]
+    >>> tickets = [dict(created_at='2020-10-01', author='me'), dict(created_at='2020-11-15', author='me')]
+    >>> sketches = compute_contributor_sketches(comments, tickets, freq='M')
+    >>> {kind: {p: s.count() for p, s in periods.items()} for kind, periods in sketches.items()}
+    {'commenters': {'2020-10': 2}, 'authors': {'2020-10': 1, '2020-11': 1}}
+    """
+    sketches = {}
+    for kind, items in zip(SKETCH_KINDS, (comments, tickets)):
+        df = pd.DataFrame(items, columns=["created_at", "author"])
+        dates = convert_dates(df["created_at"])
+        df = df[dates.notna()]
+        if user_names is not None:
+            df["author"] = [user_names[uid] for uid in df["author"]]
+        df["period"] = bucket_dates(dates[dates.notna()], freq)
+        sketches[kind] = {}
+        for period, users in df.drop_duplicates(["period", "author"]).groupby("period")["author"]:
+            sketches[kind][period] = HyperLogLog(error=error)
+            sketches[kind][period].update(users)
+    return sketches
+
+
+def merge_contributor_sketches(collection: Iterable[dict[str, dict[str, HyperLogLog]]]) -> pd.DataFrame:
+    """Merge sketches from many repositories and estimate distinct contributors per period and in total.
+
+    >>> sk1 = compute_contributor_sketches([dict(created_at='2020-10-05', author='me')], [], freq='Y')
+    >>> sk2 = compute_contributor_sketches([dict(created_at='2021-10-05', author='me'),
+    ...                                     dict(created_at='2021-10-05', author='you')], [], freq='Y')
+    >>> merge_contributor_sketches([sk1, sk2])  # doctest: +NORMALIZE_WHITESPACE
+            commenters  authors
+    period
+    2020             1        0
+    2021             2        0
+    total            2        0
+    """
+    merged = {kind: {} for kind in SKETCH_KINDS}
+    for sketches in collection:
+        for kind, periods in sketches.items():
+            for period, hll in periods.items():
+                if period in merged[kind]:
+                    merged[kind][period].merge(hll)
+                else:
+                    merged[kind][period] = HyperLogLog(precision=hll.precision).merge(hll)
+
+    periods = sorted({p for kind in merged.values() for p in kind})
+    table = {kind: [merged[kind][p].count() if p in merged[kind] else 0 for p in periods] for kind in merged}
+    df = pd.DataFrame(table, index=pd.Index(periods, name="period"))
+    # union over all periods
+    for kind, sketches in merged.items():
+        total = None
+        for hll in sketches.values():
+            total = HyperLogLog(precision=hll.precision).merge(hll) if total is None else total.merge(hll)
+        df.loc["total", kind] = total.count() if total else 0
+    return df.astype(int)
+
+
+def sketches_to_dict(sketches: dict[str, dict[str, HyperLogLog]]) -> dict:
+    """Serialize nested sketches to JSON compatible dictionary."""
+    return {kind: {p: hll.to_dict() for p, hll in periods.items()} for kind, periods in sketches.items()}
+
+
+def sketches_from_dict(data: dict) -> dict[str, dict[str, HyperLogLog]]:
+    """Restore nested sketches from serialized dictionary."""
+    return {kind: {p: HyperLogLog.from_dict(hll) for p, hll in periods.items()} for kind, periods in data.items()}
@@ -2,15 +2,20 @@
 Copyright (C) 2020-2021 Jiri Borovec <...>
 """
 
+from collections.abc import Iterable, Sequence
 from typing import Optional
 
 import pandas as pd
-from tqdm import tqdm
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
 
-# see: https://docs.python.org/3/library/datetime.html#strftime-and-strptime-format-codes
-#: define conversion for frequency grouping
-from repo_stats.data_io import is_in_time_period
+from repo_stats.data_io import convert_dates, mask_in_time_period
+
+# default display size was changed in pandas v0.23
+pd.set_option("display.max_columns", 20)
 
+# see: https://docs.python.org/3/library/datetime.html#strftime-and-strptime-format-codes
+#: define conversion for frequency grouping, any other pandas offset alias is also accepted
 DATETIME_FREQ = {
     "D": "%Y-%m-%d",
     "W": "%Y-w%W",
@@ -37,44 +42,203 @@ def compute_users_summary(items: list[dict], datetime_from: str = None, datetime
     """
     assert items, "nothing to do..."
     df_items = pd.DataFrame(items)
+    for col in ("created_at", "closed_at"):
+        if col not in df_items.columns:
+            df_items[col] = None
+
+    # count only opened cases in such time
+    is_opened = mask_in_time_period(df_items["created_at"], datetime_from=datetime_from, datetime_to=datetime_to)
+    # count only closed/merged cases in such time
+    is_closed = mask_in_time_period(df_items["closed_at"], datetime_from=datetime_from, datetime_to=datetime_to)
+    is_merged = is_closed & (df_items["state"] == "merged")
+    # in this time all comments shall be already filtered and we need all issues
+    #  as they can be created before time window and commented in given period...
+    df_commented = df_items[["author", "type", "commenters"]].explode("commenters").dropna(subset=["commenters"])
+    df_commented = df_commented[df_commented["commenters"] != df_commented["author"]]
+    # each commenter is counted only once per issue/PR
+    df_commented = df_commented.reset_index().drop_duplicates(["index", "commenters"])
 
-    users_stat = []
-    for user in tqdm(df_items["author"].unique(), desc="Processing users"):
-        user_stat = {"user": user}
-        # parse particular user stats
-        for tp, df in df_items.groupby("type"):
-            df_self_author = df[df["author"] == user]
-            # add selection if it is in range
-            for c_out, c_in in [("created", "created_at"), ("closed", "closed_at")]:
-                if c_in not in df_self_author.columns:
-                    df_self_author[c_in] = None
-                df_self_author[c_out] = [
-                    is_in_time_period(dt, datetime_from=datetime_from, datetime_to=datetime_to)
-                    for dt in df_self_author[c_in]
-                ]
-            df_merged = df_self_author[df_self_author["state"] == "merged"]
-            df_not_author = df[df["author"] != user]
-            user_stat.update(
-                {
-                    # count only opened cases in such time
-                    f"opened {tp}s": sum(df_self_author["created"]),
-                    # count only closed/merged cases in such time
-                    f"merged {tp}s": sum(df_merged["closed"]),
-                    # in this time all comments shall be already filtered and we need all issues
-                    #  as they can be created before time window and commented in given period...
-                    f"commented {tp}s": sum(df_not_author["commenters"].apply(lambda ls: user in ls)),
-                }
-            )
-        users_stat.append(user_stat)
+    counts = {
+        "opened": df_items[is_opened].groupby(["author", "type"]).size(),
+        "merged": df_items[is_merged].groupby(["author", "type"]).size(),
+        "commented": df_commented.groupby(["commenters", "type"]).size(),
+    }
+    users = pd.Index(df_items["author"].unique(), name="user")
+    types = sorted(df_items["type"].unique())
+    counts = {
+        name: cnt.unstack("type", fill_value=0).reindex(index=users, columns=types, fill_value=0)
+        for name, cnt in counts.items()
+    }
 
     # transform to pandas table
-    df_users = pd.DataFrame(users_stat).set_index(["user"])
+    df_users = pd.DataFrame({f"{name} {tp}s": counts[name][tp] for tp in types for name in counts}, index=users)
     df_users["all opened"] = df_users["opened PRs"] + df_users["opened issues"]
     df_users.sort_values(["all opened"], ascending=False, inplace=True)
 
     return df_users
 
 
+def is_valid_freq(freq: str) -> bool:
+    """Check if the frequency is one of predefined or any pandas offset alias.
+
+    >>> is_valid_freq("W"), is_valid_freq("2W"), is_valid_freq("QS"), is_valid_freq("pr")
+    (True, True, True, False)
+    """
+    if freq in DATETIME_FREQ:
+        return True
+    try:
+        to_offset(freq)
+    except ValueError:
+        return False
+    return True
+
+
+def bucket_dates(dates: pd.Series, freq: str) -> pd.Series:
+    """Label each date with its aggregation period.
+
+    >>> dates = convert_dates(["2020-10-05T03:00:00Z", "2020-10-17", "2020-11-15T21:00:00Z"])
+    >>> bucket_dates(dates, "M").tolist()
+    ['2020-10', '2020-10', '2020-11']
+    >>> bucket_dates(dates, "2W").tolist()
+    ['2020-10-11', '2020-10-25', '2020-11-22']
+    >>> bucket_dates(dates, "12h").tolist()
+    ['2020-10-05 00:00', '2020-10-17 00:00', '2020-11-15 12:00']
+    """
+    if freq in DATETIME_FREQ:
+        # format just the unique days instead of each date
+        codes, days = pd.factorize(dates.dt.floor("D"))
+        return pd.Series(days.strftime(DATETIME_FREQ[freq]).to_numpy()[codes], index=dates.index)
+    # use the resample binning, so periods are labeled as by `DataFrame.resample`
+    grouped = dates.to_frame("date").groupby(pd.Grouper(key="date", freq=freq))
+    edges = pd.DatetimeIndex(list(grouped.groups))
+    fmt = "%Y-%m-%d" if (edges == edges.normalize()).all() else "%Y-%m-%d %H:%M"
+    return pd.Series(edges.strftime(fmt).to_numpy()[grouped.ngroup().to_numpy()], index=dates.index)
+
+
+def cube_base_freq(freq: str) -> str:
+    """Select the finest needed granularity of the comment cube for given frequency.
+
+    >>> cube_base_freq("M"), cube_base_freq("QS"), cube_base_freq("4h")
+    ('D', 'D', '4h')
+    """
+    if freq in DATETIME_FREQ:
+        return "D"
+    offset = to_offset(freq)
+    if isinstance(offset, Tick) and offset.nanos < pd.Timedelta(days=1).value:
+        return freq
+    return "D"
+
+
+def compute_comment_cube(items: list[dict], base_freq: str = "D") -> pd.DataFrame:
+    """Parse dates of all comments and floor them to the base period in a single pass, one row per comment.
+
+    The parsed table is shared for all timeline aggregations, any coarser frequency and selected type
+    is a roll-up of it, see :func:`rollup_comment_cube`. The rows are not aggregated to counts, as the roll-up
+    drops duplicates - equal in all fields, e.g. also `count_at` - within each aggregation period, the same as
+    the timeline did before. Rows equal in all fields within the base period are dropped already here,
+    but comments usually differ in their `count_at` time, so it is still about one row per comment.
+
+    Args:
+        items: comments with creation date, author and parent issue/PR
+        base_freq: granularity of the cube, it shall be fixed frequency as day or hours
+
+    Returns:
+        table with the base period as `date` and all other comment's fields
+
+    >>> items = [dict(created_at='2020-10-05T10:00:00Z', parent_idx=1, parent_type='issue', author='me'),
+    ...          dict(created_at='2020-10-05T12:00:00Z', parent_idx=2, parent_type='PR', author='me'),
+    ...          dict(created_at='2020-10-05T16:00:00Z', parent_idx=2, parent_type='PR', author='me'),
+    ...          dict(created_at='2020-11-15T08:00:00Z', parent_idx=3, parent_type='issue', author='you')]
+    >>> compute_comment_cube(items)  # doctest: +NORMALIZE_WHITESPACE
+                           date  parent_idx parent_type author
+    0 2020-10-05 00:00:00+00:00           1       issue     me
+    1 2020-10-05 00:00:00+00:00           2          PR     me
+    2 2020-11-15 00:00:00+00:00           3       issue    you
+    """
+    df_comments = pd.DataFrame(items, columns=None if items else ["created_at", "parent_type", "author"])
+    dates = convert_dates(df_comments.pop("created_at"))
+    df_comments.insert(0, "date", dates.dt.floor(base_freq))
+    # keep only single sample per user-time-issue
+    return df_comments[dates.notna()].drop_duplicates(ignore_index=True)
+
+
+def rollup_comment_cube(
+    cube: pd.DataFrame,
+    freq: str = "W",
+    parent_type: Optional[str] = None,
+    dense: bool = True,
+) -> pd.DataFrame:
+    """Aggregate the comment cube to user timeline with given frequency and issue/PR type.
+
+    Only the date parsing is shared, each roll-up still drops duplicates and groups all rows of the cube,
+    so its cost grows with the number of comments.
+
+    Args:
+        cube: parsed comments from :func:`compute_comment_cube`
+        freq: aggregation frequency, it shall not be finer than the cube granularity
+        parent_type: select only comments for this issue/PR type
+        dense: return full cross table, otherwise long table with only non-zero counts
+
+    Returns:
+        table with aggregation periods as index and users as columns,
+        or long table with columns `created_at`, `author` and `count`
+
+    >>> items = [dict(created_at='2020-10-05', parent_idx=1, parent_type='issue', author='me'),
+    ...          dict(created_at='2020-10-17', parent_idx=2, parent_type='PR', author='me'),
+    ...          dict(created_at='2020-11-15', parent_idx=3, parent_type='issue', author='you')]
+    >>> cube = compute_comment_cube(items)
+    >>> rollup_comment_cube(cube, freq='M')  # doctest: +NORMALIZE_WHITESPACE
+    author      me  you
+    created_at
+    2020-10      2    0
+    2020-11      0    1
+    >>> rollup_comment_cube(cube, freq='Y', parent_type='pr')  # doctest: +NORMALIZE_WHITESPACE
+    author      me
+    created_at
+    2020         1
+    >>> rollup_comment_cube(cube, freq='M', dense=False)  # doctest: +NORMALIZE_WHITESPACE
+      created_at author  count
+    0    2020-10     me      2
+    1    2020-11    you      1
+    """
+    if parent_type:
+        # filter issue/PR type aka comment parent
+        cube = cube[cube["parent_type"].str.lower().str.contains(parent_type.lower(), regex=False)]
+    # convert to date according to the freq.
+    df_comments = cube.drop(columns="date")
+    df_comments.insert(0, "created_at", bucket_dates(cube["date"], freq))
+    # keep only single sample per user-time-issue
+    df_comments = df_comments.drop_duplicates(ignore_index=True)
+    counts = df_comments.groupby(["created_at", "author"]).size()
+    if not dense:
+        return counts.rename("count").reset_index()
+    # compute cross table with uniques dates as index and uniques users as columns
+    return counts.unstack("author", fill_value=0)
+
+
+def densify_user_comments(df_long: pd.DataFrame, min_contribution: int = 0) -> pd.DataFrame:
+    """Convert the long comment table to cross table just for users with enough contributions.
+
+    All periods are kept, so the timeline stays continuous even if selected users have no activity there.
+
+    >>> df_long = pd.DataFrame([dict(created_at='2020-10', author='me', count=2),
+    ...                         dict(created_at='2020-11', author='you', count=1),
+    ...                         dict(created_at='2020-12', author='me', count=1)])
+    >>> densify_user_comments(df_long, min_contribution=2)  # doctest: +NORMALIZE_WHITESPACE
+    author      me
+    created_at
+    2020-10      2
+    2020-11      0
+    2020-12      1
+    """
+    totals = df_long.groupby("author")["count"].sum()
+    users = totals[totals >= min_contribution].index
+    periods = pd.Index(sorted(df_long["created_at"].unique()), name="created_at")
+    df_users = df_long[df_long["author"].isin(users)]
+    df_dense = df_users.set_index(["created_at", "author"])["count"].unstack("author", fill_value=0)
+    return df_dense.reindex(index=periods, fill_value=0)
+
+
 def compute_user_comment_timeline(
     items: list[dict],
     freq: str = "W",
@@ -82,6 +246,14 @@ def compute_user_comment_timeline(
 ) -> pd.DataFrame:
     """Aggregate comments from all issues/PRs.
 
+    Args:
+        items: comments with creation date, author and parent issue/PR
+        freq: aggregation frequency - [D]ay, [W]eek, [M]onth, [Y]ear or any pandas offset alias as `QS` or `4h`
+        parent_type: select only comments for this issue/PR type
+
+    Returns:
+        table with aggregation periods as index and users as columns
+
     >>> items = [dict(created_at='2020-10-05', parent_idx=1, parent_type='issue', author='me'),
     ...          dict(created_at='2020-10-17', parent_idx=2, parent_type='PR', author='me'),
     ...          dict(created_at='2020-10-17', parent_idx=1, parent_type='issue', author='me'),
@@ -92,29 +264,324 @@ def compute_user_comment_timeline(
     created_at
     2020-10      2    0
     2020-11      0    1
+    >>> compute_user_comment_timeline(items, freq='QS')  # doctest: +NORMALIZE_WHITESPACE
+    author      me  you
+    created_at
+    2020-10-01   3    1
     """
-    assert freq in DATETIME_FREQ, f"unsupported freq format, allowed: {DATETIME_FREQ.keys()!r}"
+    assert is_valid_freq(freq), f"unsupported freq format, allowed: {DATETIME_FREQ.keys()!r} or pandas offset alias"
+    cube = compute_comment_cube(items, base_freq=cube_base_freq(freq))
+    return rollup_comment_cube(cube, freq=freq, parent_type=parent_type)
 
-    def _reformat(dt):
-        return pd.to_datetime(dt).strftime(DATETIME_FREQ[freq])
 
-    if parent_type:
-        # filter issue/PR type aka comment parent
-        items = [i for i in items if parent_type.lower() in i["parent_type"].lower()]
+#: metrics counted in rolling windows, the order defines positions in persisted counters
+ROLLING_METRICS = ("comments", "opened PRs", "merged PRs")
 
-    df_comments = pd.DataFrame(items)
-    # convert to date according to the freq.
-    df_comments["created_at"] = df_comments["created_at"].apply(_reformat)
-    # keep only single sample per user-time-issue
-    df_comments.drop_duplicates(ignore_index=True, inplace=True)
 
-    df_comments["count"] = 1
-    # compute cross table with uniques dates as index and uniques users as columns
-    return pd.pivot_table(
-        df_comments,
-        index="created_at",
-        columns="author",
-        values="count",
-        aggfunc=sum,
-        fill_value=0,
+def compute_daily_contributions(
+    comments: list[dict],
+    tickets: list[dict],
+    day_from: Optional[str] = None,
+    day_to: Optional[str] = None,
+) -> dict[str, dict[str, list[int]]]:
+    """Count daily user contributions - comments, opened and merged PRs, within a range of days.
+
+    Args:
+        comments: comments with creation date and author
+        tickets: simplified issues/PRs
+        day_from: first counted day
+        day_to: last counted day
+
+    Returns:
+        daily counts indexed by day and user, counts are ordered as :attr:`ROLLING_METRICS`
+
+    >>> comments = [dict(created_at='2020-10-05T10:00:00Z', author=1), dict(created_at='2020-10-06', author=2)]
+    >>> tickets = [dict(type='PR', state='merged', author=1, created_at='2020-10-01', closed_at='2020-10-05')]
+    >>> compute_daily_contributions(comments, tickets, day_from='2020-10-02')
+    {'2020-10-05': {'1': [1, 0, 1]}, '2020-10-06': {'2': [1, 0, 0]}}
+    """
+    df_tickets = pd.DataFrame(tickets, columns=["type", "state", "author", "created_at", "closed_at"])
+    df_prs = df_tickets[df_tickets["type"] == "PR"]
+    df_merged = df_prs[df_prs["state"] == "merged"]
+    events = pd.concat(
+        [
+            pd.DataFrame(comments, columns=["created_at", "author"]).assign(metric=ROLLING_METRICS[0]),
+            df_prs[["created_at", "author"]].assign(metric=ROLLING_METRICS[1]),
+            df_merged[["closed_at", "author"]]
+            .rename(columns={"closed_at": "created_at"})
+            .assign(metric=ROLLING_METRICS[2]),
+        ],
+        ignore_index=True,
     )
+    days = convert_dates(events["created_at"]).dt.strftime("%Y-%m-%d")
+    events = events.assign(day=days)[days.notna()]
+    if day_from:
+        events = events[events["day"] >= pd.Timestamp(day_from).strftime("%Y-%m-%d")]
+    if day_to:
+        events = events[events["day"] <= pd.Timestamp(day_to).strftime("%Y-%m-%d")]
+
+    counts = events.groupby(["day", "author", "metric"]).size().unstack("metric", fill_value=0)
+    counts = counts.reindex(columns=list(ROLLING_METRICS), fill_value=0)
+    daily = {}
+    for (day, user), row in zip(counts.index, counts.to_numpy().tolist()):
+        daily.setdefault(day, {})[str(user)] = row
+    return daily
+
+
+#: metrics of materialized user counters, the order defines positions in persisted counters
+COUNTER_METRICS = (
+    "opened PRs",
+    "merged PRs",
+    "commented PRs",
+    "opened issues",
+    "merged issues",
+    "commented issues",
+    "comments",
+)
+
+
+def compute_user_counters(tickets: Iterable[dict]) -> dict[str, dict]:
+    """Count user contributions in converted tickets per day and over the whole history.
+
+    Opened and merged issues/PRs are dated by their creation and closing, commented ones by the time the comment
+    is counted at, as in :func:`compute_users_summary`, and comments by their creation, as in timelines.
+    Authors' own comments do not count as commented issues/PRs, and each commenter counts the issue/PR just once
+    per day and once in the whole history. Undated contributions count only in the totals.
+
+    Args:
+        tickets: converted tickets, each with simple items and comments
+
+    Returns:
+        daily counts indexed by day and user, and totals indexed by user, ordered as :attr:`COUNTER_METRICS`
+
+    >>> comments = [dict(author=2, created_at='2020-10-02', count_at='2020-10-02'),
+    ...             dict(author=2, created_at='2020-10-02', count_at='2020-10-03'),
+    ...             dict(author=1, created_at='2020-10-03', count_at='2020-10-03')]
+    >>> pr = dict(type='PR', state='merged', author=1, created_at='2020-10-01', closed_at='2020-10-03')
+    >>> counters = compute_user_counters([{"simple": [pr], "comments": comments}])
+    >>> counters["totals"]
+    {'1': [1, 1, 0, 0, 0, 0, 1], '2': [0, 0, 1, 0, 0, 0, 2]}
+    >>> counters["daily"]["2020-10-03"]
+    {'1': [0, 1, 0, 0, 0, 0, 1], '2': [0, 0, 1, 0, 0, 0, 0]}
+    """
+    nb_metrics = len(COUNTER_METRICS)
+    totals, dates, events = {}, [], []
+
+    def _count(uid: int, metric: int, date: Optional[str], ticket: Optional[int] = None) -> None:
+        totals.setdefault(str(uid), [0] * nb_metrics)[metric] += 1
+        dates.append(date)
+        events.append((str(uid), metric, ticket))
+
+    for i, ticket in enumerate(tickets):
+        for item in ticket["simple"]:
+            opened = COUNTER_METRICS.index(f"opened {item['type']}s")
+            _count(item["author"], opened, item["created_at"])
+            if item["state"] == "merged":
+                _count(item["author"], opened + 1, item.get("closed_at"))
+            commenters = set()
+            for cmt in ticket["comments"]:
+                if cmt["author"] == item["author"]:
+                    continue
+                # count the issue/PR in totals just once, in daily counts once per day
+                if cmt["author"] not in commenters:
+                    commenters.add(cmt["author"])
+                    totals.setdefault(str(cmt["author"]), [0] * nb_metrics)[opened + 2] += 1
+                dates.append(cmt["count_at"])
+                events.append((str(cmt["author"]), opened + 2, i))
+        for cmt in ticket["comments"]:
+            _count(cmt["author"], nb_metrics - 1, cmt["created_at"])
+
+    daily, seen = {}, set()
+    days = convert_dates(dates).dt.strftime("%Y-%m-%d")
+    for day, (uid, metric, ticket) in zip(days, events):
+        if pd.isna(day):
+            continue
+        if ticket is not None:
+            if (day, uid, metric, ticket) in seen:
+                continue
+            seen.add((day, uid, metric, ticket))
+        daily.setdefault(day, {}).setdefault(uid, [0] * nb_metrics)[metric] += 1
+    return {"daily": daily, "totals": totals}
+
+
+def add_user_counters(counters: dict[str, dict], other: dict[str, dict], sign: int = 1) -> None:
+    """Add or subtract user counters, e.g. of changed tickets, in place, users and days with all zeros are dropped.
+
+    >>> counters = {"daily": {"2020-10-01": {"1": [1, 0]}}, "totals": {"1": [1, 0], "2": [0, 3]}}
+    >>> add_user_counters(counters, {"daily": {"2020-10-01": {"1": [1, 0]}}, "totals": {"1": [1, 0]}}, sign=-1)
+    >>> counters
+    {'daily': {}, 'totals': {'2': [0, 3]}}
+    """
+    for day, counts in other["daily"].items():
+        day_counts = counters["daily"].setdefault(day, {})
+        _add_counts(day_counts, counts, sign=sign)
+        if not day_counts:
+            del counters["daily"][day]
+    _add_counts(counters["totals"], other["totals"], sign=sign)
+
+
+def daily_contributions_from_counters(
+    daily: dict[str, dict[str, list[int]]], day_from: str, day_to: str
+) -> dict[str, dict[str, list[int]]]:
+    """Select metrics of rolling windows from daily user counters, the same as :func:`compute_daily_contributions`.
+
+    Only days in the range are visited, so the cost does not grow with the repository history.
+
+    Args:
+        daily: daily user counters as from :func:`compute_user_counters`
+        day_from: first selected day
+        day_to: last selected day
+
+    >>> daily = {"2020-10-05": {"1": [1, 1, 0, 0, 0, 0, 2], "2": [0, 0, 0, 1, 0, 0, 0]}, "2020-10-07": {"2": [1] * 7}}
+    >>> daily_contributions_from_counters(daily, day_from="2020-10-01", day_to="2020-10-06")
+    {'2020-10-05': {'1': [2, 1, 1]}}
+    """
+    positions = [COUNTER_METRICS.index(metric) for metric in ROLLING_METRICS]
+    selected = {}
+    for day in pd.date_range(day_from, day_to, freq="D").strftime("%Y-%m-%d"):
+        for user, vals in daily.get(day, {}).items():
+            row = [vals[i] for i in positions]
+            if any(row):
+                selected.setdefault(day, {})[user] = row
+    return selected
+
+
+def summarize_user_counters(totals: dict[str, list[int]], users: Sequence[int]) -> pd.DataFrame:
+    """Users summary over the whole history read from materialized totals, the same as :func:`compute_users_summary`.
+
+    >>> df = summarize_user_counters({"0": [1, 1, 2, 1, 0, 1, 4], "1": [2, 0, 1, 1, 0, 1, 5]}, users=[0, 1])
+    >>> df[["opened PRs", "commented PRs", "all opened"]]  # doctest: +NORMALIZE_WHITESPACE
+          opened PRs  commented PRs  all opened
+    user
+    1              2              1           3
+    0              1              2           2
+    """
+    columns = list(COUNTER_METRICS[:-1])
+    rows = [totals.get(str(uid), [0] * len(COUNTER_METRICS))[: len(columns)] for uid in users]
+    df_users = pd.DataFrame(rows, index=pd.Index(users, name="user"), columns=columns)
+    df_users["all opened"] = df_users["opened PRs"] + df_users["opened issues"]
+    df_users.sort_values(["all opened"], ascending=False, inplace=True)
+    return df_users
+
+
+def _add_counts(totals: dict[str, list[int]], counts: dict[str, list[int]], sign: int = 1) -> None:
+    """Add or subtract daily user counts to/from the window totals, drop users with all zeros."""
+    for user, vals in counts.items():
+        new = [t + sign * v for t, v in zip(totals.get(user, [0] * len(vals)), vals)]
+        if any(new):
+            totals[user] = new
+        else:
+            totals.pop(user, None)
+
+
+def update_rolling_contributions(
+    state: Optional[dict],
+    comments: list[dict],
+    tickets: list[dict],
+    day: str,
+    windows: Sequence[int] = (30, 90),
+    daily: Optional[dict[str, dict[str, list[int]]]] = None,
+    changed_days: Iterable[str] = (),
+) -> dict:
+    """Move rolling windows of user contributions to the given day.
+
+    Only days since the last update are counted and added to the window totals while the oldest days are expired,
+    the last counted day is always refreshed as it could be incomplete in the previous update.
+    Older days still in windows are counted again only if they are among changed days, e.g. with late data.
+    If there is no valid state the windows are rebuilt from scratch, which is the same as sliding over all days.
+
+    Args:
+        state: persisted state from previous update
+        comments: comments with creation date and author
+        tickets: simplified issues/PRs
+        day: the last day included in windows
+        windows: window lengths in days
+        daily: already counted daily contributions as from :func:`compute_daily_contributions`,
+            if not set they are counted from the comments and tickets
+        changed_days: days with changed contributions since the last update
+
+    Returns:
+        updated state - window totals and daily counts needed for expiring
+
+    >>> comments = [dict(created_at='2020-10-01', author=1), dict(created_at='2020-10-05', author=2)]
+    >>> state = update_rolling_contributions(None, comments, [], day='2020-10-05', windows=[3, 7])
+    >>> state['totals']
+    {'3': {'2': [1, 0, 0]}, '7': {'1': [1, 0, 0], '2': [1, 0, 0]}}
+    >>> state = update_rolling_contributions(state, comments, [], day='2020-10-08', windows=[3, 7])
+    >>> state['totals']
+    {'3': {}, '7': {'2': [1, 0, 0]}}
+    >>> comments.append(dict(created_at='2020-10-04', author=1))
+    >>> state = update_rolling_contributions(state, comments, [], day='2020-10-08', windows=[3, 7],
+    ...                                      changed_days=['2020-10-04'])
+    >>> state['totals']
+    {'3': {}, '7': {'2': [1, 0, 0], '1': [1, 0, 0]}}
+    """
+    windows = sorted({int(w) for w in windows})
+    day = pd.Timestamp(day).normalize()
+    last_day = pd.Timestamp(state["day"]) if state and state.get("day") else None
+    if (
+        not state
+        or state.get("windows") != windows
+        or last_day is None
+        or last_day > day
+        or (day - last_day).days >= max(windows)
+    ):
+        state = {"windows": windows, "day": None, "daily": {}, "totals": {str(w): {} for w in windows}}
+        last_day = None
+    first_day = last_day if last_day is not None else day - pd.Timedelta(days=max(windows) - 1)
+    oldest = (day - pd.Timedelta(days=max(windows) - 1)).strftime("%Y-%m-%d")
+    recount = sorted({d for d in changed_days if last_day is not None and oldest <= d < state["day"]})
+
+    if daily is None:
+        day_from = min([first_day.strftime("%Y-%m-%d")] + recount)
+        daily = compute_daily_contributions(comments, tickets, day_from=day_from, day_to=day)
+    for key in recount:
+        old, new = state["daily"].pop(key, {}), daily.get(key, {})
+        # only windows still including the day, the others have expired it already
+        for w in windows:
+            if (last_day - pd.Timestamp(key)).days < w:
+                _add_counts(state["totals"][str(w)], old, sign=-1)
+                _add_counts(state["totals"][str(w)], new)
+        if new:
+            state["daily"][key] = new
+    for dt in pd.date_range(first_day, day, freq="D"):
+        key = dt.strftime("%Y-%m-%d")
+        # replace previous counts of the day with the fresh ones
+        old, new = state["daily"].pop(key, {}), daily.get(key, {})
+        for w in windows:
+            _add_counts(state["totals"][str(w)], old, sign=-1)
+            _add_counts(state["totals"][str(w)], new)
+        if new:
+            state["daily"][key] = new
+        if dt == last_day:
+            continue
+        # expire the days which just left the windows
+        for w in windows:
+            expired = (dt - pd.Timedelta(days=w)).strftime("%Y-%m-%d")
+            _add_counts(state["totals"][str(w)], state["daily"].get(expired, {}), sign=-1)
+
+    # keep only days which can be still expired
+    state["daily"] = {d: c for d, c in state["daily"].items() if d >= oldest}
+    state["day"] = day.strftime("%Y-%m-%d")
+    return state
+
+
+def rolling_contributions_table(state: dict) -> pd.DataFrame:
+    """Convert rolling windows totals to table with users as index and metric per window as columns.
+
+    >>> state = {'windows': [7], 'totals': {'7': {'1': [1, 0, 0], '2': [3, 1, 1]}}}
+    >>> rolling_contributions_table(state)  # doctest: +NORMALIZE_WHITESPACE
+          comments 7d  opened PRs 7d  merged PRs 7d
+    user
+    2               3              1              1
+    1               1              0              0
+    """
+    columns = [f"{metric} {w}d" for w in state["windows"] for metric in ROLLING_METRICS]
+    rows = {}
+    for w in state["windows"]:
+        for user, counts in state["totals"][str(w)].items():
+            row = rows.setdefault(int(user), dict.fromkeys(columns, 0))
+            row.update({f"{metric} {w}d": c for metric, c in zip(ROLLING_METRICS, counts)})
+    df = pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+    df.index.name = "user"
+    return df.sort_values(columns, ascending=False)
@@ -0,0 +1,133 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Optional
+
+from repo_stats.data_io import save_data
+
+#: sample comment messages, some of them are filtered as spam
+SYNTHETIC_MESSAGES = (
+    "LGTM",
+    "Thanks!",
+    "nice work",
+    "this needs more work on the edge cases",
+    "please rebase on the main branch",
+    "could you please add a test for it?",
+)
+#: share of users which are bots
+SYNTHETIC_BOT_RATIO = 0.05
+
+
+def generate_raw_tickets(
+    nb_tickets: int = 1000,
+    comments_per_ticket: float = 5.0,
+    nb_users: int = 100,
+    pr_ratio: float = 0.5,
+    date_from: str = "2020-01-01",
+    date_to: str = "2023-12-31",
+    seed: Optional[int] = 0,
+) -> dict[str, dict]:
+    """Generate synthetic raw tickets in the same schema as fetched from GitHub.
+
+    User activity follows heavy-tailed distribution as in real repositories, just few users make most contributions.
+
+    Args:
+        nb_tickets: number of issues and PRs
+        comments_per_ticket: mean number of comments and review comments per ticket
+        nb_users: number of distinct users, few of them are bots
+        pr_ratio: share of PRs among tickets
+        date_from: beginning of the time spread
+        date_to: end of the time spread
+        seed: random seed for reproducible data
+
+    Returns:
+        raw tickets indexed by their number
+
+    >>> tickets = generate_raw_tickets(nb_tickets=100, comments_per_ticket=10, nb_users=20)
+    >>> len(tickets)
+    100
+    >>> 800 < sum(len(t["comments"]) + len(t["review_comments"]) for t in tickets.values()) < 1200
+    True
+    >>> sorted(tickets["1"])  # doctest: +NORMALIZE_WHITESPACE
+    ['closed_at', 'comments', 'created_at', 'html_url', 'merged_at', 'number', 'review_comments', 'state',
+     'updated_at', 'user']
+    """
+    rnd = random.Random(seed)
+    nb_bots = int(nb_users * SYNTHETIC_BOT_RATIO)
+    users = [f"user{i}" for i in range(nb_users - nb_bots)] + [f"bot{i}[bot]" for i in range(nb_bots)]
+    # Zipf-like user activity
+    cum_weights = list(accumulate(1.0 / (i + 1) for i in range(len(users))))
+    time_from = datetime.fromisoformat(date_from).replace(tzinfo=timezone.utc)
+    time_span = (datetime.fromisoformat(date_to).replace(tzinfo=timezone.utc) - time_from).total_seconds()
+
+    def _date(after: Optional[datetime] = None) -> datetime:
+        start = after or time_from
+        span = max(time_span - (start - time_from).total_seconds(), 0)
+        return start + timedelta(seconds=int(rnd.random() * span))
+
+    def _fmt(dt: datetime) -> str:
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _comments(nb: int, after: datetime) -> list[dict]:
+        comments = []
+        for login in rnd.choices(users, cum_weights=cum_weights, k=nb):
+            created = _date(after)
+            comments.append(
+                {
+                    "user": {"login": login},
+                    "body": rnd.choice(SYNTHETIC_MESSAGES),
+                    "created_at": _fmt(created),
+                    "updated_at": _fmt(_date(created) if rnd.random() < 0.1 else created),
+                }
+            )
+        return comments
+
+    tickets = {}
+    for idx in range(1, nb_tickets + 1):
+        is_pr = rnd.random() < pr_ratio
+        created = _date()
+        nb_comments = int(rnd.expovariate(1.0 / comments_per_ticket) + 0.5) if comments_per_ticket > 0 else 0
+        nb_reviews = rnd.randint(0, nb_comments) if is_pr else 0
+        state = rnd.choice(("open", "closed", "merged") if is_pr else ("open", "closed"))
+        closed = _fmt(_date(created)) if state != "open" else None
+        comments = _comments(nb_comments - nb_reviews, created)
+        review_comments = _comments(nb_reviews, created)
+        updated = max([_fmt(created), closed or ""] + [c["updated_at"] for c in comments + review_comments])
+        tickets[str(idx)] = {
+            "number": idx,
+            "html_url": f"https://github.com/synthetic/repo/{'pull' if is_pr else 'issues'}/{idx}",
+            "state": state,
+            "user": {"login": rnd.choices(users, cum_weights=cum_weights)[0]},
+            "created_at": _fmt(created),
+            "updated_at": updated,
+            "closed_at": closed,
+            "merged_at": closed if state == "merged" else None,
+            "comments": comments,
+            "review_comments": review_comments,
+        }
+    return tickets
+
+
+def save_synthetic_dump(path_dir: str, repo_name: str = "synthetic/repo", host: str = "github", **kwargs) -> str:
+    """Generate synthetic repository and save it as dump, which can be loaded by any host as cached data.
+
+    Args:
+        path_dir: folder for saving the dump
+        repo_name: repository name used in the dump name
+        host: host name used in the dump name
+        kwargs: options of :func:`generate_raw_tickets`
+
+    Returns:
+        path to the dump
+
+    >>> import os, tempfile
+    >>> path = save_synthetic_dump(tempfile.mkdtemp(), nb_tickets=10)
+    >>> os.path.basename(path)
+    'dump-github_synthetic-repo.json'
+    """
+    data = {"raw_info": [], "raw_tickets": generate_raw_tickets(**kwargs)}
+    return save_data(data, path_dir=path_dir, repo_name=repo_name, host=host)
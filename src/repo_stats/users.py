@@ -0,0 +1,85 @@
+"""
+Copyright (C) 2020-2021 Jiri Borovec <...>
+"""
+
+from collections.abc import Iterable, Sequence
+
+
+class UserRegistry:
+    """Interned table of users shared across the whole processing pipeline.
+
+    Each login is mapped to a stable integer ID, the bot flag and user URL are resolved once while interning,
+    so later lookups are just indexing to a list.
+
+    >>> users = UserRegistry(bot_patterns=("[bot]",), url_template="[%(user)s](https://github.com/%(user)s)")
+    >>> users.intern("Borda"), users.intern("codecov[bot]"), users.intern("Borda")
+    (0, 1, 0)
+    >>> users.is_bot(1), users.is_bot(0)
+    (True, False)
+    >>> users.login(0), users.url(0)
+    ('Borda', '[Borda](https://github.com/Borda)')
+    >>> UserRegistry(logins=users.logins).intern("codecov[bot]")
+    1
+    """
+
+    def __init__(
+        self,
+        bot_patterns: Sequence[str] = (),
+        url_template: str = "%(user)s",
+        logins: Iterable[str] = (),
+    ):
+        """
+        Args:
+            bot_patterns: name patterns to recognise bot users
+            url_template: template for rendering user link
+            logins: already known users, the order defines their IDs
+        """
+        self.bot_patterns = tuple(bot_patterns)
+        self.url_template = url_template
+        self._ids = {}
+        self._logins = []
+        self._bots = []
+        self._urls = []
+        for login in logins:
+            self.intern(login)
+
+    def __len__(self) -> int:
+        return len(self._logins)
+
+    def __contains__(self, login: str) -> bool:
+        return login in self._ids
+
+    def _match_bot(self, login: str) -> bool:
+        return any(p in login for p in self.bot_patterns)
+
+    def intern(self, login: str) -> int:
+        """Get user ID, register the user if it is not known yet."""
+        uid = self._ids.get(login)
+        if uid is None:
+            uid = len(self._logins)
+            self._ids[login] = uid
+            self._logins.append(login)
+            self._bots.append(self._match_bot(login))
+            self._urls.append(self.url_template % {"user": login})
+        return uid
+
+    def uid(self, login: str) -> int:
+        """Get ID of already registered user."""
+        return self._ids[login]
+
+    def is_bot(self, uid: int) -> bool:
+        """Check the precomputed bot flag."""
+        return self._bots[uid]
+
+    def login(self, uid: int) -> str:
+        """Resolve user ID to the login name."""
+        return self._logins[uid]
+
+    def url(self, uid: int) -> str:
+        """Resolve user ID to the rendered user link."""
+        return self._urls[uid]
+
+    @property
+    def logins(self) -> list[str]:
+        """All registered logins ordered by their IDs."""
+        return list(self._logins)
@@ -7,18 +7,70 @@ import logging
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+#: maximal figure width and height in inches, larger matrices are squeezed and the ticks are thinned
+MAX_FIGURE_SIZE = (40, 30)
+#: number of heatmap cells from which the heatmap is rasterized and drawn without cell edges
+RASTER_CELLS = 5000
+#: minimal space in inches for a single tick label
+TICK_SPACING = 0.2
+
+
+def _thin_ticks(nb_items: int, size: float, spacing: float = TICK_SPACING, min_step: int = 1) -> int:
+    """Compute the step between ticks so their labels fit the axis size.
+
+    >>> _thin_ticks(10, size=5)
+    1
+    >>> _thin_ticks(1000, size=20)
+    10
+    """
+    return max(min_step, int(np.ceil(nb_items * spacing / size)))
+
+
+def top_users_with_others(df_comments: pd.DataFrame, top_users: int) -> pd.DataFrame:
+    """Keep only the top contributing users and aggregate all the rest in a single "others" column.
+
+    >>> df = pd.DataFrame(dict(a=[1, 2], b=[5, 5], c=[0, 1], d=[3, 1]))
+    >>> top_users_with_others(df, top_users=2)
+       b  d  others
+    0  5  3       1
+    1  5  1       3
+    >>> list(top_users_with_others(df, top_users=5).columns)
+    ['a', 'b', 'c', 'd']
+    """
+    if len(df_comments.columns) <= top_users:
+        return df_comments
+    top = df_comments.sum(axis=0).sort_values(ascending=False, kind="stable").index[:top_users]
+    top = [c for c in df_comments.columns if c in top]
+    others = df_comments.drop(columns=top).sum(axis=1).rename("others")
+    return pd.concat([df_comments[top], others], axis=1)
+
 
 def draw_comments_timeline(
-    df_comments: pd.DataFrame, title: str = "User contribution aggregation"
+    df_comments: pd.DataFrame,
+    title: str = "User contribution aggregation",
+    top_users: int = 50,
+    max_fig_size: tuple[float, float] = MAX_FIGURE_SIZE,
+    raster_cells: int = RASTER_CELLS,
+    headless: bool = False,
 ) -> tuple[plt.Figure, dict]:
     """Draw a figure with two charts, one as cumulative date/contribution and user/time heatmap
 
+    Small tables are drawn with a labelled cell per user and period, large tables are scaled down:
+    the figure size is capped and ticks thinned, the area chart shows only top users with aggregated others
+    and the heatmap is rasterized, so also vector outputs stay small and fast to render.
+
     Args:
         df_comments: table with aggregated comments
-        fig_size: output figure size
         title: optional figure title
+        top_users: number of users shown in the area chart, the rest is aggregated as "others"
+        max_fig_size: maximal figure width and height in inches
+        raster_cells: number of heatmap cells from which it is rasterized
+        headless: build the figure with plain Agg canvas without touching the global pyplot state,
+            so it is safe for rendering in a process pool, but the figure cannot be shown
 
     Returns:
         Figure and extras
@@ -27,32 +79,39 @@ def draw_comments_timeline(
     >>> comments = [dict(Date='2020-10', me=5, you=3), dict(Date='2020-11', me=2, you=4)]
     >>> df = pd.DataFrame(comments).set_index('Date')
     >>> fig, extras = draw_comments_timeline(df)
+    >>> df = pd.DataFrame(np.ones((500, 900)), columns=[f'user{i}' for i in range(900)])
+    >>> fig, extras = draw_comments_timeline(df)
+    >>> tuple(fig.get_size_inches()) == MAX_FIGURE_SIZE
+    True
     """
+    max_width, max_height = max_fig_size
+    df_area = top_users_with_others(df_comments, top_users)
     # take the offset plus max from time-steps in area-bar and users in heatmap
-    fig_width = 2 + max(len(df_comments.columns) * 0.3, len(df_comments.index) * 0.2)
+    fig_width = min(2 + max(len(df_comments.columns) * 0.3, len(df_comments.index) * 0.2), max_width)
     # define legend grid for are-bar
     leg_cols = int(fig_width / 1.8)
-    leg_rows = np.ceil(len(df_comments.columns) / leg_cols)
+    leg_rows = np.ceil(len(df_area.columns) / leg_cols)
     # compose from offset plus nb legend lines
     fig_height_top = 4 + leg_rows * 0.3
-    fig_height_bottom = 1 + len(df_comments.index) * 0.3
+    fig_height_bottom = min(1 + len(df_comments.index) * 0.3, max(max_height - fig_height_top, max_height / 2))
+    fig_height = min(fig_height_top + fig_height_bottom, max_height)
 
     # create the main figure
-    fig, axarr = plt.subplots(
-        figsize=(fig_width, fig_height_top + fig_height_bottom),
-        nrows=2,
-        gridspec_kw={"height_ratios": [1, fig_height_bottom / fig_height_top]},
-        tight_layout=True,
-    )
+    if headless:
+        fig = Figure(figsize=(fig_width, fig_height), tight_layout=True)
+        FigureCanvasAgg(fig)
+    else:
+        fig = plt.figure(figsize=(fig_width, fig_height), tight_layout=True)
+    axarr = fig.subplots(nrows=2, gridspec_kw={"height_ratios": [1, fig_height_bottom / fig_height_top]})
     fig.gca().set_title(title)
     ax_abar, ax_hmap = axarr
 
     if df_comments.empty:
         logging.error("You have passed empty DataFrame, so also empty Figure is returned.")
-        return fig
+        return fig, {}
 
     # show the cumulative chart
-    df_comments.plot(
+    df_area.plot(
         ax=ax_abar,
         kind="area",
         stacked=True,
@@ -62,11 +121,12 @@ def draw_comments_timeline(
         legend=False,
         cmap="gist_ncar",
     )
-    times, x_step = list(df_comments.index), 2
+    times = list(df_comments.index)
+    x_step = _thin_ticks(len(times), size=fig_width, min_step=2)
     ax_abar.set_xticks(range(len(times))[::x_step])
-    ax_abar.set_xticklabels(times[::2], rotation=70, ha="center")
+    ax_abar.set_xticklabels(times[::x_step], rotation=70, ha="center")
     ax_abar.set_xlim(0, len(times) - 1)
-    ax_abar.set_ylim(0, max(np.sum(df_comments.values, axis=1)) * 1.05)
+    ax_abar.set_ylim(0, max(np.sum(df_area.values, axis=1)) * 1.05)
     lgd = ax_abar.legend(
         loc="upper center",
         bbox_to_anchor=(0.5, 1.0 + (leg_rows * 0.25 / fig_height_top)),
@@ -78,25 +138,62 @@ def draw_comments_timeline(
     # im = ax.imshow(df_comments.values, vmin=0, interpolation='nearest', cmap='YlGn')
     # see: https://matplotlib.org/3.3.2/gallery/images_contours_and_fields/image_annotated_heatmap.html
     df_comments = df_comments.sort_index(ascending=False)
+    large = df_comments.size >= raster_cells
     im = ax_hmap.pcolormesh(
         df_comments.values,
         vmin=0,
         cmap="YlGn",
-        edgecolors="w",
-        linewidth=1,
+        edgecolors="face" if large else "w",
+        linewidth=0 if large else 1,
+        rasterized=large,
     )
     # axes descriptions
+    hmap_height = fig_height * fig_height_bottom / (fig_height_top + fig_height_bottom)
+    y_step = _thin_ticks(len(df_comments.index), size=hmap_height)
     ax_hmap.set_ylabel("Aggregated dates")
-    ax_hmap.set_yticks([i + 0.5 for i, _ in enumerate(df_comments.index)])
-    ax_hmap.set_yticklabels(df_comments.index, va="center")
+    ax_hmap.set_yticks([i + 0.5 for i in range(len(df_comments.index))][::y_step])
+    ax_hmap.set_yticklabels(df_comments.index[::y_step], va="center")
+    x_step = _thin_ticks(len(df_comments.columns), size=fig_width)
     ax_hmap.set_xlabel("Users")
-    ax_hmap.set_xticks([i + 0.5 for i, _ in enumerate(df_comments.columns)])
-    ax_hmap.set_xticklabels(df_comments.columns, rotation=-90, ha="center")
+    ax_hmap.set_xticks([i + 0.5 for i in range(len(df_comments.columns))][::x_step])
+    ax_hmap.set_xticklabels(df_comments.columns[::x_step], rotation=-90, ha="center")
     # Create colorbar
     cax = make_axes_locatable(ax_hmap).append_axes("right", size=0.3, pad=0.1)
-    cbar = plt.colorbar(im, cax=cax)
+    cbar = fig.colorbar(im, cax=cax)
     cbar.ax.set_ylabel("Contributions", rotation=90, va="center")
     cbar.minorticks_on()
 
     # fig.tight_layout(pad=0.1)
     return fig, {"legend": lgd, "colorbar": cax}
+
+
+def save_comments_timeline(
+    df_comments: pd.DataFrame,
+    fig_path: str,
+    title: str = "User contribution aggregation",
+    headless: bool = True,
+    **kwargs,
+) -> str:
+    """Draw the comments timeline and save it, by default headless so it can run in a worker process.
+
+    Args:
+        df_comments: table with aggregated comments
+        fig_path: path to the output figure, the format is given by its extension
+        title: optional figure title
+        headless: see :func:`draw_comments_timeline`
+        kwargs: other options passed to :func:`draw_comments_timeline`
+
+    Returns:
+        path to the saved figure
+
+    >>> import os, tempfile
+    >>> df = pd.DataFrame([dict(me=5, you=3), dict(me=2, you=4)], index=['2020-10', '2020-11'])
+    >>> fig_path = save_comments_timeline(df, os.path.join(tempfile.mkdtemp(), 'timeline.png'))
+    >>> os.path.isfile(fig_path)
+    True
+    """
+    fig, extras = draw_comments_timeline(df_comments, title=title, headless=headless, **kwargs)
+    fig.savefig(fig_path, bbox_extra_artists=tuple(extras.values()), bbox_inches="tight")
+    if not headless:
+        plt.close(fig)
+    return fig_path
@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PATH_BENCH_SCRIPT = Path(__file__).parent.parent / "benchmarks" / "bench_pipeline.py"
+
+
+def _run_bench(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, str(PATH_BENCH_SCRIPT), *args], capture_output=True, text=True)
+
+
+def test_benchmark_regressions(tmp_path):
+    """Benchmark a tiny synthetic repository and flag only the regressed results."""
+    data_path, results_path = str(tmp_path / "data"), str(tmp_path / "results.json")
+    assert _run_bench("generate", "--data_path", data_path, "--scales", "[300]").returncode == 0
+    assert _run_bench("run", "--data_path", data_path, "--results_path", results_path, "--repeat", "1").returncode == 0
+    assert _run_bench("compare", results_path, results_path).returncode == 0
+
+    results = json.loads(Path(results_path).read_text())
+    assert results["results"]["300"]["records"]["comments"] > 0
+    results["results"]["300"]["preprocess_data"]["wall_s"] += 10
+    regressed_path = tmp_path / "regressed.json"
+    regressed_path.write_text(json.dumps(results))
+    proc = _run_bench("compare", results_path, str(regressed_path))
+    assert proc.returncode != 0
+    assert "preprocess_data @ 300 comments" in proc.stderr
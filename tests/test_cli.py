@@ -1,11 +1,15 @@
+import json
 import os
 import shutil
 from pathlib import Path
 from unittest import mock
 
+import pandas as pd
 import pytest
 
 from repo_stats.__main__ import cli_main
+from repo_stats.host import Host
+from repo_stats.sketch import HyperLogLog
 
 
 @pytest.fixture
@@ -29,6 +33,15 @@ def temp_output_with_cache(tmp_path):
         "--min_contribution 1 --user_comments+ W",
         "--min_contribution 1 --user_comments+ W --user_comments+ issue",
         "--min_contribution 1 --user_comments+ D --user_comments+ W --user_comments+ pr",
+        "--min_contribution 1 --user_comments+ QS --user_comments+ 4h",
+        "--min_contribution 1 --user_comments+ W --sparse_format csv",
+        "--min_contribution 1 --rolling_windows+ 30 --rolling_windows+ 90 --date_to 2020-02-01",
+        "--min_contribution 1 --users_summary+ all --user_comments+ D --time_windows+ 2020-01-02..",
+        "--min_contribution 1 --user_comments+ W --figure_format png",
+        "--min_contribution 1 --user_comments+ M --title_timestamp latest --rewrite_outputs true",
+        "--min_contribution 1 --user_comments+ W --user_comments+ M --nb_workers 2",
+        "--min_contribution 1 --users_summary+ all --window_freq W --date_from 2020-01-01 --date_to 2020-01-31",
+        "--min_contribution 1 --user+ testuser1 --user+ testuser2 --time_windows+ 2020-01-02..",
     ],
 )
 def test_offline_github(cli_args, temp_output_with_cache):
@@ -41,6 +54,171 @@ def test_offline_github(cli_args, temp_output_with_cache):
         cli_main()
 
 
+@pytest.mark.parametrize("cli_args", ["--sparse_format parqet", "--sparse_format xlsx", "--figure_format jpeg"])
+def test_offline_invalid_format(cli_args, temp_output_with_cache):
+    """Test unsupported export formats are rejected instead of exporting under a misleading name."""
+    full_args = f"analyze Borda/pyRepoStats --output_path {temp_output_with_cache} --user_comments+ W {cli_args}"
+    with mock.patch("argparse._sys.argv", ["any.py"] + full_args.split()), pytest.raises(AssertionError):
+        cli_main()
+    assert not [name for name in os.listdir(temp_output_with_cache) if "user-comments" in name]
+
+
+def test_offline_profile(temp_output_with_cache):
+    """Test profiling report of all analyze stages with cProfile statistics of the selected one."""
+    full_args = (
+        f"analyze Borda/pyRepoStats --output_path {temp_output_with_cache} --min_contribution 1"
+        " --users_summary+ all --user_comments+ W --profile true --profile_stage preprocess_data"
+    )
+    with (
+        mock.patch("argparse._sys.argv", ["any.py"] + full_args.split()),
+        mock.patch("repo_stats.cli.SHOW_FIGURES", False),
+    ):
+        cli_main()
+    with open(os.path.join(temp_output_with_cache, "profile-github_Borda-pyRepoStats_analyze.json")) as fp:
+        report = json.load(fp)
+    stages = report["stages"]
+    for stage in ("analyze/load_data", "analyze/preprocess_data", "analyze/users_summary", "analyze/render_figures"):
+        assert stages[stage]["calls"] == 1
+    assert stages["analyze/load_data"]["records"]["tickets"] > 0
+    assert stages["analyze/preprocess_data"]["peak_mb"] > 0
+    assert stages["analyze"]["wall_s"] >= stages["analyze/preprocess_data"]["wall_s"]
+    assert os.path.isfile(
+        os.path.join(temp_output_with_cache, "profile-github_Borda-pyRepoStats_analyze_preprocess_data.prof")
+    )
+
+
+def test_offline_distinct(temp_output_with_cache):
+    """Test merging distinct contributor sketches saved by analyze."""
+    path_sketches = os.path.join(temp_output_with_cache, "sketch-*.json")
+    cli_distinct = f'distinct ["{path_sketches}"] --output_path {temp_output_with_cache}'
+    for cli_args in (
+        f"analyze Borda/pyRepoStats --output_path {temp_output_with_cache} --contributor_sketches M",
+        cli_distinct,
+    ):
+        with (
+            mock.patch("argparse._sys.argv", ["any.py"] + cli_args.split()),
+            mock.patch("repo_stats.cli.SHOW_FIGURES", False),
+        ):
+            cli_main()
+    path_counts = os.path.join(temp_output_with_cache, Host.CSV_DISTINCT_CONTRIBUTORS)
+    df_counts = pd.read_csv(path_counts, index_col=0)
+
+    # the same contributors sketched with a different error in another repository
+    path_sketch = os.path.join(temp_output_with_cache, "sketch-github_Borda-pyRepoStats.json")
+    with open(path_sketch) as fp:
+        sketch = json.load(fp)
+    sketch["sketches"] = {
+        kind: {p: HyperLogLog.from_dict(hll).fold(8).to_dict() for p, hll in periods.items()}
+        for kind, periods in sketch["sketches"].items()
+    }
+    with open(os.path.join(temp_output_with_cache, "sketch-github_Borda-other.json"), "w") as fp:
+        json.dump(dict(sketch, error=0.1), fp)
+    with mock.patch("argparse._sys.argv", ["any.py"] + cli_distinct.split()):
+        cli_main()
+    pd.testing.assert_frame_equal(pd.read_csv(path_counts, index_col=0), df_counts)
+
+    # periods of other frequency cannot be merged
+    with open(os.path.join(temp_output_with_cache, "sketch-github_Borda-weekly.json"), "w") as fp:
+        json.dump(dict(sketch, freq="W"), fp)
+    with mock.patch("argparse._sys.argv", ["any.py"] + cli_distinct.split()), pytest.raises(AssertionError):
+        cli_main()
+
+
+def test_offline_manifest(temp_output_with_cache):
+    """Test many jobs from manifest give the same outputs as separate runs and each period is applied once."""
+    jobs = [
+        {"name": "weekly", "users_summary": ["all"], "user_comments": ["W"]},
+        {"name": "recent", "users_summary": ["all"], "date_from": "2020-01-02", "min_contribution": 2},
+        {"name": "monthly", "user_comments": ["M", "pr"]},
+        {"name": "humans", "users_summary": ["all"], "user_bots": ["testuser1"]},
+    ]
+    path_manifest = os.path.join(temp_output_with_cache, "manifest.json")
+    with open(path_manifest, "w") as fp:
+        json.dump({"jobs": jobs}, fp)
+
+    def _run(cli_args: str) -> None:
+        full_args = f"analyze Borda/pyRepoStats --output_path {temp_output_with_cache} --min_contribution 1 {cli_args}"
+        with (
+            mock.patch("argparse._sys.argv", ["any.py"] + full_args.split()),
+            mock.patch("repo_stats.cli.SHOW_FIGURES", False),
+        ):
+            cli_main()
+
+    with mock.patch.object(Host, "apply_time_period", autospec=True, side_effect=Host.apply_time_period) as applied:
+        _run(f"--manifest {path_manifest}")
+    # two periods with the default bots and one with the custom bots
+    assert applied.call_count == 3
+
+    def _load(name: str) -> pd.DataFrame:
+        return pd.read_csv(os.path.join(temp_output_with_cache, f"github_Borda-pyRepoStats_{name}.csv"), index_col=0)
+
+    for job_name, cli_args in [
+        ("weekly", "--users_summary+ all"),
+        ("recent", "--users_summary+ all --date_from 2020-01-02 --min_contribution 2"),
+        ("humans", "--users_summary+ all --user_bots+ testuser1"),
+    ]:
+        _run(cli_args)
+        pd.testing.assert_frame_equal(_load(f"{job_name}_users-summary"), _load("users-summary"))
+    for name in ("weekly_user-comments_freq_W_type_all", "monthly_user-comments_freq_M_type_pr"):
+        assert os.path.isfile(os.path.join(temp_output_with_cache, f"github_Borda-pyRepoStats_{name}.pdf"))
+
+
+def test_offline_ingest(temp_output_with_cache):
+    """Test applying spooled webhook payloads to the cache."""
+    spool = os.path.join(temp_output_with_cache, "spool")
+    os.mkdir(spool)
+    issue = {
+        "number": 4,
+        "html_url": "https://github.com/Borda/pyRepoStats/issues/4",
+        "state": "open",
+        "user": {"login": "newcomer"},
+        "created_at": "2020-02-05T00:00:00Z",
+        "updated_at": "2020-02-05T00:00:00Z",
+    }
+    with open(os.path.join(spool, "delivery-1.json"), "w") as fp:
+        json.dump({"event": "issues", "payload": {"action": "opened", "issue": issue}}, fp)
+    full_args = f'ingest Borda/pyRepoStats ["{os.path.join(spool, "*.json")}"] --output_path {temp_output_with_cache}'
+    with mock.patch("argparse._sys.argv", ["any.py"] + full_args.split()):
+        cli_main()
+    with open(os.path.join(temp_output_with_cache, "dump-github_Borda-pyRepoStats.json")) as fp:
+        dump = json.load(fp)
+    assert dump["raw_tickets"]["4"]["updated_at"] == issue["updated_at"]
+    # the derived data are rebuilt from the preprocessed tickets, not dumped twice
+    assert not set(Host.DATA_KEYS_DERIVED).intersection(dump)
+    assert "4" in dump[Host.DATA_KEY_PREPROCESSED]["tickets"]
+
+
+@pytest.mark.parametrize("nb_workers", [1, 2])
+def test_offline_aggregate(temp_output_with_cache, nb_workers):
+    """Test aggregating many repositories matches counts of the single ones."""
+    shutil.copy(
+        os.path.join(temp_output_with_cache, "dump-github_Borda-pyRepoStats.json"),
+        os.path.join(temp_output_with_cache, "dump-github_Borda-other.json"),
+    )
+    for cli_args in (
+        f"analyze Borda/pyRepoStats --output_path {temp_output_with_cache} --users_summary+ all --user_comments+ W",
+        f'aggregate ["{os.path.join(temp_output_with_cache, "dump-github_*.json")}"]'
+        f" --output_path {temp_output_with_cache} --users_summary+ all --user_comments+ W --nb_workers {nb_workers}",
+    ):
+        with (
+            mock.patch("argparse._sys.argv", ["any.py"] + cli_args.split()),
+            mock.patch("repo_stats.cli.SHOW_FIGURES", False),
+        ):
+            cli_main()
+
+    def _load(name: str) -> pd.DataFrame:
+        return pd.read_csv(os.path.join(temp_output_with_cache, name), index_col=0).sort_index().sort_index(axis=1)
+
+    pd.testing.assert_frame_equal(
+        _load("github_combined_users-summary.csv"), _load("github_Borda-pyRepoStats_users-summary.csv") * 2
+    )
+    pd.testing.assert_frame_equal(
+        _load("github_combined_user-comments_freq_W_type_all.csv"),
+        _load("github_Borda-pyRepoStats_user-comments_freq_W_type_all.csv") * 2,
+    )
+    assert os.path.isfile(os.path.join(temp_output_with_cache, "github_combined_user-comments_freq_W_type_all.pdf"))
+
+
 @pytest.mark.skipif(
     not os.getenv("GH_API_TOKEN"),
     reason="requires GH_API_TOKEN environment variable for online tests",
@@ -0,0 +1,312 @@
+import os
+import shutil
+from copy import deepcopy
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from repo_stats.data_io import save_data
+from repo_stats.github import GitHub
+from repo_stats.index import build_index
+from repo_stats.stats import compute_user_counters, update_rolling_contributions
+from repo_stats.synthetic import save_synthetic_dump
+from repo_stats.visual import draw_comments_timeline
+
+PATH_FIXTURE_DUMP = Path(__file__).parent / "fixtures" / "dump-github_Borda-pyRepoStats.json"
+
+
+@pytest.fixture
+def github_host(tmp_path):
+    """Create a GitHub host with loaded cached test data."""
+    shutil.copy(PATH_FIXTURE_DUMP, tmp_path / PATH_FIXTURE_DUMP.name)
+    host = GitHub(repo_name="Borda/pyRepoStats", output_path=str(tmp_path))
+    host.fetch_data(offline=True)
+    return host
+
+
+@pytest.fixture
+def synthetic_host(tmp_path, request):
+    """Create a GitHub host with pre-processed synthetic data, the generator seed is the fixture parameter."""
+    save_synthetic_dump(str(tmp_path), repo_name="synthetic/repo", nb_tickets=200, nb_users=20, seed=request.param)
+    host = GitHub(repo_name="synthetic/repo", output_path=str(tmp_path), min_contribution=1)
+    host.fetch_data(offline=True)
+    host.preprocess_data()
+    return host
+
+
+def test_incremental_preprocessing(github_host):
+    """Only changed tickets are converted again, the rest is reused from cache."""
+    github_host.preprocess_data()
+    simple = github_host.data[github_host.DATA_KEY_SIMPLE]
+    comments = github_host.data[github_host.DATA_KEY_COMMENTS]
+
+    convert = github_host._convert_comments_timeline
+    with mock.patch.object(github_host, "_convert_comments_timeline", wraps=convert) as m:
+        github_host.preprocess_data()
+        assert m.call_count == 0
+        github_host.changed_tickets.add("2")
+        github_host.preprocess_data()
+        assert m.call_count == 1
+
+    assert github_host.data[github_host.DATA_KEY_SIMPLE] == simple
+    assert github_host.data[github_host.DATA_KEY_COMMENTS] == comments
+
+
+def test_cached_index_reused(github_host):
+    """The users index is built only for caches without it, not on every pre-processing."""
+    github_host.preprocess_data()
+    cache = github_host.data[github_host.DATA_KEY_PREPROCESSED]
+    with mock.patch("repo_stats.host.build_index", wraps=build_index) as m:
+        github_host.preprocess_data()
+        assert m.call_count == 0
+        index = cache.pop("index")
+        github_host.preprocess_data()
+        assert m.call_count == 1
+    assert cache["index"] == index
+
+
+def test_preprocessing_keeps_raw_tickets(github_host):
+    """Pre-processing shall never change the raw tickets, so repeated runs give the same results."""
+    raw_tickets = deepcopy(github_host.data[github_host.DATA_KEY_RAW_TICKETS])
+    github_host.preprocess_data()
+    comments = github_host.data[github_host.DATA_KEY_COMMENTS]
+    # force converting all tickets again
+    github_host.changed_tickets.update(raw_tickets)
+    github_host.preprocess_data()
+
+    assert github_host.data[github_host.DATA_KEY_RAW_TICKETS] == raw_tickets
+    assert github_host.data[github_host.DATA_KEY_COMMENTS] == comments
+    # each comment and review comment is counted just once
+    nb_comments = sum(len(t["comments"]) + len(t["review_comments"]) for t in raw_tickets.values())
+    assert len(comments) <= nb_comments
+
+
+def test_parallel_rendering(github_host, tmp_path):
+    """Headless rendering in a process pool gives the same files as the serial path."""
+    github_host.preprocess_data()
+    combinations = [("W", ""), ("M", "issue"), ("M", "PR")]
+    serial = [github_host.show_user_comments(freq, tp, show_fig=False, fig_format="png") for freq, tp in combinations]
+    serial_figs = {p: Path(p).read_bytes() for _, p in serial}
+
+    # force rendering all figures again
+    github_host.reuse_outputs = False
+    parallel = github_host.save_user_comments(combinations, fig_format="png", nb_workers=2)
+    assert parallel == serial
+    assert {p: Path(p).read_bytes() for _, p in parallel} == serial_figs
+
+
+def test_skip_unchanged_outputs(github_host):
+    """Tables and figures are exported again only if their content or rendering parameters changed."""
+    github_host.preprocess_data()
+    csv_path, fig_path = github_host.show_user_comments("M", show_fig=False)
+    mtimes = {p: os.path.getmtime(p) for p in (csv_path, fig_path)}
+
+    with mock.patch("repo_stats.visual.draw_comments_timeline") as draw:
+        github_host.show_user_comments("M", show_fig=False)
+        assert draw.call_count == 0
+    assert {p: os.path.getmtime(p) for p in mtimes} == mtimes
+
+    github_host.min_contribution_count = 1
+    with mock.patch("repo_stats.visual.draw_comments_timeline", wraps=draw_comments_timeline) as draw:
+        github_host.show_user_comments("M", show_fig=False)
+        assert draw.call_count == 1
+
+
+def test_reuse_fallback_outputs(github_host):
+    """CSV exported instead of Parquet is reused and keys of all outputs are saved at once."""
+    github_host.preprocess_data()
+    with mock.patch.object(pd.DataFrame, "to_parquet", side_effect=ImportError("no engine")):
+        csv_path, _ = github_host.show_user_comments("M", show_fig=False, sparse_format="parquet")
+        assert csv_path.endswith(".csv")
+        with mock.patch.object(pd.DataFrame, "to_csv") as to_csv:
+            github_host.show_user_comments("M", show_fig=False, sparse_format="parquet")
+            assert to_csv.call_count == 0
+
+    with mock.patch("repo_stats.host.save_data", wraps=save_data) as saved:
+        github_host.save_user_comments([("W", ""), ("D", "pr"), ("M", "issue")])
+    assert saved.call_count == 1
+
+
+def test_analysis_without_side_effects(github_host, tmp_path, capsys):
+    """The in-memory API returns tables and figures without touching the filesystem or stdout."""
+    github_host.preprocess_data()
+    files = set(tmp_path.iterdir())
+
+    df_users = github_host.users_summary(columns=["merged PRs", "commented PRs"])
+    assert list(df_users.columns) == ["merged PRs", "commented PRs"]
+    df_comments = github_host.user_comments(freq="D")
+    df_long = github_host.user_comments(freq="D", sparse=True)
+    assert df_long["count"].sum() == df_comments.values.sum()
+    fig, _ = github_host.draw_user_comments(freq="W")
+    assert fig.axes
+    rolling = deepcopy(github_host.data.get(github_host.DATA_KEY_ROLLING))
+    changed_days = set(github_host.changed_days)
+    github_host.select_time_period(date_to="2020-01-10")
+    assert not github_host.rolling_summary(windows=[30]).empty
+    github_host.select_time_period()
+    # the persisted rolling state is not slid by the query
+    assert github_host.data.get(github_host.DATA_KEY_ROLLING) == rolling
+    assert github_host.changed_days == changed_days
+
+    assert set(tmp_path.iterdir()) == files
+    assert capsys.readouterr().out == ""
+
+    # the printing stage shows the same table
+    csv_path = github_host.print_users_summary(columns=["merged PRs", "commented PRs"])
+    assert capsys.readouterr().out
+    assert pd.read_csv(csv_path, index_col=0).equals(df_users)
+
+
+def test_merge_partial_dumps(github_host):
+    """Conflicting tickets from partial dumps are resolved by their update time."""
+    raw_tickets = deepcopy(github_host.data[github_host.DATA_KEY_RAW_TICKETS])
+    newer = dict(raw_tickets["1"], updated_at="2021-01-01T00:00:00Z", state="open")
+    older = dict(raw_tickets["2"], updated_at="2019-01-01T00:00:00Z", state="open")
+    broken = dict(raw_tickets["3"], updated_at=None)
+    new = dict(raw_tickets["3"], number=4, html_url=raw_tickets["3"]["html_url"].replace("/3", "/4"))
+    partials = [{"raw_tickets": {"1": newer, "3": broken}}, {"raw_tickets": {"2": older, "4": new}}]
+
+    assert github_host.merge_partial_dumps(partials) == ["1", "4"]
+    merged = github_host.data[github_host.DATA_KEY_RAW_TICKETS]
+    assert merged["1"] == newer
+    assert merged["2"] == raw_tickets["2"]
+    assert merged["3"] == raw_tickets["3"]
+    assert github_host.outdated == 0
+    assert 4 in {t["number"] for t in github_host.data[github_host.DATA_KEY_SIMPLE]}
+
+
+@pytest.mark.parametrize("synthetic_host", [1], indirect=True)
+def test_user_report(synthetic_host):
+    """User report from the persisted indexes matches the full users summary, also after changing tickets."""
+    host = synthetic_host
+    host.select_time_period(date_from="2021-01-01", date_to="2022-06-30")
+
+    raw_tickets = host.data[host.DATA_KEY_RAW_TICKETS]
+    ticket = raw_tickets["1"]
+    raw_tickets["1"] = dict(ticket, comments=ticket["comments"] + ticket["comments"][:1], updated_at="2023-01-01")
+    del raw_tickets["2"]
+    host.preprocess_data()
+    cache = host.data[host.DATA_KEY_PREPROCESSED]
+    index, rebuilt = cache["index"], build_index(cache["tickets"])
+    assert index["commenters"] == rebuilt["commenters"]
+    assert {uid: sorted(idxs) for uid, idxs in index["authors"].items()} == {
+        uid: sorted(idxs) for uid, idxs in rebuilt["authors"].items()
+    }
+
+    df_users = host.users_summary()
+    logins = list(df_users.index)
+    df_report = host.user_report(logins + ["nobody"])
+    assert list(df_report.index) == logins
+    pd.testing.assert_frame_equal(df_report[df_users.columns], df_users)
+    nb_comments = pd.Series([host.users.login(c["author"]) for c in host.data[host.DATA_KEY_COMMENTS]]).value_counts()
+    assert (df_report["comments"] == nb_comments.reindex(logins, fill_value=0)).all()
+
+
+@pytest.mark.parametrize("synthetic_host", [2], indirect=True)
+def test_user_counters(synthetic_host):
+    """Counters updated with changed tickets match the recomputed ones and give the same summary and rolling windows."""
+    host = synthetic_host
+
+    raw_tickets = host.data[host.DATA_KEY_RAW_TICKETS]
+    ticket = raw_tickets["3"]
+    raw_tickets["3"] = dict(ticket, comments=ticket["comments"][1:] + ticket["comments"][:2], updated_at="2023-01-01")
+    del raw_tickets["4"]
+    host.preprocess_data()
+    cache = host.data[host.DATA_KEY_PREPROCESSED]
+    assert cache["counters"] == compute_user_counters(cache["tickets"].values())
+
+    df_users = host.users_summary()
+    # without counters the summary is computed from all tickets
+    counters = cache.pop("counters")
+    pd.testing.assert_frame_equal(df_users, host.users_summary())
+    cache["counters"] = counters
+    state = host.update_rolling_contributions(windows=[30, 90], day="2023-06-30")
+    expected = update_rolling_contributions(
+        None,
+        comments=host.data[host.DATA_KEY_COMMENTS],
+        tickets=host.data[host.DATA_KEY_SIMPLE],
+        day="2023-06-30",
+        windows=[30, 90],
+    )
+    assert expected["totals"]["90"]
+    assert state["totals"] == expected["totals"]
+
+
+@pytest.mark.parametrize("synthetic_host", [3], indirect=True)
+def test_rolling_late_data(synthetic_host):
+    """Late comment on an older day still in windows is counted without rebuilding the windows."""
+    host = synthetic_host
+    host.update_rolling_contributions(windows=[7, 30], day="2023-06-30")
+
+    ticket = host.data[host.DATA_KEY_RAW_TICKETS]["5"]
+    comment = {"user": {"login": "late-user"}, "body": "late", "created_at": "2023-06-20T10:00:00Z"}
+    ticket["comments"] = ticket["comments"] + [dict(comment, updated_at=comment["created_at"])]
+    ticket["updated_at"] = "2023-07-01T00:00:00Z"
+    host.preprocess_data()
+    state = host.update_rolling_contributions(day="2023-07-01")
+
+    uid = str(host.users.uid("late-user"))
+    assert state["totals"]["30"][uid] == [1, 0, 0]
+    assert uid not in state["totals"]["7"]
+    expected = update_rolling_contributions(
+        None,
+        comments=host.data[host.DATA_KEY_COMMENTS],
+        tickets=host.data[host.DATA_KEY_SIMPLE],
+        day="2023-07-01",
+        windows=[7, 30],
+    )
+    assert state["totals"] == expected["totals"]
+
+
+def test_ingest_events(github_host):
+    """Webhook events are applied in order of their time and applying them again changes nothing."""
+    repo = {"full_name": "Borda/pyRepoStats"}
+    issue_1 = dict(github_host.data[github_host.DATA_KEY_RAW_TICKETS]["1"], updated_at="2020-02-01T10:00:00Z")
+    issue_1.pop("comments")
+    comment = {
+        "id": 101,
+        "user": {"login": "newcomer"},
+        "body": "Could we also support GitLab?",
+        "created_at": "2020-02-01T10:00:00Z",
+        "updated_at": "2020-02-01T10:00:00Z",
+    }
+    url_pr = "https://github.com/Borda/pyRepoStats/pull/11"
+    events = [
+        # deleting the comment later than its edit and creation, even if it comes first
+        {"action": "deleted", "issue": issue_1, "comment": dict(comment, updated_at="2020-02-03T00:00:00Z"),
+         "repository": repo},
+        {"action": "created", "issue": issue_1, "comment": comment, "repository": repo},
+        {"action": "edited", "issue": issue_1, "comment": dict(comment, body="edited", updated_at="2020-02-02"),
+         "repository": repo},
+        {"action": "created", "issue": issue_1, "comment": dict(comment, id=102, created_at="2020-02-01T11:00:00Z",
+                                                                updated_at="2020-02-01T11:00:00Z"), "repository": repo},
+        {"action": "opened", "repository": repo, "issue": {
+            "number": 10, "html_url": "https://github.com/Borda/pyRepoStats/issues/10", "state": "open",
+            "user": {"login": "newcomer"}, "created_at": "2020-02-05T00:00:00Z", "updated_at": "2020-02-05T00:00:00Z"}},
+        {"headers": {"X-GitHub-Event": "pull_request"}, "payload": {"action": "closed", "repository": repo,
+            "pull_request": {"number": 11, "html_url": url_pr, "state": "closed", "merged": True,
+                             "user": {"login": "newcomer"}, "created_at": "2020-02-06T00:00:00Z",
+                             "updated_at": "2020-02-07T00:00:00Z", "closed_at": "2020-02-07T00:00:00Z"}}},
+        {"action": "deleted", "issue": {"number": 3}, "repository": repo},
+        {"action": "opened", "issue": {"number": 12, "html_url": "", "state": "open"},
+         "repository": {"full_name": "Borda/other"}},
+    ]  # fmt: skip
+    assert github_host.ingest_events(events) == ["3", "1", "10", "11"]
+    raw_tickets = deepcopy(github_host.data[github_host.DATA_KEY_RAW_TICKETS])
+    assert set(raw_tickets) == {"1", "2", "10", "11"}
+    assert [c.get("id") for c in raw_tickets["1"]["comments"]] == [None, 102]
+    assert raw_tickets["1"]["updated_at"] == "2020-02-01T10:00:00Z"
+    assert raw_tickets["10"]["updated_at"] == "2020-02-05T00:00:00Z"
+    # merged PR created from a single event misses the earlier history, so it is left for the next scrape
+    assert raw_tickets["11"]["state"] == "merged"
+    assert raw_tickets["11"]["updated_at"] is None
+    assert github_host.outdated == 1
+
+    simple = {t["number"]: t for t in github_host.data[github_host.DATA_KEY_SIMPLE]}
+    assert set(simple) == {1, 2, 10, 11}
+    assert github_host.users.uid("newcomer") in simple[1]["commenters"]
+
+    github_host.ingest_events(events[::-1])
+    assert github_host.data[github_host.DATA_KEY_RAW_TICKETS] == raw_tickets
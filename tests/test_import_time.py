@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+
+#: cumulative import time budget for the CLI entry point in microseconds, any heavy dependency breaks it
+CLI_IMPORT_BUDGET = 150_000
+
+
+def _import_times(module: str) -> dict[str, int]:
+    """Import the module in a fresh interpreter and collect cumulative import times in microseconds."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    ("module", "lazy_modules"),
+    [
+        ("repo_stats.__main__", ("matplotlib", "pandas", "github", "tabulate", "jsonargparse")),
+        ("repo_stats.github", ("matplotlib", "github", "tabulate")),
+    ],
+)
+def test_lazy_imports(module, lazy_modules):
+    """Heavy dependencies are imported only by the code paths which use them."""
+    assert not set(_import_times(module)).intersection(lazy_modules)
+
+
+def test_cli_import_budget():
+    """Starting the CLI does not pay for importing any of the heavy dependencies."""
+    times = _import_times("repo_stats.__main__")
+    assert times["repo_stats.__main__"] < CLI_IMPORT_BUDGET
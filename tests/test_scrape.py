@@ -0,0 +1,178 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from repo_stats.github import GitHub
+from repo_stats.synthetic import generate_raw_tickets
+
+MOCK_REPO = "synthetic/repo"
+
+
+class _MockGitHubHandler(BaseHTTPRequestHandler):
+    """Minimal GitHub REST API serving synthetic tickets, all listings are on a single page."""
+
+    def _issue(self, ticket: dict) -> dict:
+        url = f"{self.server.url}/repos/{MOCK_REPO}/issues/{ticket['number']}"
+        issue = {
+            "number": ticket["number"],
+            "url": url,
+            "html_url": ticket["html_url"],
+            "comments_url": f"{url}/comments",
+            "state": "closed" if ticket["state"] == "merged" else ticket["state"],
+            "title": f"ticket {ticket['number']}",
+            "user": ticket["user"],
+            "comments": len(ticket["comments"]),
+            **{key: ticket[key] for key in ("created_at", "updated_at", "closed_at")},
+        }
+        if "/pull/" in ticket["html_url"]:
+            pull_url = f"{self.server.url}/repos/{MOCK_REPO}/pulls/{ticket['number']}"
+            issue["pull_request"] = {"url": pull_url, "html_url": ticket["html_url"]}
+        return issue
+
+    def _pull(self, ticket: dict) -> dict:
+        return {
+            "number": ticket["number"],
+            "url": f"{self.server.url}/repos/{MOCK_REPO}/pulls/{ticket['number']}",
+            "html_url": ticket["html_url"],
+            "state": "closed" if ticket["state"] == "merged" else ticket["state"],
+            "merged": ticket["state"] == "merged",
+            "merged_at": ticket["merged_at"],
+        }
+
+    def do_GET(self) -> None:
+        path = self.path.split("?")[0].replace(f"/repos/{MOCK_REPO}", "", 1)
+        tickets, failing = self.server.tickets, self.server.failing
+        matched = re.fullmatch(r"/(issues|pulls)/(\d+)(/comments)?", path)
+        if path == "":
+            reply = {"url": f"{self.server.url}/repos/{MOCK_REPO}", "name": "repo", "full_name": MOCK_REPO}
+        elif path == "/issues":
+            reply = [self._issue(t) for t in sorted(tickets.values(), key=lambda t: -t["number"])]
+        elif matched and matched.group(2) in tickets and not (matched.group(3) and int(matched.group(2)) in failing):
+            kind, ticket = matched.group(1), tickets[matched.group(2)]
+            if matched.group(3):
+                # comments are requested just by fetching the ticket details
+                self.server.requests.append(ticket["number"])
+                reply = ticket["comments" if kind == "issues" else "review_comments"]
+            else:
+                reply = self._issue(ticket) if kind == "issues" else self._pull(ticket)
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(reply).encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def mock_github():
+    """Serve synthetic repository on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockGitHubHandler)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    # PyGithub throttles requests, so keep the repository small
+    server.tickets = generate_raw_tickets(nb_tickets=8, comments_per_ticket=3, nb_users=5)
+    server.requests = []
+    # tickets with failing comments, they are still listed
+    server.failing = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _scrape(output_path: str, api_url: str, *args: str) -> subprocess.Popen:
+    env = {k: v for k, v in os.environ.items() if k != "GH_API_TOKEN"}
+    cmd = ["scrape", MOCK_REPO, "--output_path", output_path, "--api_url", api_url, *args]
+    return subprocess.Popen([sys.executable, "-m", "repo_stats", *cmd], env=env, stderr=subprocess.PIPE, text=True)
+
+
+def test_sharded_scrape(mock_github, tmp_path):
+    """Parallel shard workers fetch disjoint tickets and the merged dump equals the full scrape."""
+    nb_shards = 3
+    workers = [_scrape(str(tmp_path), mock_github.url, "--shard", f"{i}/{nb_shards}") for i in range(nb_shards)]
+    for proc in workers:
+        _, err = proc.communicate(timeout=120)
+        assert proc.returncode == 0, err
+    sharded_requests = Counter(mock_github.requests)
+    assert set(sharded_requests) == {t["number"] for t in mock_github.tickets.values()}
+    partials = sorted(os.listdir(tmp_path))
+    assert partials == [f"shard-github_synthetic-repo_{i}-of-{nb_shards}.json" for i in range(nb_shards)]
+
+    merge = subprocess.run(
+        [sys.executable, "-m", "repo_stats", "merge", MOCK_REPO, "--output_path", str(tmp_path)],
+        capture_output=True,
+        text=True,
+    )
+    assert merge.returncode == 0, merge.stderr
+
+    full_path = tmp_path / "full"
+    full_path.mkdir()
+    mock_github.requests.clear()
+    proc = _scrape(str(full_path), mock_github.url)
+    _, err = proc.communicate(timeout=120)
+    assert proc.returncode == 0, err
+    # each ticket detail was fetched just by a single shard
+    assert Counter(mock_github.requests) == sharded_requests
+
+    with open(tmp_path / "dump-github_synthetic-repo.json") as fp:
+        merged = json.load(fp)
+    with open(full_path / "dump-github_synthetic-repo.json") as fp:
+        full = json.load(fp)
+    assert set(merged["raw_tickets"]) == set(mock_github.tickets)
+    assert merged["raw_tickets"] == full["raw_tickets"]
+    # the merged dump is preprocessed as after a standard scrape
+    assert set(merged["preprocessed_tickets"]["tickets"]) == set(full["preprocessed_tickets"]["tickets"])
+
+
+def test_budget_scrape(mock_github, tmp_path):
+    """Sync within a budget fetches open and recently updated tickets first, the rest in the next run."""
+    host = GitHub(MOCK_REPO, output_path=str(tmp_path), api_url=mock_github.url)
+    host.fetch_data(offline=False, deadline=time.monotonic())
+    assert host.backlog == len(mock_github.tickets)
+    assert not host.data["raw_tickets"]
+
+    host.fetch_data(offline=False, max_requests=12)
+    fetched = list(host.data["raw_tickets"])
+    assert 0 < len(fetched) < len(mock_github.tickets)
+    assert (host.outdated, host.backlog) == (0, len(mock_github.tickets) - len(fetched))
+    # merged PRs are just closed in the overview
+    overview = {idx: dict(t, state=t["state"].replace("merged", "closed")) for idx, t in mock_github.tickets.items()}
+    assert fetched == GitHub._prioritize_queue(list(overview), overview)[: len(fetched)]
+
+    mock_github.requests.clear()
+    host = GitHub(MOCK_REPO, output_path=str(tmp_path), api_url=mock_github.url)
+    host.fetch_data(offline=False)
+    assert (host.outdated, host.backlog) == (0, 0)
+    assert set(host.data["raw_tickets"]) == set(mock_github.tickets)
+    # only the remainder was fetched
+    assert {str(n) for n in mock_github.requests} == set(mock_github.tickets) - set(fetched)
+
+
+def test_budget_scrape_failures(mock_github, tmp_path):
+    """Ticket over the whole budget is still fetched and a failing ticket does not stop fetching the others."""
+    host = GitHub(MOCK_REPO, output_path=str(tmp_path), api_url=mock_github.url)
+    host.fetch_data(offline=False, max_requests=1)
+    assert len(host.data["raw_tickets"]) == 1
+    assert host.backlog == len(mock_github.tickets) - 1
+
+    failing = next(t for t in mock_github.tickets.values() if str(t["number"]) not in host.data["raw_tickets"])
+    mock_github.failing.add(failing["number"])
+    host.fetch_data(offline=False)
+    assert not host.api_limit_reached
+    assert (host.outdated, host.backlog) == (1, 0)
+    assert set(host.data["raw_tickets"]) == set(mock_github.tickets)
+    assert host.data["raw_tickets"][str(failing["number"])]["updated_at"] is None
@@ -0,0 +1,131 @@
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from repo_stats.github import GitHub
+from repo_stats.serve import RepoPool, make_server
+
+PATH_FIXTURE_DUMP = Path(__file__).parent / "fixtures" / "dump-github_Borda-pyRepoStats.json"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """Pool of two repositories with the same cached test data."""
+    for name in ("Borda-pyRepoStats", "Borda-other"):
+        shutil.copy(PATH_FIXTURE_DUMP, tmp_path / f"dump-github_{name}.json")
+    return RepoPool(output_path=str(tmp_path), max_repos=1, min_contribution=1)
+
+
+@pytest.fixture
+def server_url(pool):
+    """Serve the pool on a free local port."""
+    server = make_server(pool, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url: str) -> dict:
+    with urlopen(url) as resp:
+        return json.load(resp)
+
+
+def test_least_recently_used_eviction(pool):
+    """Only the most recently used repositories stay in memory."""
+    with pool.use("Borda/pyRepoStats") as host:
+        assert host.data[host.DATA_KEY_COMMENTS]
+    with pool.use("Borda/other"):
+        pass
+    assert pool.repos == ["Borda/other"]
+    with pytest.raises(FileNotFoundError), pool.use("Borda/missing"):
+        pass
+
+
+def test_sync_after_api_limit(pool):
+    """Reaching the request limit skips details only until the limit is reset, later syncs fetch again."""
+    from github import GithubException
+
+    with pool.use("Borda/pyRepoStats") as host:
+        overview = [dict(t, comments=len(t["comments"])) for t in host.data[host.DATA_KEY_RAW_TICKETS].values()]
+    overview[0]["updated_at"] = "2020-02-01T12:00:00Z"
+    client = mock.MagicMock()
+    now = time.time()
+    client.get_repo.return_value.get_issue.return_value.get_comments.side_effect = [
+        GithubException(403, {}, headers={"x-ratelimit-reset": str(now + 60)}),
+        [],
+    ]
+    with (
+        mock.patch.object(GitHub, "github_client", new=client),
+        mock.patch.object(GitHub, "_fetch_info", return_value=[]),
+        mock.patch.object(GitHub, "_fetch_overview", return_value=overview),
+    ):
+        pool.sync()
+        with pool.use("Borda/pyRepoStats") as host:
+            assert host.api_limit_reached
+            assert host.data[host.DATA_KEY_RAW_TICKETS]["1"]["updated_at"] is None
+        # still limited, nothing is requested
+        pool.sync()
+        assert client.get_repo.return_value.get_issue.call_count == 1
+        with mock.patch("repo_stats.github.time.time", return_value=now + 61):
+            pool.sync()
+    with pool.use("Borda/pyRepoStats") as host:
+        assert not host.api_limit_reached
+        assert host.data[host.DATA_KEY_RAW_TICKETS]["1"]["updated_at"] == "2020-02-01T12:00:00Z"
+        assert host.data[host.DATA_KEY_RAW_TICKETS]["1"]["comments"] == []
+
+
+def test_sync_after_api_limit_on_overview(pool, caplog):
+    """Reaching the limit while listing issues fails just the sync, the next one after reset lists them again."""
+    from github import GithubException
+
+    with pool.use("Borda/pyRepoStats") as host:
+        overview = [dict(t, comments=len(t["comments"])) for t in host.data[host.DATA_KEY_RAW_TICKETS].values()]
+    client = mock.MagicMock()
+    now = time.time()
+    client.get_repo.return_value.get_issues.side_effect = [
+        GithubException(403, {}, headers={"x-ratelimit-reset": str(now + 60)}),
+        [],
+    ]
+    with (
+        mock.patch.object(GitHub, "github_client", new=client),
+        mock.patch.object(GitHub, "_fetch_info", return_value=[]),
+    ):
+        pool.sync()
+        assert "Syncing 'Borda/pyRepoStats' failed" in caplog.text
+        with pool.use("Borda/pyRepoStats") as host:
+            assert host.api_limit_reached
+        # still limited, nothing is requested
+        pool.sync()
+        assert client.get_repo.return_value.get_issues.call_count == 1
+        with (
+            mock.patch("repo_stats.github.time.time", return_value=now + 61),
+            mock.patch.object(GitHub, "_fetch_overview", autospec=True, return_value=overview) as fetched,
+        ):
+            pool.sync()
+    assert fetched.call_count == 1
+
+
+def test_serve_queries(server_url):
+    """Queries are answered from the loaded repository, the period is selected per request."""
+    summary = _get(f"{server_url}/Borda/pyRepoStats/users_summary?columns=merged PRs,commented PRs".replace(" ", "%20"))
+    assert summary["columns"] == ["merged PRs", "commented PRs"]
+    assert "testuser1" in summary["index"]
+
+    comments = _get(f"{server_url}/Borda/pyRepoStats/user_comments?freq=D&type=all")
+    comments_late = _get(f"{server_url}/Borda/pyRepoStats/user_comments?freq=D&date_from=2020-01-04")
+    assert len(comments_late["index"]) < len(comments["index"])
+    assert _get(f"{server_url}/health") == {"repos": ["Borda/pyRepoStats"]}
+
+    with pytest.raises(HTTPError, match="400"):
+        _get(f"{server_url}/Borda/pyRepoStats/user_comments?freq=xyz")
+    with pytest.raises(HTTPError, match="404"):
+        _get(f"{server_url}/Borda/missing/users_summary")